@@ -0,0 +1,96 @@
+
+# Imports
+from src.vehicle import Vehicle
+from src.task import Task, TaskStates
+from src.print import *
+import tracemalloc
+import random
+import json
+import io
+
+# Constants
+NB_STEPS: int = 2000
+VEHICLES_PER_STEP: int = 20		# Number of vehicles entering the simulation at each step
+VEHICLE_LIFETIME: int = 50		# Number of steps a vehicle stays in the simulation
+SAMPLE_INTERVAL: int = 500		# Number of steps between two memory samples
+
+# Run a synthetic task lifecycle (generation, progression, completion, vehicle departure) without SUMO
+def run_lifecycle(retain_finished: bool) -> list[tuple[int,float]]:
+	""" Run the synthetic lifecycle and sample the traced memory\n
+	When finished tasks are not retained, their records are streamed and checked against the tasks at the end
+	Args:
+		retain_finished	(bool):	Whether finished tasks are retained in memory
+	Returns:
+		list[tuple[int,float]]: List of (step, traced memory in MB)
+	"""
+	# Reset the class states
+	random.seed(0)
+	Task.retain_finished = retain_finished
+	Task.all_tasks = {state: [] for state in TaskStates}
+	Task.finished_counts = {state: 0 for state in Task.FINISHED_STATES}
+	Vehicle.vehicles = set()
+	Task.records_stream = None if retain_finished else io.StringIO()
+	expected: dict[str, tuple[str, int|None]] = {}	# State and completion step of each finished task (by ID)
+
+	# Simulation loop
+	samples: list[tuple[int,float]] = []
+	departures: dict[int, list[Vehicle]] = {}
+	tracemalloc.start()
+	for step in range(NB_STEPS):
+		Task.current_step = step
+
+		# New vehicles with their tasks
+		for i in range(VEHICLES_PER_STEP):
+			vehicle = Vehicle(f"veh{step}_{i}")
+			vehicle.generate_tasks()
+			departures.setdefault(step + VEHICLE_LIFETIME, []).append(vehicle)
+
+		# Progress the tasks of every vehicle (the last task of each vehicle is never assigned and fails at departure)
+		for vehicle in Vehicle.vehicles:
+			for task in vehicle.tasks[:-1]:
+				if task.state in (TaskStates.PENDING, TaskStates.IN_PROGRESS):
+					task.progress(1)
+					if task.state == TaskStates.COMPLETED:
+						vehicle.receive_task_result(task)
+						expected[task.id] = (task.state.name, task.completed_step)
+
+		# Departed vehicles
+		for vehicle in departures.pop(step, []):
+			expected.update({task.id: (TaskStates.FAILED.name, None) for task in vehicle.tasks if task.state == TaskStates.PENDING})
+			vehicle.destroy()
+			Vehicle.vehicles.discard(vehicle)
+
+		# Sample memory
+		if (step + 1) % SAMPLE_INTERVAL == 0:
+			current, _ = tracemalloc.get_traced_memory()
+			samples.append((step + 1, current / (1024 * 1024)))
+	tracemalloc.stop()
+
+	# Check that the streamed records match the tasks
+	if Task.records_stream is not None:
+		records: dict[str, tuple[str, int|None]] = {}
+		for line in Task.records_stream.getvalue().splitlines():
+			record: dict = json.loads(line)
+			records[record["id"]] = (record["state"], record["completed_step"])
+		Task.records_stream = None
+		if records != expected:
+			mismatches: list[str] = [task_id for task_id in expected if records.get(task_id) != expected[task_id]]
+			error(f"{len(mismatches)} streamed records do not match their task (e.g. {mismatches[:3]})", exit = False)
+		else:
+			info(f"The {len(records)} streamed records match their task")
+	return samples
+
+
+# Main method
+if __name__ == "__main__":
+	results: dict[str, list[tuple[int,float]]] = {
+		"retained": run_lifecycle(retain_finished = True),
+		"folded": run_lifecycle(retain_finished = False),
+	}
+
+	# Print the table
+	info(f"Traced memory (MB) with {VEHICLES_PER_STEP} vehicles/step living {VEHICLE_LIFETIME} steps")
+	info(f"{'Step':>6} | {'retained':>10} | {'folded':>10}")
+	for (step, retained), (_, folded) in zip(results["retained"], results["folded"]):
+		info(f"{step:>6} | {retained:>10.2f} | {folded:>10.2f}")
+	info(f"Completed: {Task.count(TaskStates.COMPLETED)}, Failed: {Task.count(TaskStates.FAILED)}")
@@ -0,0 +1,176 @@
+
+# Imports
+import subprocess
+import argparse
+import tempfile
+import hashlib
+import time
+import json
+import sys
+import os
+
+# Constants
+ROOT: str = os.path.dirname(os.path.abspath(__file__))
+NB_STEPS: int = 300				# Steps of the synthetic traffic (then the remaining vehicles leave)
+VISUAL_CENTER: tuple[int,int] = (1200, 1600)
+QOS_TOLERANCE: float = 1e-6		# Relative tolerance on the QoS (the sums are not done in the same order by every engine)
+USAGE_TOLERANCE: float = 1e-9	# Absolute tolerance on the usage of the fog nodes
+
+# Engines: "reference" (run_simulation) or "sharded:N" (run_sharded_simulation with N shards), optionally "@REV" to run a git revision
+def parse_engine(spec: str) -> tuple[str, int, str|None]:
+	""" Parse an engine specification like "reference", "sharded:4" or "reference@HEAD~1"
+	Args:
+		spec	(str):	Engine specification
+	Returns:
+		tuple[str,int,str|None]: (engine name, number of shards, git revision or None for the working tree)
+	"""
+	engine, _, revision = spec.partition("@")
+	name, _, nb_shards = engine.partition(":")
+	if name not in ("reference", "sharded"):
+		raise ValueError(f"Unknown engine '{name}' in '{spec}', expected 'reference' or 'sharded:N'")
+	return name, int(nb_shards or 1), revision or None
+
+
+# Worker: run one engine in its own process (the simulation uses class level states) and write its trace
+def run_worker(root: str, engine: str, nb_shards: int, mode_name: str, seed: int, nb_steps: int, output: str) -> None:
+	""" Run an engine on the synthetic traffic and write its per step trace to a JSON file
+	Args:
+		root		(str):	Root of the source tree to run (working tree or extracted revision)
+		engine		(str):	"reference" or "sharded"
+		nb_shards	(int):	Number of shards of the sharded engine
+		mode_name	(str):	Assign mode letters (e.g. "NC")
+		seed		(int):	Seed of the simulation and of the traffic
+		nb_steps	(int):	Steps of the synthetic traffic
+		output		(str):	Path of the JSON trace
+	"""
+	sys.path.insert(0, root)
+	os.chdir(root)
+	from src.main import run_simulation
+	from src.mobility import RandomWalkMobility
+	from src.resources import Resource
+	from src.task import Task, TaskStates
+	from src.utils import AssignMode
+
+	# Trace of each step: QoS, usage of each fog node, counts and digest of the tasks states
+	trace: dict[str, list] = {"qos": [], "usages": [], "states": []}
+	def on_step(step: int, usages: dict[str, float], qos: float) -> None:
+		trace["qos"].append(qos)
+		trace["usages"].append([usages[fog_id] for fog_id in sorted(usages)])
+		active: list[str] = sorted(f"{task.id}:{state.name}" for state in (TaskStates.PENDING, TaskStates.IN_PROGRESS) for task in Task.all_tasks[state])
+		digest: str = hashlib.blake2b("\n".join(active).encode("utf-8"), digest_size = 8).hexdigest()
+		trace["states"].append([Task.count(state) for state in TaskStates] + [digest])
+
+	# Run the engine
+	mode = AssignMode(*[letter in mode_name for letter in "NQCK"])
+	kwargs: dict = dict(
+		simulation_name = os.path.join(tempfile.gettempdir(), "compare_engines", f"{engine}_{nb_shards}"), assign_mode = mode, sumo_config = "",
+		visual_center = VISUAL_CENTER, folder = "compare", seed = seed, open_gui = False, fog_resources = Resource.MEDIUM_RANDOM_RESOURCE_ARGS,
+		mobility = RandomWalkMobility(seed, nb_steps = nb_steps), on_step = on_step,
+	)
+	start_time: float = time.perf_counter()
+	if engine == "sharded":
+		from src.sharding import run_sharded_simulation
+		run_sharded_simulation(nb_shards = nb_shards, **kwargs)
+	else:
+		run_simulation(**kwargs)
+	trace["time"] = time.perf_counter() - start_time
+	with open(output, "w", encoding = "utf-8") as file:
+		json.dump(trace, file)
+
+
+# Run an engine specification in a subprocess (extracting the git revision if any)
+def run_engine(spec: str, mode_name: str, seed: int, nb_steps: int, workdir: str) -> dict:
+	""" Run an engine in a subprocess and load its trace
+	Args:
+		spec		(str):	Engine specification (see parse_engine)
+		mode_name	(str):	Assign mode letters
+		seed		(int):	Seed of the simulation
+		nb_steps	(int):	Steps of the synthetic traffic
+		workdir		(str):	Temporary folder for the extracted revisions and the traces
+	Returns:
+		dict: Trace of the engine (see run_worker)
+	"""
+	engine, nb_shards, revision = parse_engine(spec)
+	root: str = ROOT
+	if revision is not None:
+		root = os.path.join(workdir, revision.replace("/", "_").replace("~", "_").replace("^", "_"))
+		if not os.path.exists(root):
+			os.makedirs(root)
+			archive = subprocess.run(["git", "-C", ROOT, "archive", revision], check = True, capture_output = True).stdout
+			subprocess.run(["tar", "-x", "-C", root], input = archive, check = True)
+	output: str = os.path.join(workdir, f"trace_{len(os.listdir(workdir))}.json")
+	command: list[str] = [sys.executable, os.path.abspath(__file__), "--worker", root, engine, str(nb_shards), mode_name, str(seed), str(nb_steps), output]
+	subprocess.run(command, check = True, stdout = subprocess.DEVNULL)
+	with open(output, "r", encoding = "utf-8") as file:
+		return json.load(file)
+
+
+def first_divergence(reference: dict, candidate: dict) -> str|None:
+	""" Find the first step where two traces diverge
+	Args:
+		reference	(dict):	Trace of the reference engine
+		candidate	(dict):	Trace of the candidate engine
+	Returns:
+		str|None: Description of the first divergence, None if the traces are equivalent
+	"""
+	for step, (ref_states, cand_states) in enumerate(zip(reference["states"], candidate["states"])):
+		if ref_states != cand_states:
+			return f"step {step}: tasks states (pending, in progress, completed, failed, digest) {ref_states} != {cand_states}"
+		ref_usages, cand_usages = reference["usages"][step], candidate["usages"][step]
+		if len(ref_usages) != len(cand_usages):
+			return f"step {step}: {len(ref_usages)} fog nodes != {len(cand_usages)}"
+		for fog_index, (ref_usage, cand_usage) in enumerate(zip(ref_usages, cand_usages)):
+			if abs(ref_usage - cand_usage) > USAGE_TOLERANCE:
+				return f"step {step}: usage of fog node #{fog_index} {ref_usage:.6f} != {cand_usage:.6f}"
+		ref_qos, cand_qos = reference["qos"][step], candidate["qos"][step]
+		if abs(ref_qos - cand_qos) > QOS_TOLERANCE * max(1.0, abs(ref_qos)):
+			return f"step {step}: QoS {ref_qos:.6f} != {cand_qos:.6f}"
+	if len(reference["qos"]) != len(candidate["qos"]):
+		return f"step {min(len(reference['qos']), len(candidate['qos']))}: {len(reference['qos'])} steps != {len(candidate['qos'])}"
+	return None
+
+
+# Main method
+if __name__ == "__main__":
+	if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+		root, engine, nb_shards, mode_name, seed, nb_steps, output = sys.argv[2:]
+		run_worker(root, engine, int(nb_shards), mode_name, int(seed), int(nb_steps), output)
+		sys.exit(0)
+
+	# Arguments
+	parser = argparse.ArgumentParser(description = "Run a reference engine and candidate engines on the same seeded synthetic traffic (no SUMO), report the first divergence and the speed-ups")
+	parser.add_argument("--reference", default = "reference@HEAD", help = "Reference engine: 'reference' or 'sharded:N', with '@REV' to run a git revision (default: the last commit)")
+	parser.add_argument("--candidates", nargs = "+", default = ["reference"], help = "Candidate engines (default: the working tree)")
+	parser.add_argument("--modes", nargs = "+", default = ["N", "NC"], help = "Assign modes letters, 'None' for no letter (default: N NC)")
+	parser.add_argument("--seeds", nargs = "+", type = int, default = [0], help = "Seeds (default: 0)")
+	parser.add_argument("--steps", type = int, default = NB_STEPS, help = f"Steps of the synthetic traffic (default: {NB_STEPS})")
+	args = parser.parse_args()
+	sys.path.insert(0, ROOT)
+	from src.print import *
+
+	# Run every combination
+	rows: list[tuple] = []
+	nb_divergences: int = 0
+	with tempfile.TemporaryDirectory(prefix = "compare_engines_") as workdir:
+		for mode_name in args.modes:
+			mode_letters: str = "" if mode_name == "None" else mode_name
+			for seed in args.seeds:
+				reference: dict = run_engine(args.reference, mode_letters, seed, args.steps, workdir)
+				rows.append((mode_name, seed, args.reference, len(reference["qos"]), reference["time"], 1.0, "reference"))
+				for spec in args.candidates:
+					candidate: dict = run_engine(spec, mode_letters, seed, args.steps, workdir)
+					divergence: str|None = first_divergence(reference, candidate)
+					if divergence is not None:
+						nb_divergences += 1
+						warning(f"[{mode_name}, seed {seed}] {spec} diverges from {args.reference} at {divergence}")
+					rows.append((mode_name, seed, spec, len(candidate["qos"]), candidate["time"], reference["time"] / candidate["time"], "ok" if divergence is None else "DIVERGES"))
+
+	# Print the table
+	info(f"{'Mode':>6} | {'Seed':>4} | {'Engine':<24} | {'Steps':>6} | {'Time (s)':>9} | {'Steps/s':>8} | {'Speed-up':>8} | Result")
+	for mode_name, seed, spec, nb_steps, elapsed, speed_up, result in rows:
+		info(f"{mode_name:>6} | {seed:>4} | {spec:<24} | {nb_steps:>6} | {elapsed:>9.3f} | {nb_steps / elapsed:>8.1f} | {speed_up:>7.2f}x | {result}")
+	if nb_divergences:
+		error(f"{nb_divergences} candidate run(s) diverged from the reference", exit = False)
+		sys.exit(1)
+	info("Every candidate is equivalent to the reference")
+
@@ -11,6 +11,7 @@ K_TASKS: float = 3.0		# Coefficient for the number of allocated tasks in the QoS
 K_NODES: float = 1.0		# Coefficient for the nodes usage
 K_LINKS: float = 1.0		# Coefficient for the links load
 K_COST: float = 0.1			# Coefficient for the cost of the tasks multiplied by the distance from the vehicle
+K_CLOUD: float = 0.1		# Coefficient for the cost of the tasks offloaded to the cloud multiplied by the uplink distance
 
 
 ## Constants
@@ -20,10 +21,90 @@ FOG_SHAPE: list[tuple] = [(0, 0), (0, FOG_SIZE), (FOG_SIZE, FOG_SIZE), (FOG_SIZE
 COST_RANGE: tuple[int,int,int] = (1, 10, 1)
 NB_FOG_NODES: int = 10
 MAX_NEIGHBOURS: int = 5
+MAX_OFFLOAD_HOPS: int = 3	# Maximum number of links a task can be forwarded through (1 means only direct neighbours)
+TRANSFER_DELAYS: bool = True		# Delay the start of a task forwarded to another fog node by its transfer time, holding the links capacity meanwhile
+STEPS_PER_LATENCE: float = 0.001	# Transfer steps per unit of link latence (the latence of a link is the distance between its fog nodes, in meters)
+TOPOLOGY_EVENTS: list[tuple] = []	# Fog nodes joining or leaving during the simulation: (step, "add", (x, y)) or (step, "remove", fog_id)
+FAILED_NODE_TASKS: str = "reoffer"	# Tasks of a removed fog node: "reoffer" (back to pending, restarted from the beginning) or "fail"
+TOPOLOGY_CELL_SIZE: float = 500.0	# Size of the cells of the spatial index of the fog nodes (in meters)
+K_NEAREST_FOGS: int = 3				# Number of candidate fog nodes of the k-nearest placement (AssignMode "K")
+BEST_FIT_WEIGHTS: tuple[float,float,float] = (1.0, 1.0, 0.5)	# Weights of the residual capacity, distance*cost and usage in the score of the candidates
 RANDOM_DIVIDER: int = 3
 PLOT_INTERVAL: int = 1
+
+# Fog nodes placement
+FOG_PLACEMENT: str = "random"					# "random" (uniform around the visual center) or "density" (weighted k-means on road and traffic density)
+NET_FILE: str = "Reims/osm.net.xml.gz"			# Network parsed for the density placement (cached in "{NET_FILE}.geometry.npz")
+PLACEMENT_CELL_SIZE: float = 100.0				# Size of the cells of the density grid (in meters)
+PLACEMENT_TRAFFIC_WEIGHT: float = 1.0			# Weight of the recorded traffic density compared to the road density
+PLACEMENT_POSITIONS_FILE: str|None = None		# Recorded vehicles positions used for the traffic density (e.g. "outputs/high/Reims_NC/positions.npy")
+RECORD_POSITIONS_INTERVAL: int = 0				# Record the vehicles positions every N steps in "{simulation_name}/positions.npy" (0 to disable)
 DEBUG_LINKS_CHARGES: bool = False	# Debug the links charges
 
+# Logging (records are formatted and written by a background thread, see src/logger.py)
+LOG_LEVEL: str = "DEBUG"		# Minimum level of the records: "DEBUG", "INFO", "WARNING" or "ERROR" (records below cost a comparison)
+LOG_ASYNC: bool = True			# Write the records from a background thread instead of the simulation loop
+LOG_JSON: bool = False			# Also write the records as JSON lines into "{simulation_name}/log.jsonl"
+
 # Plot resolution
 DPI_MULTIPLIER = 2
 
+
+# Retention of finished tasks
+RETAIN_FINISHED_TASKS: bool = False	# Keep every completed/failed task object in memory (unbounded on long runs)
+STREAM_TASK_RECORDS: bool = False	# Stream a JSON line per finished task into "{simulation_name}/task_records.jsonl"
+
+# Scheduling of the tasks
+SCHEDULER: str = "fifo"								# "fifo" (arrival order), "edf" (earliest deadline first) or "edf_cost" (least slack per cost first), both with admission control
+DEADLINE_SLACK_RANGE: tuple[int,int,int] = (0, 10, 1)	# Min, Max and step of the slack given to a task on top of its resolving time to compute its deadline
+
+# Cloud tier (receives the tasks rejected by the fog layer instead of leaving them pending)
+CLOUD_ENABLED: bool = False
+CLOUD_RESOURCES: tuple[int,int,int] = (20000, 262144, 32768)	# CPU, RAM and Storage of the cloud
+CLOUD_UPLINK_BANDWIDTH: int = 2000	# Bandwidth charge the uplink can carry per step (the charges of the tasks sent during the step)
+CLOUD_LATENCY_STEPS: int = 3		# Steps before a task sent to the cloud starts (uplink latency)
+CLOUD_DISTANCE: float = 10000.0		# Distance between a vehicle and the cloud used in the distance*cost term of the QoS (in meters)
+
+# Demand forecasting (moves cheap tasks away from the fog nodes predicted to saturate, in the modes where fog nodes communicate)
+FORECAST_ENABLED: bool = False
+FORECAST_ALPHA: float = 0.3				# Smoothing factor of the level of the demand (Holt's linear smoothing)
+FORECAST_BETA: float = 0.1				# Smoothing factor of the trend of the demand
+FORECAST_HORIZON: int = 3				# Number of steps ahead of the forecast
+FORECAST_SATURATION: float = 0.9		# Predicted CPU usage from which a fog node is considered saturating
+FORECAST_MIGRATION_BUDGET: int = 10		# Maximum number of tasks moved per step
+
+# Mobility-aware handover (refreshes the tasks distances and moves the tasks far from their vehicle, in the modes where fog nodes communicate)
+HANDOVER_ENABLED: bool = False
+HANDOVER_INTERVAL: int = 5				# Number of steps between two handover passes
+HANDOVER_DISTANCE_RATIO: float = 2.0	# A task is moved if its fog node is at least this times farther from the vehicle than another one
+HANDOVER_MIN_DISTANCE: float = 200.0	# Minimum distance gained by moving a task (in meters)
+HANDOVER_BUDGET: int = 20				# Maximum number of tasks moved per pass
+
+# Execution of the tasks on the fog nodes
+EXECUTION_MODEL: str = "unit"		# "unit" (every task progresses by 1 per step) or "processor_sharing" (tasks slow down when the CPU usage of their fog node is above EXECUTION_KNEE)
+EXECUTION_KNEE: float = 0.7			# CPU usage up to which the tasks run at full speed with processor sharing (above, rate = knee / usage)
+
+# Admission summaries (per step bounds rejecting in O(1) the offers that cannot succeed, the results are unchanged)
+ADMISSION_CACHE: bool = True
+ADMISSION_CACHE_SIZE: int = 8		# Number of failed offers remembered per fog node during a step
+
+# Latency tracking
+LATENCY_BUCKETS: int = 256	# Number of one step buckets of the latency histograms (longer latencies are counted in an overflow bucket)
+
+# Live metrics of the running simulations (Prometheus text format)
+METRICS_EXPORT: bool = False		# Rewrite "{simulation_name}/metrics.prom" every METRICS_INTERVAL seconds from a background thread
+METRICS_INTERVAL: float = 1.0		# Time between two rewrites of the metrics file (in seconds)
+METRICS_PORT: int|None = None		# Serve the metrics on http://127.0.0.1:{port}/metrics if not None (parallel simulations use the next ports)
+
+# Adaptive step coarsening of the fog algorithm (for long headless runs, metrics of skipped steps are carried forward)
+ALGORITHM_INTERVAL: int = 1			# Run the fog algorithm at least every N steps (1 to run it every step)
+ALGORITHM_ON_EVENTS: bool = False	# Also run it on vehicle arrivals or departures and when a task should complete
+PENDING_TASKS_TRIGGER: int = 0		# Also run it every step while there are at least N pending tasks (0 to disable)
+
+# Real-time budget of the fog algorithm (offers beyond the budget are deferred to the next step, see src/budget.py)
+REALTIME_BUDGET: float|None = None	# Time budget of each step of the fog algorithm (in seconds), None to disable
+REALTIME_PRIORITY: str = "cost"		# Order of the offers within the budget: "cost" (most expensive first) or "deadline" (earliest deadline first)
+
+# Multi-tenant simulations (several fog layers driven by one traffic simulation, see src/multitenant.py)
+MULTI_TENANT_BUFFER: int = 16		# Number of steps the traffic can be ahead of the slowest tenant
+MULTI_TENANT_TIMEOUT: float = 1.0	# Interval between two checks of the tenants while waiting for them (failed or dead tenants stop the simulation)
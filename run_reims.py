@@ -1,18 +1,27 @@
 
 # Imports
 from src.main import run_simulation
+from src.sharding import run_sharded_simulation
+from src.multitenant import run_multi_tenant_simulation
 from src.utils import *
 from src.resources import Resource
+from src.transport import export_evaluations, load_evaluations
+from src.aggregation import EvaluationsAggregator
+from concurrent.futures import ProcessPoolExecutor
 from multiprocessing import Pool
+import os
 
 # Constants
 SEED: int = 0
+SEEDS: list[int] = [SEED]	# Seeds replicated for each assign mode, the comparisons show the mean and confidence band when there are multiple ones
 SUMO_CONFIG: str = "Reims/osm.sumocfg"
 VISUAL_CENTER: tuple[int,int] = (1200, 1600)
 DEBUG_PERF: bool = False
 AUTO_START: bool = True		# --start
 AUTO_QUIT: bool = True		# --quit-on-end
 OPEN_GUI: bool = True		# "sumo-gui" when True, "sumo" when False
+NB_SHARDS: int = 1			# Number of worker processes per simulation (fog regions), 1 to disable the sharded mode (its results are written apart, see simulation_path)
+MULTI_TENANT: bool = False	# Run the assign modes of each seed on one traffic simulation (one SUMO instead of one per assign mode)
 
 # Assign modes: uncomment to enable simulation
 ASSIGN_MODES: list[tuple[AssignMode, str, tuple[int,int,int]]] = [
@@ -24,6 +33,7 @@ ASSIGN_MODES: list[tuple[AssignMode, str, tuple[int,int,int]]] = [
 	# (AssignMode.ALL,								"high", Resource.HIGH_RANDOM_RESOURCE_ARGS),
 	(AssignMode(neighbours = True, cost = True),	"high", Resource.HIGH_RANDOM_RESOURCE_ARGS),
 	# (AssignMode(neighbours = True),					"high", Resource.HIGH_RANDOM_RESOURCE_ARGS),
+	# (AssignMode(neighbours = True, k_nearest = True),	"high", Resource.HIGH_RANDOM_RESOURCE_ARGS),
 	# (AssignMode(),									"high", Resource.HIGH_RANDOM_RESOURCE_ARGS),
 
 	# (AssignMode.ALL,								"extreme", Resource.EXTREME_RANDOM_RESOURCE_ARGS),
@@ -33,18 +43,41 @@ ASSIGN_MODES: list[tuple[AssignMode, str, tuple[int,int,int]]] = [
 ]
 
 # Disable the GUI opening if too many window
-if OPEN_GUI and len(ASSIGN_MODES) > 4:
+if OPEN_GUI and len(ASSIGN_MODES) * len(SEEDS) > 4:
 	OPEN_GUI = False
 
+# Name of a simulation (every seed has its own sub folder when multiple seeds are replicated)
+# The sharded engine does not give the same results as run_simulation, so its runs are named apart (e.g. "Reims_NC_sharded4")
+def simulation_path(mode: AssignMode, folder: str, seed: int|None = None) -> str:
+	name: str = f"Reims_{mode.name}_sharded{NB_SHARDS}" if NB_SHARDS > 1 else f"Reims_{mode.name}"
+	if seed is None or len(SEEDS) == 1:
+		return f"outputs/{folder}/{name}"
+	return f"outputs/{folder}/{name}/seed_{seed}"
+
 # Thread method
-def thread(args: tuple[AssignMode, str, tuple[int,int,int]]) -> dict:
+def thread(args: tuple[AssignMode, str, tuple[int,int,int], int]) -> dict:
+	if NB_SHARDS > 1:
+		return run_sharded_simulation(
+			simulation_name = simulation_path(args[0], args[1], args[3]),
+			assign_mode = args[0],
+			nb_shards = NB_SHARDS,
+			sumo_config = SUMO_CONFIG,
+			visual_center = VISUAL_CENTER,
+			folder = args[1],
+			seed = args[3],
+			debug_perf = DEBUG_PERF,
+			auto_start = AUTO_START,
+			auto_quit = AUTO_QUIT,
+			open_gui = OPEN_GUI,
+			fog_resources = args[2]
+		)
 	return run_simulation(
-		simulation_name = f"outputs/{args[1]}/Reims_{args[0].name}",
+		simulation_name = simulation_path(args[0], args[1], args[3]),
 		assign_mode = args[0],
 		sumo_config = SUMO_CONFIG,
 		visual_center = VISUAL_CENTER,
 		folder = args[1],
-		seed = SEED,
+		seed = args[3],
 		debug_perf = DEBUG_PERF,
 		auto_start = AUTO_START,
 		auto_quit = AUTO_QUIT,
@@ -52,17 +85,61 @@ def thread(args: tuple[AssignMode, str, tuple[int,int,int]]) -> dict:
 		fog_resources = args[2]
 	)
 
+# Thread method returning only a small handle to the evaluations (written in a memory-mapped file)
+def transport_thread(args: tuple[AssignMode, str, tuple[int,int,int], int]) -> dict:
+	return export_evaluations(thread(args))
+
 # Main method
 if __name__ == "__main__":
 
-	# Run the simulation in multiple threads
-	NB_THREADS: int = len(ASSIGN_MODES)
-	with Pool(processes = NB_THREADS) as pool:
-		evaluations_per_mode: list[dict] = pool.map(thread, ASSIGN_MODES)
+	# Every simulation to run (each assign mode with each seed)
+	JOBS: list[tuple[AssignMode, str, tuple[int,int,int], int]] = [(mode, folder, args, seed) for mode, folder, args in ASSIGN_MODES for seed in SEEDS]
+
+	# Order of the simulations in the comparisons
+	ORDER: list[str] = [simulation_path(mode, folder) for mode, folder, args in ASSIGN_MODES]
+	remaining: dict[str, int] = {folder: 0 for mode, folder, args in ASSIGN_MODES}
+	for mode, folder, args, seed in JOBS:
+		remaining[folder] += 1
+
+	# Process the results as soon as they arrive: per run outputs at once, comparisons when a preset is complete
+	# With multiple seeds, each run is folded into streaming statistics and released (memory does not grow with the number of seeds)
+	handles_per_folder: dict[str, list[dict]] = {}
+	aggregators: dict[str, EvaluationsAggregator] = {}
+	def on_result(handle: dict) -> None:
+		folder: str = handle["folder"]
+		remaining[folder] -= 1
+		if len(SEEDS) > 1:
+			r_dict: dict = load_evaluations(handle)
+			process_single_evaluation(r_dict)
+			simulation_name: str = "/".join(r_dict["simulation_name"].split("/")[:-1])
+			aggregators.setdefault(simulation_name, EvaluationsAggregator(folder, simulation_name)).add(r_dict)
+			del r_dict
+			if remaining[folder] == 0:
+				names: list[str] = sorted((name for name in aggregators if aggregators[name].folder == folder), key = ORDER.index)
+				process_aggregated_comparison([aggregators.pop(name).summary() for name in names])
+			return
+
+		process_single_evaluation(load_evaluations(handle, release = False))
+		handles_per_folder.setdefault(folder, []).append(handle)
+		if remaining[folder] == 0:
+			handles: list[dict] = sorted(handles_per_folder.pop(folder), key = lambda h: ORDER.index(h["simulation_name"]))
+			process_evaluations_comparison([load_evaluations(h) for h in handles])
 
-	# For each preset type, process the results
-	USED_ASSIGN_FOLDERS: list[str] = [folder for mode, folder, args in ASSIGN_MODES]	# Used to generate the output folders
-	for folder in USED_ASSIGN_FOLDERS:
-		evaluations: list[dict] = [x for x in evaluations_per_mode if x["folder"] == folder]
-		process_simulation_evaluations(evaluations)
+	# Run the simulation in multiple threads (one after the other in sharded mode, as shards are already processes)
+	# Every simulation gets a fresh process: the simulation state lives on the classes and is not reset between runs
+	if NB_SHARDS > 1:
+		with ProcessPoolExecutor(max_workers = 1, max_tasks_per_child = 1) as executor:	# Not daemonic, so it can start the shards
+			for handle in executor.map(transport_thread, JOBS):
+				on_result(handle)
 
+	# Or run every assign mode of a seed as a tenant of the same traffic simulation (tenants are already processes)
+	elif MULTI_TENANT:
+		for seed in SEEDS:
+			tenants: list[tuple] = [(simulation_path(mode, folder, seed), mode, folder, args) for mode, folder, args in ASSIGN_MODES]
+			for handle in run_multi_tenant_simulation(tenants, SUMO_CONFIG, VISUAL_CENTER, seed, DEBUG_PERF, AUTO_START, AUTO_QUIT, OPEN_GUI):
+				on_result(handle)
+	else:
+		NB_THREADS: int = min(len(JOBS), os.cpu_count() or 1) if len(SEEDS) > 1 else len(JOBS)
+		with Pool(processes = NB_THREADS, maxtasksperchild = 1) as pool:
+			for handle in pool.imap_unordered(transport_thread, JOBS):
+				on_result(handle)
@@ -0,0 +1,114 @@
+
+# Imports
+from __future__ import annotations
+from src.resources import Resource
+from src.task import Task
+from src.utils import AssignMode
+from config import *
+import math
+
+INFINITE: tuple[float,float,float] = (math.inf, math.inf, math.inf)
+
+
+# Admission summary of a fog node
+class AdmissionSummary():
+	""" Bounds used to reject in O(1) the offers that cannot succeed, without walking the routes or the replaceable tasks:
+	- neighbourhood_free: upper bound of the free resources (per type) of the fog nodes reachable through the routes
+	- min_cost: lower bound of the cost of the tasks of the fog node (only cheaper tasks can be replaced by the cost mode)
+	- failed: signatures of the offers that failed during the step, an offer needing at least as much (resources, charge, and
+	at most the same cost in the cost mode) fails too as long as no resource is released (not used with the QoS mode)\n
+	The bounds are computed exactly at the start of each step (see refresh), then kept valid incrementally:
+	assignments only lower the free resources (the upper bound stays valid) and lower the minimum cost,
+	releases raise the bound of the fog nodes routing to the released one (see FogNode.routed_by)
+	"""
+	enabled: bool = ADMISSION_CACHE
+	cache_size: int = ADMISSION_CACHE_SIZE
+	fast_rejections: int = 0		# Offers rejected by the summaries
+	release_epoch: int = 0			# Incremented each time resources are released by a fog node (invalidates the failed offers)
+
+	def __init__(self, fog: "FogNode") -> None:	# type: ignore
+		""" AdmissionSummary constructor (the bounds reject nothing until the first refresh)
+		Args:
+			fog	(FogNode):	Fog node summarized
+		"""
+		self.fog: "FogNode" = fog	# type: ignore
+		self.neighbourhood_free: tuple[float,float,float] = INFINITE
+		self.min_cost: float = -math.inf
+		self.failed: list[tuple] = []		# Signatures of the failed offers (see signature)
+		self.failed_epoch: int = -1			# Release epoch of the failed offers
+
+	def get_free(self) -> tuple[float,float,float]:
+		""" Free resources of the fog node (cpu, ram, storage) """
+		resources, used = self.fog.resources, self.fog.used_resources
+		return (resources.cpu - used.cpu, resources.ram - used.ram, resources.storage - used.storage)
+
+	@staticmethod
+	def refresh(fogs: set["FogNode"]) -> None:	# type: ignore
+		""" Compute the exact bounds of every fog node (called at the start of each algorithm step)
+		Args:
+			fogs	(set[FogNode]):	Set of fog nodes
+		"""
+		if not AdmissionSummary.enabled:
+			return
+		free: dict = {fog: fog.admission.get_free() for fog in fogs}
+		for fog in fogs:
+			reachable: list[tuple[float,float,float]] = [free[route.destination] for route in fog.routes if route.destination in free]
+			fog.admission.neighbourhood_free = tuple(max(values) for values in zip(*reachable)) if reachable else (-math.inf, -math.inf, -math.inf)
+			fog.admission.min_cost = min((task.cost for task in fog.assigned_tasks), default = math.inf)
+			fog.admission.failed = []
+
+	def on_assign(self, task: Task) -> None:
+		""" Update the bounds after the assignment of a task to the fog node """
+		if task.cost < self.min_cost:
+			self.min_cost = task.cost
+
+	def on_release(self) -> None:
+		""" Update the bounds of the fog nodes routing to this one after some of its resources were released """
+		AdmissionSummary.release_epoch += 1
+		free: tuple[float,float,float] = self.get_free()
+		for source in self.fog.routed_by:
+			cpu, ram, storage = source.admission.neighbourhood_free
+			source.admission.neighbourhood_free = (max(cpu, free[0]), max(ram, free[1]), max(storage, free[2]))
+
+	def may_forward(self, resource: Resource) -> bool:
+		""" Check if a fog node reachable through the routes may have enough free resources for the given ones """
+		if not AdmissionSummary.enabled:
+			return True
+		cpu, ram, storage = self.neighbourhood_free
+		return resource.cpu <= cpu and resource.ram <= ram and resource.storage <= storage
+
+	def may_replace(self, task: Task) -> bool:
+		""" Check if the fog node may have a task cheaper than the given one (cost mode) """
+		return not AdmissionSummary.enabled or task.cost > self.min_cost
+
+	@staticmethod
+	def signature(task: Task, mode: AssignMode) -> tuple:
+		""" Signature of an offer: the bigger each value, the harder the offer (cost only matters in the cost mode) """
+		return (task.resource.cpu, task.resource.ram, task.resource.storage, task.bandwidth_charge, -task.cost if mode.cost else 0)
+
+	def known_failure(self, task: Task, mode: AssignMode) -> bool:
+		""" Check if the offer of a task is at least as hard as an offer that already failed since the last release """
+		if not self.failed or self.failed_epoch != AdmissionSummary.release_epoch or not AdmissionSummary.enabled or mode.qos or not (mode.cost or mode.neighbours):
+			return False
+		cpu, ram, storage, charge, cost = AdmissionSummary.signature(task, mode)
+		for failed_cpu, failed_ram, failed_storage, failed_charge, failed_cost in self.failed:
+			if cpu >= failed_cpu and ram >= failed_ram and storage >= failed_storage and charge >= failed_charge and cost >= failed_cost:
+				return True
+		return False
+
+	def record_failure(self, task: Task, mode: AssignMode) -> None:
+		""" Remember a failed offer (the oldest one is forgotten when the cache is full) """
+		if not AdmissionSummary.enabled or mode.qos:
+			return
+		if self.failed_epoch != AdmissionSummary.release_epoch:
+			self.failed = []
+			self.failed_epoch = AdmissionSummary.release_epoch
+		self.failed.append(AdmissionSummary.signature(task, mode))
+		if len(self.failed) > AdmissionSummary.cache_size:
+			self.failed.pop(0)
+
+	def reject(self) -> bool:
+		""" Count an offer rejected by the summaries and return False (result of the offer) """
+		AdmissionSummary.fast_rejections += 1
+		return False
+
@@ -0,0 +1,198 @@
+
+# Imports
+from src.utils import METADATA_KEYS
+import numpy as np
+
+# Quantiles estimated for each step of the aggregated series
+AGGREGATED_QUANTILES: tuple[float,float,float] = (0.05, 0.5, 0.95)
+
+
+# Streaming estimation of a quantile for each step of a series (P² algorithm, vectorized over the steps)
+class P2Quantile():
+	def __init__(self, quantile: float) -> None:
+		""" P2Quantile constructor (Jain and Chlamtac P² algorithm: 5 markers per step, no observation is stored)
+		Args:
+			quantile	(float):	Quantile to estimate (between 0 and 1)
+		"""
+		self.quantile: float = quantile
+		self.heights: np.ndarray = np.zeros((5, 0))									# Height of the markers
+		self.positions: np.ndarray = np.zeros((5, 0))								# Actual position of the markers
+		self.desired: np.ndarray = np.zeros((5, 0))									# Desired position of the markers
+		self.increments: np.ndarray = np.array([0, quantile / 2, quantile, (1 + quantile) / 2, 1])[:, None]
+		self.counts: np.ndarray = np.zeros(0, dtype = np.int64)
+
+	def grow(self, length: int) -> None:
+		""" Grow the number of steps (new steps have no observation yet) """
+		extra: int = length - len(self.counts)
+		if extra <= 0:
+			return
+		self.heights = np.concatenate([self.heights, np.zeros((5, extra))], axis = 1)
+		self.positions = np.concatenate([self.positions, np.tile(np.arange(1.0, 6.0)[:, None], extra)], axis = 1)
+		self.desired = np.concatenate([self.desired, np.tile((1 + 4 * self.increments), extra)], axis = 1)
+		self.counts = np.concatenate([self.counts, np.zeros(extra, dtype = np.int64)])
+
+	def add(self, series: np.ndarray) -> None:
+		""" Add one observation per step (the first len(series) steps)
+		Args:
+			series	(np.ndarray):	Values of a run
+		"""
+		self.grow(len(series))
+		steps: np.ndarray = np.arange(len(series))
+		counts: np.ndarray = self.counts[:len(series)]
+
+		# The 5 first observations of a step are stored in the markers, then sorted
+		filling: np.ndarray = counts < 5
+		if filling.any():
+			self.heights[counts[filling], steps[filling]] = series[filling]
+			full: np.ndarray = steps[filling][counts[filling] == 4]
+			self.heights[:, full] = np.sort(self.heights[:, full], axis = 0)
+
+		# Update the markers of the other steps
+		updating: np.ndarray = steps[~filling]
+		if len(updating):
+			self.update(updating, series[~filling])
+		self.counts[:len(series)] += 1
+
+	def update(self, steps: np.ndarray, values: np.ndarray) -> None:
+		""" P² update of the markers of the given steps """
+		q: np.ndarray = self.heights[:, steps]
+		n: np.ndarray = self.positions[:, steps]
+
+		# Find the cell of each value (extremes markers are moved if needed) and shift the positions of the markers above
+		q[0] = np.minimum(q[0], values)
+		q[4] = np.maximum(q[4], values)
+		cells: np.ndarray = np.clip((values[None, :] >= q[1:4]).sum(axis = 0), 0, 3)
+		n += (np.arange(5)[:, None] > cells[None, :])
+		self.desired[:, steps] += self.increments
+
+		# Adjust the 3 middle markers (parabolic prediction, linear if it would break the order)
+		desired: np.ndarray = self.desired[:, steps]
+		for i in (1, 2, 3):
+			d: np.ndarray = desired[i] - n[i]
+			move: np.ndarray = ((d >= 1) & (n[i + 1] - n[i] > 1)) | ((d <= -1) & (n[i - 1] - n[i] < -1))
+			if not move.any():
+				continue
+			sign: np.ndarray = np.sign(d[move])
+			qm, qi, qp = q[i - 1, move], q[i, move], q[i + 1, move]
+			nm, ni, np_ = n[i - 1, move], n[i, move], n[i + 1, move]
+			parabolic: np.ndarray = qi + sign / (np_ - nm) * ((ni - nm + sign) * (qp - qi) / (np_ - ni) + (np_ - ni - sign) * (qi - qm) / (ni - nm))
+			linear: np.ndarray = qi + sign * (np.where(sign > 0, qp, qm) - qi) / (np.where(sign > 0, np_, nm) - ni)
+			q[i, move] = np.where((qm < parabolic) & (parabolic < qp), parabolic, linear)
+			n[i, move] += sign
+		self.heights[:, steps] = q
+		self.positions[:, steps] = n
+
+	def estimate(self) -> np.ndarray:
+		""" Estimate of the quantile for each step (exact while a step has less than 5 observations, NaN without any)
+		Returns:
+			np.ndarray: Quantile of each step
+		"""
+		estimate: np.ndarray = self.heights[2].copy()
+		for count in range(5):
+			steps: np.ndarray = np.flatnonzero(self.counts == count)
+			if count == 0:
+				estimate[steps] = np.nan
+			elif len(steps):
+				estimate[steps] = np.quantile(np.sort(self.heights[:count, steps], axis = 0), self.quantile, axis = 0)
+		return estimate
+
+
+# Streaming statistics of a series over multiple runs
+class SeriesAggregator():
+	def __init__(self, quantiles: tuple[float,...] = AGGREGATED_QUANTILES) -> None:
+		""" SeriesAggregator constructor: running mean and variance (Welford) and quantile sketches for each step\n
+		The memory only depends on the length of the series, not on the number of runs
+		Args:
+			quantiles	(tuple):	Quantiles to estimate
+		"""
+		self.counts: np.ndarray = np.zeros(0, dtype = np.int64)
+		self.means: np.ndarray = np.zeros(0)
+		self.m2: np.ndarray = np.zeros(0)		# Sum of the squared differences from the mean
+		self.quantiles: list[P2Quantile] = [P2Quantile(quantile) for quantile in quantiles]
+
+	def add(self, series: list[float]) -> None:
+		""" Fold the series of a run into the statistics
+		Args:
+			series	(list[float]):	Values of the run for each step
+		"""
+		values: np.ndarray = np.asarray(series, dtype = np.float64)
+		length: int = len(values)
+		if length > len(self.counts):
+			extra: int = length - len(self.counts)
+			self.counts = np.concatenate([self.counts, np.zeros(extra, dtype = np.int64)])
+			self.means = np.concatenate([self.means, np.zeros(extra)])
+			self.m2 = np.concatenate([self.m2, np.zeros(extra)])
+
+		# Welford update of the steps of the run
+		self.counts[:length] += 1
+		delta: np.ndarray = values - self.means[:length]
+		self.means[:length] += delta / self.counts[:length]
+		self.m2[:length] += delta * (values - self.means[:length])
+		for quantile in self.quantiles:
+			quantile.add(values)
+
+	def variance(self) -> np.ndarray:
+		""" Sample variance of each step (0 with less than 2 runs) """
+		return np.divide(self.m2, self.counts - 1, out = np.zeros_like(self.m2), where = self.counts > 1)
+
+	def confidence_band(self, z: float = 1.96) -> tuple[np.ndarray, np.ndarray]:
+		""" Confidence interval of the mean of each step (normal approximation, 95% by default)
+		Args:
+			z	(float):	Number of standard errors on each side of the mean
+		Returns:
+			tuple[np.ndarray, np.ndarray]: Lower and upper bounds
+		"""
+		margin: np.ndarray = z * np.sqrt(self.variance() / np.maximum(self.counts, 1))
+		return self.means - margin, self.means + margin
+
+	def summary(self) -> dict[str, list[float]]:
+		""" Statistics of the series for the saved outputs
+		Returns:
+			dict[str,list[float]]: Runs count, mean, standard deviation, confidence band and quantiles of each step
+		"""
+		low, high = self.confidence_band()
+		summary: dict[str, list[float]] = {
+			"runs": self.counts.tolist(),
+			"mean": self.means.tolist(),
+			"std": np.sqrt(self.variance()).tolist(),
+			"ci_low": low.tolist(),
+			"ci_high": high.tolist(),
+		}
+		for quantile in self.quantiles:
+			summary[f"p{round(quantile.quantile * 100)}"] = quantile.estimate().tolist()
+		return summary
+
+
+# Streaming statistics of the evaluations of every run of a simulation (same mode and preset, different seeds)
+class EvaluationsAggregator():
+	def __init__(self, folder: str, simulation_name: str) -> None:
+		""" EvaluationsAggregator constructor
+		Args:
+			folder			(str):	Folder of the simulation (preset)
+			simulation_name	(str):	Name of the simulation, without the seed
+		"""
+		self.folder: str = folder
+		self.simulation_name: str = simulation_name
+		self.nb_runs: int = 0
+		self.series: dict[str, SeriesAggregator] = {}
+
+	def add(self, r_dict: dict) -> None:
+		""" Fold the evaluations of a run (return value of a simulation), the run can be released afterwards
+		Args:
+			r_dict	(dict):	Evaluations of the run
+		"""
+		for label, values in r_dict.items():
+			if label not in METADATA_KEYS:
+				self.series.setdefault(label, SeriesAggregator()).add(values)
+		self.nb_runs += 1
+
+	def summary(self) -> dict:
+		""" Statistics of every evaluation (same metadata keys as the return value of a simulation)
+		Returns:
+			dict: Metadata, number of runs and the statistics of each label (see SeriesAggregator.summary)
+		"""
+		summary: dict = {"folder": self.folder, "simulation_name": self.simulation_name, "name": self.simulation_name.split("/")[-1], "runs": self.nb_runs}
+		for label, aggregator in self.series.items():
+			summary[label] = aggregator.summary()
+		return summary
+
@@ -6,17 +6,28 @@ from src.resources import Resource
 from src.vehicle import Vehicle
 from src.task import Task, TaskStates
 from src.fog import FogNode, FogNodesLink
+from src.scheduler import FogScheduler
+from src.routing import TransferQueue
+from src.cloud import CloudNode
+from src.forecast import DemandForecaster
+from src.handover import TaskHandover
+from src.execution import ExecutionModel
+from src.admission import AdmissionSummary
+from src.budget import StepBudget
+from src.mobility import get_mobility
 from config import *
 import numpy as np
 import random
+import math
 import traci
 
 # Solution Algortihm
-def solution_algorithm_step(fogs: set[FogNode], assign_mode: AssignMode) -> float:
+def solution_algorithm_step(fogs: set[FogNode], assign_mode: AssignMode, elapsed_steps: int = 1) -> float:
 	""" This function is called at each step of the simulation.\n
 	Args:
-		fogs		(set):			Set of fog nodes
-		assign_mode	(AssignMode):	Configuration of how the tasks are assigned
+		fogs			(set):			Set of fog nodes
+		assign_mode		(AssignMode):	Configuration of how the tasks are assigned
+		elapsed_steps	(int):			Number of steps since the last call (see StepCoarsening)
 	Returns:
 		float: Time taken to progress the algorithm
 	"""
@@ -24,30 +35,122 @@ def solution_algorithm_step(fogs: set[FogNode], assign_mode: AssignMode) -> floa
 
 	# Reset fog links charge
 	FogNode.reset_links_charges(fogs, debug_msg = DEBUG_LINKS_CHARGES)
+
+	# Deliver the tasks transferred between fog nodes that arrive at this step, free the cloud uplink and refresh the admission summaries
+	TransferQueue.deliver(Task.current_step)
+	CloudNode.reset_uplink()
+	AdmissionSummary.refresh(fogs)
 	
 	# Delete all vehicles that are not in the simulation anymore and create new ones if any
 	Vehicle.acknowledge_removed_vehicles()
 	Vehicle.acknowledge_new_vehicles()
 
-	# Vehicle routine
-	for vehicle in Vehicle.vehicles:
+	# If no tasks, generate tasks (for every vehicle at once)
+	Vehicle.generate_tasks_batch([vehicle for vehicle in Vehicle.vehicles if vehicle.not_finished_tasks == 0])
 
-		# If no tasks, generate tasks
-		if vehicle.not_finished_tasks == 0:
-			vehicle.generate_tasks()
+	# Vehicle routine (in the order of their IDs so that the results do not depend on the set iteration order)
+	offers: list[tuple]|None = [] if StepBudget.is_enabled() else None
+	for vehicle in sorted(Vehicle.vehicles, key = lambda vehicle: vehicle.vehicle_id):
 		
 		# If there are pending tasks, calculate distance to fogs and assign tasks
 		if vehicle.not_finished_tasks > 0:
 			vehicle.set_distance_to_fogs(fogs)
-			vehicle.assign_tasks(assign_mode)
+			vehicle.assign_tasks(assign_mode, offers)
+
+	# Offer the collected tasks by priority until the step budget is spent (if a budget is set, it starts with the offers)
+	StepBudget.start()
+	if offers:
+		StepBudget.offer_all(offers, assign_mode)
+		for vehicle in Vehicle.vehicles:
+			vehicle.update_color()
+
+	# Offer the queued tasks by priority (if a scheduler is enabled)
+	if FogScheduler.is_enabled():
+		FogScheduler.drain_all(fogs, assign_mode)
+		for vehicle in Vehicle.vehicles:
+			vehicle.update_color()
 	
+	# Move cheap tasks away from the fog nodes predicted to saturate (if forecasting is enabled)
+	if DemandForecaster.is_enabled():
+		DemandForecaster.update(fogs)
+		if not StepBudget.exhausted():
+			DemandForecaster.rebalance(fogs, assign_mode)
+
+	# Follow the vehicles: refresh the tasks distances and move the tasks far from their vehicle (if handover is enabled)
+	if TaskHandover.is_enabled() and not StepBudget.exhausted():
+		TaskHandover.run(fogs, assign_mode)
+
+	# Count an overrun of the step budget if any
+	StepBudget.finish()
+
 	# Change fog color depending on their resources
 	FogNode.color_usage(fogs)
 	
-	# For each fog node, progress the tasks
-	for fog_node in fogs:
-		fog_node.progress_tasks()
+	# Progress the tasks of every fog node (see ExecutionModel) and of the cloud
+	ExecutionModel.progress(fogs, elapsed_steps)
+	CloudNode.progress_tasks(elapsed_steps)
 	
 	# Return the time taken to progress the algorithm
 	return time.perf_counter() - start_time
 
+
+# Adaptive step coarsening
+class StepCoarsening():
+	def __init__(self, interval: int = ALGORITHM_INTERVAL, on_events: bool = ALGORITHM_ON_EVENTS, pending_trigger: int = PENDING_TASKS_TRIGGER) -> None:
+		""" Decide on which steps the fog algorithm runs: at least every "interval" steps, and on events if asked
+		(vehicle arrivals or departures, expected task completions, too many pending tasks).\n
+		Tasks progress by the number of steps elapsed since the last run, so their time stays correct across skipped steps
+		Args:
+			interval		(int):	Maximum number of steps between two runs (1 to run every step)
+			on_events		(bool):	Whether to also run on vehicle arrivals or departures and expected task completions
+			pending_trigger	(int):	Run every step while there are at least this number of pending tasks (0 to disable)
+		"""
+		self.interval: int = max(1, interval)
+		self.on_events: bool = on_events
+		self.pending_trigger: int = pending_trigger
+		self.last_step: int|None = None
+		self.next_completion_step: float = math.inf		# Step of the next expected task completion
+		self.vehicle_ids: set[str] = set()				# Vehicles known at the last run
+
+	def is_enabled(self) -> bool:
+		""" Returns True if some steps can be skipped """
+		return self.interval > 1
+
+	def should_run(self, step: int) -> bool:
+		""" Check if the fog algorithm should run at the given step
+		Args:
+			step	(int):	Current step of the simulation
+		Returns:
+			bool: True if the algorithm should run
+		"""
+		if self.last_step is None or step - self.last_step >= self.interval:
+			return True
+		if self.pending_trigger > 0 and Task.count(TaskStates.PENDING) >= self.pending_trigger:
+			return True
+		if not self.on_events:
+			return False
+		if step >= self.next_completion_step:
+			return True
+		return set(get_mobility().get_vehicle_ids()) != self.vehicle_ids
+
+	def run(self, fogs: set[FogNode], assign_mode: AssignMode, step: int) -> float:
+		""" Run the fog algorithm, progressing the tasks by the steps elapsed since the last run
+		Args:
+			fogs		(set):			Set of fog nodes
+			assign_mode	(AssignMode):	Configuration of how the tasks are assigned
+			step		(int):			Current step of the simulation
+		Returns:
+			float: Time taken to progress the algorithm
+		"""
+		elapsed_steps: int = 1 if self.last_step is None else step - self.last_step
+		time_taken: float = solution_algorithm_step(fogs, assign_mode, elapsed_steps)
+		self.last_step = step
+
+		# Events of the next steps: expected completions (tasks in transfer are not counted) and known vehicles
+		if self.on_events:
+			remaining: list[int] = [task.resolving_time for fog in fogs for task in fog.assigned_tasks if not task.in_transfer]
+			remaining += [max(task.ready_step - step, 0) + task.resolving_time for task in CloudNode.assigned_tasks]
+			self.next_completion_step = step + min(remaining) if remaining else math.inf
+			self.vehicle_ids = {vehicle.vehicle_id for vehicle in Vehicle.vehicles}
+		return time_taken
+
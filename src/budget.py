@@ -0,0 +1,94 @@
+
+# Imports
+from __future__ import annotations
+from src.task import Task
+from src.utils import AssignMode
+from config import *
+import math
+import time
+
+# Orders of the offers in the budgeted mode
+BUDGET_PRIORITIES: tuple[str,str] = ("cost", "deadline")
+
+
+# Real-time budget of the fog algorithm
+class StepBudget():
+	""" Time budget of the offers of each step of the fog algorithm, to keep up with the wall-clock time (e.g. demos with sumo-gui):
+	- the budget starts once the vehicles routine is done (arrivals, task generation, distances to the fog nodes)
+	- the pending tasks of every vehicle are offered by priority ("cost": most expensive first, "deadline": earliest deadline first)
+	- once the budget is spent, the remaining offers are deferred (the tasks stay pending and are offered again at the next step),
+	as well as the remaining offers of the schedulers and the optional passes (forecast rebalance, handover)
+	- the first offer of a step is always made, so that every step makes progress\n
+	The steps whose offers and passes take longer than the budget anyway are counted as overruns
+	"""
+	budget: float|None = REALTIME_BUDGET
+	priority_policy: str = REALTIME_PRIORITY
+	started: float = 0.0			# Time at which the budget of the current step started (perf_counter)
+	deadline: float = math.inf		# Time at which the budget of the current step is spent (perf_counter)
+	offers: int = 0					# Offers made in the current step
+	overruns: int = 0				# Steps that took longer than the budget
+	deferred_tasks: int = 0			# Offers deferred to the next step
+
+	@staticmethod
+	def is_enabled() -> bool:
+		""" Returns True if the fog algorithm has a time budget per step """
+		if StepBudget.priority_policy not in BUDGET_PRIORITIES:
+			raise ValueError(f"Unknown budget priority '{StepBudget.priority_policy}', expected one of {BUDGET_PRIORITIES}")
+		return StepBudget.budget is not None
+
+	@staticmethod
+	def start() -> None:
+		""" Start the budget of a step (when the offers begin) """
+		StepBudget.started = time.perf_counter()
+		StepBudget.deadline = StepBudget.started + StepBudget.budget if StepBudget.budget is not None else math.inf
+		StepBudget.offers = 0
+
+	@staticmethod
+	def exhausted() -> bool:
+		""" Check if the budget of the current step is spent (always False without budget or before the first offer of the step) """
+		return StepBudget.offers > 0 and StepBudget.deadline != math.inf and time.perf_counter() >= StepBudget.deadline
+
+	@staticmethod
+	def count_offer() -> None:
+		""" Count an offer made in the current step """
+		StepBudget.offers += 1
+
+	@staticmethod
+	def defer(nb_tasks: int) -> None:
+		""" Count offers deferred to the next step """
+		StepBudget.deferred_tasks += nb_tasks
+
+	@staticmethod
+	def finish() -> None:
+		""" Count the step as an overrun if its offers and passes took longer than the budget """
+		if StepBudget.budget is not None and time.perf_counter() - StepBudget.started > StepBudget.budget:
+			StepBudget.overruns += 1
+
+	@staticmethod
+	def priority(task: Task) -> float:
+		""" Priority of an offer (lowest first), tasks without deadline go last with the "deadline" policy
+		Args:
+			task	(Task):	Task offered
+		Returns:
+			float: Priority of the offer
+		"""
+		if StepBudget.priority_policy == "cost":
+			return -task.cost
+		return task.time_constraint if task.time_constraint is not None else math.inf
+
+	@staticmethod
+	def offer_all(offers: list[tuple["Vehicle", "FogNode", Task, list|None]], mode: AssignMode) -> None:	# type: ignore
+		""" Offer the pending tasks of the step by priority until the budget is spent (ties keep the vehicles order)
+		Args:
+			offers	(list[tuple]):	(vehicle, nearest fog node, task, k-nearest candidates) of each pending task (see Vehicle.assign_tasks)
+			mode	(AssignMode):	Configuration of how the tasks are assigned
+		"""
+		offers.sort(key = lambda offer: StepBudget.priority(offer[2]))
+		for i, (vehicle, nearest_fog, task, candidates) in enumerate(offers):
+			if StepBudget.exhausted():
+				StepBudget.defer(len(offers) - i)
+				break
+			StepBudget.count_offer()
+			if vehicle.offer_task(task, nearest_fog, mode, candidates):
+				task.mark_assigned()
+
@@ -0,0 +1,99 @@
+
+# Imports
+from src.resources import Resource
+from src.task import Task, TaskStates
+from config import *
+import math
+
+
+# Cloud tier
+class CloudNode():
+	""" High capacity node reachable from every fog node through an uplink, used when the fog layer rejects a task\n
+	The uplink carries at most CLOUD_UPLINK_BANDWIDTH of bandwidth charge per step, and a task sent to the cloud only
+	starts after CLOUD_LATENCY_STEPS steps. In the QoS, a cloud task costs like a fog task at CLOUD_DISTANCE from its vehicle
+	"""
+	enabled: bool = CLOUD_ENABLED
+	resources: Resource = Resource(*CLOUD_RESOURCES)
+	used_resources: Resource = Resource.empty()
+	assigned_tasks: list[Task] = []
+	uplink_bandwidth: int = CLOUD_UPLINK_BANDWIDTH
+	uplink_charge: int = 0			# Bandwidth charge sent through the uplink during the current step
+	latency_steps: int = CLOUD_LATENCY_STEPS
+	task_costs: float = 0.0			# Sum of sqrt(CLOUD_DISTANCE * cost) of the tasks on the cloud (QoS term, see add_task_distance of FogNode)
+	offloaded_tasks: int = 0		# Number of tasks sent to the cloud since the start of the simulation
+
+	@staticmethod
+	def is_enabled() -> bool:
+		return CloudNode.enabled
+
+	@staticmethod
+	def reset_uplink() -> None:
+		""" Reset the charge of the uplink (called at the start of each algorithm step) """
+		CloudNode.uplink_charge = 0
+
+	@staticmethod
+	def get_usage() -> float:
+		""" Get the highest usage of the resources of the cloud for each type """
+		return (CloudNode.used_resources / CloudNode.resources).max()
+
+	@staticmethod
+	def ask_assign_task(task: Task) -> bool:
+		""" Send a task to the cloud if it has enough resources and the uplink can carry its charge this step
+		Args:
+			task	(Task):	Task rejected by the fog layer
+		Returns:
+			bool: True if the task was assigned, False otherwise
+		"""
+		if not CloudNode.enabled:
+			return False
+		if CloudNode.uplink_charge + task.bandwidth_charge > CloudNode.uplink_bandwidth:
+			return False
+		if not (CloudNode.used_resources + task.resource) <= CloudNode.resources:
+			return False
+
+		# Register the task, it starts once it went through the uplink
+		CloudNode.uplink_charge += task.bandwidth_charge
+		CloudNode.used_resources += task.resource
+		CloudNode.assigned_tasks.append(task)
+		CloudNode.task_costs += math.sqrt(CLOUD_DISTANCE * task.cost)
+		CloudNode.offloaded_tasks += 1
+		task.distance_to_vehicle = CLOUD_DISTANCE
+		task.ready_step = Task.current_step + CloudNode.latency_steps
+		task.progress(0)
+		return True
+
+	@staticmethod
+	def progress_tasks(time_spent: int = 1) -> None:
+		""" Progress the tasks of the cloud (tasks still in the uplink do not progress), sending the results to the vehicles when completed
+		Args:
+			time_spent	(int):	Number of steps since the last progression
+		"""
+		new_list: list[Task] = []
+		for task in CloudNode.assigned_tasks:
+			steps: int = min(time_spent, Task.current_step - task.ready_step + 1)
+			if steps <= 0:
+				new_list.append(task)
+				continue
+			task.progress(steps)
+			if task.state == TaskStates.COMPLETED:
+				task.vehicle.receive_task_result(task)
+				CloudNode.used_resources -= task.resource
+				CloudNode.task_costs -= math.sqrt(CLOUD_DISTANCE * task.cost)
+			else:
+				new_list.append(task)
+		CloudNode.assigned_tasks = new_list
+
+	@staticmethod
+	def get_eval_parameters() -> dict[str, float]:
+		""" Returns the split of the allocated tasks between the fog layer and the cloud (see Evaluator.get_eval_parameters)
+		Returns:
+			dict[str,float]: Keys "cloud_tasks", "fog_tasks", "cloud_cost" and "cloud_offloads"
+		"""
+		cloud_tasks: int = len(CloudNode.assigned_tasks)
+		return {
+			"cloud_tasks": cloud_tasks,
+			"fog_tasks": Task.count(TaskStates.IN_PROGRESS) - cloud_tasks,
+			"cloud_cost": CloudNode.task_costs,
+			"cloud_offloads": CloudNode.offloaded_tasks,
+		}
+
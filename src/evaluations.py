@@ -3,6 +3,14 @@
 from src.task import Task, TaskStates
 from src.vehicle import Vehicle
 from src.fog import FogNode
+from src.scheduler import FogScheduler
+from src.latency import LatencyTracker
+from src.cloud import CloudNode
+from src.forecast import DemandForecaster
+from src.handover import TaskHandover
+from src.execution import ExecutionModel
+from src.admission import AdmissionSummary
+from src.budget import StepBudget
 from config import *
 import numpy as np
 import traci
@@ -19,15 +27,37 @@ class Evaluator():
 		- The minimization of Fog nodes usage
 		- The minimization of Fog nodes links load (how used)
 		- The minimization of the distance of the tasks from the vehicles multiplied by their cost
+		- The minimization of the cost of the tasks offloaded to the cloud (see CloudNode)
 		Args:
 			fogs	(set[FogNode]):	Set of fog nodes
 		Returns:
-			float: Quality of Service (QoS) = k1*allocated_tasks - k2*nodes_usage - k3*links_load - k4*task_distance_cost
+			float: Quality of Service (QoS) = k1*allocated_tasks - k2*nodes_usage - k3*links_load - k4*task_distance_cost - k5*cloud_cost
 		"""
-		return (K_TASKS * len(Task.all_tasks[TaskStates.IN_PROGRESS])) \
-			- (K_NODES * np.var([fog.get_usage() for fog in fogs])) \
-			- (K_LINKS * np.var([fog.get_links_load() for fog in fogs])) \
-			- (K_COST * FogNode.all_task_distances)
+		return Evaluator.combine_qos(
+			allocated_tasks = Task.count(TaskStates.IN_PROGRESS),
+			nodes_usage = np.var([fog.get_usage() for fog in fogs]),
+			links_load = np.var([fog.get_links_load() for fog in fogs]),
+			tasks_distance_cost = FogNode.all_task_distances,
+			cloud_cost = CloudNode.task_costs,
+		)
+
+	@staticmethod
+	def combine_qos(allocated_tasks: float, nodes_usage: float, links_load: float, tasks_distance_cost: float, cloud_cost: float = 0.0) -> float:
+		""" Combine the evaluation parameters into the Quality of Service (QoS) (used to merge evaluations coming from multiple processes)
+		Args:
+			allocated_tasks		(float):	Number of allocated tasks
+			nodes_usage			(float):	Variance of the Fog nodes usage
+			links_load			(float):	Variance of the Fog nodes links load
+			tasks_distance_cost	(float):	Sum of the distance of the tasks from the vehicles multiplied by their cost
+			cloud_cost			(float):	Sum of the uplink distance multiplied by the cost of the tasks on the cloud
+		Returns:
+			float: Quality of Service (QoS) = k1*allocated_tasks - k2*nodes_usage - k3*links_load - k4*task_distance_cost - k5*cloud_cost
+		"""
+		return (K_TASKS * allocated_tasks) \
+			- (K_NODES * nodes_usage) \
+			- (K_LINKS * links_load) \
+			- (K_COST * tasks_distance_cost) \
+			- (K_CLOUD * cloud_cost)
 
 	@staticmethod
 	def get_eval_parameters(fogs: set[FogNode]) -> dict[str,float]:
@@ -35,19 +65,24 @@ class Evaluator():
 		Args:
 			fogs	(set[FogNode]):	Set of fog nodes
 		Returns:
-			dict[str,float]: Allocated tasks, nodes usage, links load, completed tasks, pending tasks, failed tasks, total tasks
+			dict[str,float]: Allocated tasks, nodes usage, links load, completed tasks, pending tasks, failed tasks, total tasks, deadline misses, rejected tasks, mean slack, latency quantiles, migrations, fog/cloud split, forecast migrations, handovers, execution rate, fast rejections, budget overruns and deferred tasks
 		"""
 		# QoS
-		allocated_tasks: float = len(Task.all_tasks[TaskStates.IN_PROGRESS])
+		allocated_tasks: float = Task.count(TaskStates.IN_PROGRESS)
 		nodes_usage: float = np.var([fog.get_usage() for fog in fogs])
 		links_load: float = np.var([fog.get_links_load() for fog in fogs])
 		tasks_distance_cost: float = FogNode.all_task_distances
 
 		# Other
-		completed_tasks: int = len(Task.all_tasks[TaskStates.COMPLETED])
-		pending_tasks: int = len(Task.all_tasks[TaskStates.PENDING])
-		failed_tasks: int = len(Task.all_tasks[TaskStates.FAILED])
-		total_tasks: int = sum(len(x) for x in Task.all_tasks.values())
+		completed_tasks: int = Task.count(TaskStates.COMPLETED)
+		pending_tasks: int = Task.count(TaskStates.PENDING)
+		failed_tasks: int = Task.count(TaskStates.FAILED)
+		total_tasks: int = sum(Task.count(state) for state in TaskStates)
+
+		# Deadlines
+		deadline_misses: int = FogScheduler.deadline_misses
+		rejected_tasks: int = FogScheduler.rejected_tasks
+		mean_slack: float = FogScheduler.get_mean_slack()
 
 		# Return everything
 		return {
@@ -61,5 +96,18 @@ class Evaluator():
 			"failed_tasks": failed_tasks,
 
 			"total_tasks": total_tasks,
+
+			"deadline_misses": deadline_misses,
+			"rejected_tasks": rejected_tasks,
+			"mean_slack": mean_slack,
+
+			**LatencyTracker.get_eval_parameters(),
+			**CloudNode.get_eval_parameters(),
+			"forecast_migrations": DemandForecaster.migrations,
+			"handovers": TaskHandover.handovers,
+			"execution_rate": ExecutionModel.last_mean_rate,
+			"fast_rejections": AdmissionSummary.fast_rejections,
+			"budget_overruns": StepBudget.overruns,
+			"deferred_tasks": StepBudget.deferred_tasks,
 		}
 
@@ -0,0 +1,65 @@
+
+# Imports
+from __future__ import annotations
+from src.fog import FogNode
+from config import *
+from typing import Callable
+import numpy as np
+
+
+# Execution rate models: CPU usage of each fog node -> progress rate of its tasks (steps of resolving time per step)
+def unit_rates(usages: np.ndarray) -> np.ndarray:
+	""" Every task progresses by 1 per step, whatever the load of its fog node """
+	return np.ones_like(usages)
+
+def processor_sharing_rates(usages: np.ndarray, knee: float = EXECUTION_KNEE) -> np.ndarray:
+	""" The CPU of a fog node is shared by its tasks: they run at full speed up to "knee" usage,
+	then the effective capacity is shared between them (rate = knee / usage) """
+	return np.minimum(1.0, knee / np.maximum(usages, 1e-12))
+
+EXECUTION_MODELS: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+	"unit": unit_rates,
+	"processor_sharing": processor_sharing_rates,
+}
+
+
+# Progression of the tasks of every fog node
+class ExecutionModel():
+	model: str = EXECUTION_MODEL
+	last_mean_rate: float = 1.0		# Mean progress rate of the tasks at the last progression (weighted by number of tasks)
+
+	@staticmethod
+	def register(name: str, rates: Callable[[np.ndarray], np.ndarray]) -> None:
+		""" Register an execution model
+		Args:
+			name	(str):		Name of the model (see EXECUTION_MODEL)
+			rates	(Callable):	Function giving the progress rate of the tasks of each fog node from their CPU usage (numpy arrays)
+		"""
+		EXECUTION_MODELS[name] = rates
+
+	@staticmethod
+	def progress(fogs: set[FogNode], time_spent: int = 1) -> None:
+		""" Progress the tasks of every fog node, the rates of all fog nodes being computed at once by the model
+		Args:
+			fogs		(set[FogNode]):	Set of fog nodes
+			time_spent	(int):			Number of steps since the last progression
+		"""
+		if ExecutionModel.model not in EXECUTION_MODELS:
+			raise ValueError(f"Unknown execution model '{ExecutionModel.model}', expected one of {list(EXECUTION_MODELS)}")
+
+		# The unit model keeps integer resolving times
+		if ExecutionModel.model == "unit":
+			for fog_node in fogs:
+				fog_node.progress_tasks(time_spent)
+			ExecutionModel.last_mean_rate = 1.0
+			return
+
+		# Rates of every fog node at once
+		ordered: list[FogNode] = list(fogs)
+		usages: np.ndarray = np.array([fog.used_resources.cpu / fog.resources.cpu for fog in ordered], dtype = np.float64)
+		rates: np.ndarray = EXECUTION_MODELS[ExecutionModel.model](usages)
+		counts: np.ndarray = np.array([len(fog.assigned_tasks) for fog in ordered], dtype = np.float64)
+		ExecutionModel.last_mean_rate = float((rates * counts).sum() / counts.sum()) if counts.sum() > 0 else 1.0
+		for fog_node, rate in zip(ordered, rates.tolist()):
+			fog_node.progress_tasks(time_spent, rate)
+
@@ -3,10 +3,14 @@
 from __future__ import annotations
 from src.resources import Resource
 from src.task import Task, TaskStates
+from src.routing import Route, RoutingTable, TransferQueue
+from src.scheduler import FogScheduler
+from src.admission import AdmissionSummary
+from src.mobility import get_mobility
 from src.utils import *
 from src.print import *
 from config import *
-import traci
+import numpy as np
 import random
 import math
 
@@ -33,9 +37,17 @@ class FogNode():
 		self.usage: float = 0.0
 		self.assigned_tasks: list[Task] = []
 		self.links: list[FogNodesLink] = []
+		self.linked_by: set[FogNode] = set()	# Fog nodes having a link to this one (reverse neighbours, see Topology)
+		self.routes: list[Route] = []		# Routes to other fog nodes sorted by latence (see RoutingTable)
+		self.routed_by: set[FogNode] = set()	# Fog nodes having a route to this one
 		self.task_distances: float = 0.0	# Indicates the sum of the task distances to their vehicle
+		self.links_load: float = 0.0		# Cached sum of the links usage, only valid during the epoch "links_load_epoch"
+		self.links_load_epoch: int = FogNodesLink.epoch
+		self.held_links_load: float = 0.0	# Sum of the links load held by transfers in progress (kept across epochs)
+		self.scheduler: FogScheduler = FogScheduler(self)	# Queue of the offers of the step (unused with the "fifo" scheduler)
+		self.admission: AdmissionSummary = AdmissionSummary(self)	# Bounds rejecting the offers that cannot succeed
 		FogNode.generated_nodes.add(self)
-		traci.polygon.add(polygonID = id, shape = self.get_adjusted_shape(), color = color, fill = True)
+		get_mobility().add_polygon(id, self.get_adjusted_shape(), color)
 	
 	def __str__(self) -> str:
 		x, y = self.position
@@ -74,7 +86,7 @@ class FogNode():
 			color	(tuple):	Color of the fog node
 		"""
 		self.color = tuple(color)
-		traci.polygon.setColor(self.id, self.color)
+		get_mobility().set_polygon_color(self.id, self.color)
 	
 	def has_enough_resources(self, task: Task) -> bool:
 		""" Check if the fog node has enough resources to resolve the task
@@ -101,27 +113,15 @@ class FogNode():
 		neighbours = neighbours[:MAX_NEIGHBOURS]
 
 		# Create links to each neighbour
+		for link in self.links:
+			link.other.linked_by.discard(self)
 		self.links: list[FogNodesLink] = []
 		for distance, node in neighbours:
 			latence: int = int(distance)
 			bandwidth: int = random_step(*bandwidth_range)
-			self.links.append(FogNodesLink(node, latence, bandwidth))
-	
-	def reset_links_charge(self, debug_msg: bool) -> bool:
-		""" Reset the charge of all links of the fog node
-		Args:
-			debug_msg	(bool):	Whether to print debug messages
-		Returns:
-			bool: if any link got a charge before reset
-		"""
-		any_reset: bool = False
-		for link in self.links:
-			if link.charge != 0:
-				if debug_msg:
-					debug(link)
-				link.charge = 0
-				any_reset = True
-		return any_reset
+			self.links.append(FogNodesLink(node, latence, bandwidth, owner = self))
+			node.linked_by.add(self)
+		self.routes = RoutingTable.direct_routes(self)
 	
 	def get_links(self) -> list[FogNodesLink]:
 		""" Get the links of the fog node
@@ -142,11 +142,23 @@ class FogNode():
 		return self.usage
 
 	def get_links_load(self) -> float:
-		""" Get the sum of the Fog nodes links load
+		""" Get the sum of the Fog nodes links load (cached, updated each time a link charge changes)
 		Returns:
 			float: Sum of the Fog nodes links load
 		"""
-		return sum(link.get_usage() for link in self.links)
+		if self.links_load_epoch != FogNodesLink.epoch:
+			return self.held_links_load
+		return self.links_load + self.held_links_load
+
+	def add_links_load(self, load: float) -> None:
+		""" Add up a load to the cached links load (called by the links of the fog node when their charge changes)
+		Args:
+			load	(float):	Load to add (charge divided by the bandwidth of the link)
+		"""
+		if self.links_load_epoch != FogNodesLink.epoch:
+			self.links_load = 0.0
+			self.links_load_epoch = FogNodesLink.epoch
+		self.links_load += load
 	
 	def assign_task(self, task: Task) -> TaskStates:
 		""" Assign a task to the fog node and returns the old state of the task\n
@@ -158,11 +170,13 @@ class FogNode():
 		"""
 		old_state: TaskStates = task.state
 		task.progress(0)
+		task.ready_step = Task.current_step
 
 		# Register task and calculate the new usage
 		self.assigned_tasks.append(task)
 		self.used_resources += task.resource
 		self.calculate_usage()
+		self.admission.on_assign(task)
 
 		# Add up the task distance
 		task.calculate_distance_to_vehicle(task.vehicle, self)
@@ -170,15 +184,18 @@ class FogNode():
 
 		return old_state
 	
-	def revert_assign(self, assigned_task: Task, old_state: TaskStates = None, is_last: bool = True) -> None:
+	def revert_assign(self, assigned_task: Task, old_state: TaskStates = None, is_last: bool = True, tentative: bool = False) -> None:
 		""" Revert the assignation of a task to the fog node
 		Args:
 			assigned_task	(Task):			Task to revert
 			old_state		(TaskStates):	Old state of the task
 			is_last			(bool):			Used for code optimization, the task is at last position of the list if True
+			tentative		(bool):			True if the task was assigned just before (e.g. QoS check), so no resources are freed overall (see AdmissionSummary)
 		"""
 		self.used_resources -= assigned_task.resource
 		self.calculate_usage()
+		if not tentative:
+			self.admission.on_release()
 		if is_last:
 			self.assigned_tasks.pop()
 		else:
@@ -186,6 +203,25 @@ class FogNode():
 		if old_state is not None:
 			assigned_task.change_state(old_state)
 	
+	def move_task(self, task: Task, route: Route, task_distance: float|None = None) -> None:
+		""" Move an assigned task to the destination of a route (which must have enough resources), sending it through the route\n
+		If the destination already accepted the task (see ask_assign_task), the distance of the task was computed for it,
+		so the distance of the task on this fog node must be given
+		Args:
+			task			(Task):		Task assigned to the fog node
+			route			(Route):	Route from the fog node to the new one
+			task_distance	(float):	Distance * cost of the task on this fog node if the destination already accepted it, None otherwise
+		"""
+		accepted: bool = task_distance is not None
+		if task_distance is None:
+			task_distance = task.distance_to_vehicle * task.cost
+		self.revert_assign(task, is_last = False)
+		self.remove_task_distance(task_distance)
+		task.mark_migrated()
+		if not accepted:
+			route.destination.assign_task(task)
+		TransferQueue.send(task, route)
+
 	def get_replaceable_tasks(self, incomming_task: Task) -> list[Task]:
 		""" Get tasks that can be replaced (if we remove the task we have enough resources to accept the incomming one)\n
 		The tasks are sorted by cost and the cost is lower than the incomming task cost
@@ -196,21 +232,23 @@ class FogNode():
 		"""
 		replaceable_tasks: list[Task] = [
 			task for task in self.assigned_tasks
-			if (task.cost < incomming_task.cost)													# Task cost is lower than the incomming task cost
+			if not task.in_transfer																	# Task is not already being transferred
+			and (task.cost < incomming_task.cost)													# Task cost is lower than the incomming task cost
 			and (self.used_resources - task.resource + incomming_task.resource) <= self.resources	# We have enough resources to accept the incomming task if we remove the task
 		]
 		return sorted(replaceable_tasks, key = lambda task: task.cost)
 
-	def ask_assign_task(self, incomming_task: Task, mode: AssignMode, from_vehicle: bool = True) -> bool:
+	def ask_assign_task(self, incomming_task: Task, mode: AssignMode, from_vehicle: bool = True, check_self: bool = True) -> bool:
 		""" Assign a task from a vehicle to the fog node
 		Args:
 			task			(Task):			Task to assign
 			mode			(AssignMode):	Configuration of the assign mode
-			from_vehicle	(bool):			True if the task is from a vehicle, False if it is from a fog node (to prevent too deep recursion)
+			from_vehicle	(bool):			True if the task is from a vehicle, False if it is forwarded by a fog node (forwarding uses the routing table instead of recursion)
+			check_self		(bool):			False to skip the fog node itself (already offered the task), only forwarding it to other fog nodes
 		Returns:
 			bool: True if the task was assigned, False otherwise
 		"""
-		if self.has_enough_resources(incomming_task):
+		if check_self and self.has_enough_resources(incomming_task):
 
 			# If the AssignMode should check QoS: accept the task if the new QoS is better than the old one
 			if mode.qos:
@@ -222,7 +260,7 @@ class FogNode():
 
 				if new_qos >= old_qos:
 					return True
-				self.revert_assign(incomming_task, old_state)
+				self.revert_assign(incomming_task, old_state, tentative = True)
 				self.remove_task_distance(incomming_task.distance_to_vehicle * incomming_task.cost)
 
 			# Else, accept the task as we have enough resources
@@ -233,73 +271,131 @@ class FogNode():
 		# If the task is from a vehicle, try communication with other fog nodes
 		if from_vehicle:
 
+			# An offer at least as hard as one that already failed cannot succeed (see AdmissionSummary)
+			if self.admission.known_failure(incomming_task, mode):
+				return self.admission.reject()
+
 			# If the AssignMode priorize the cost: For each replaceable tasks, try to assign to each neighbour and stop if any accept
 			if mode.cost:
+				if not self.admission.may_replace(incomming_task):	# No cheaper task to replace
+					return self.admission.reject()
 				for task in self.get_replaceable_tasks(incomming_task):
+					if not self.admission.may_forward(task.resource):	# No reachable fog node can take it
+						continue
 					task_distance: float = task.distance_to_vehicle * task.cost
-					for link in self.links:
+					for route in self.routes:
 
-						# If the link can handle the charge and the fog node accept the task,
-						if link.can_handle_charge(task.bandwidth_charge) and \
-						link.other.ask_assign_task(task, mode = mode, from_vehicle = False):
-							debug(f"Moved task {task.id} from {self.id} to {link.other.id} because cost {task.cost} is lower than {incomming_task.cost}. Charge: {task.bandwidth_charge}")
+						# If every link of the route can handle the charge and the fog node accept the task,
+						if route.can_handle_charge(task.bandwidth_charge) and \
+						route.destination.ask_assign_task(task, mode = mode, from_vehicle = False):
+							debug("Moved task %s from %s to %s (%d hops) because cost %s is lower than %s. Charge: %s", task.id, self.id, route.destination.id, len(route.links), task.cost, incomming_task.cost, task.bandwidth_charge)
 
-							# Revert assign the task (as the link sended it) to allow the assignment of the incomming one
-							self.revert_assign(task, is_last = False)
-							self.remove_task_distance(task_distance)
+							# Move the task through the route (holding the charge of its links) to allow the assignment of the incomming one
+							self.move_task(task, route, task_distance)
 							self.assign_task(incomming_task)
-
-							# Add up the new charge to the link and return True
-							link.charge += task.bandwidth_charge
 							return True
 
-			# If the AssignMode authorize neighbours communication: Ask the neighbours if they can assign the task
+			# If the AssignMode authorize neighbours communication: Ask the fog nodes reachable through the routing table if they can assign the task
 			elif mode.neighbours:
-				for link in self.links:
-
-					# If the link can handle the charge and the fog node accept the task,
-					if link.can_handle_charge(incomming_task.bandwidth_charge) and \
-					link.other.ask_assign_task(incomming_task, mode = mode, from_vehicle = False):
-						link.charge += incomming_task.bandwidth_charge
+				if not self.admission.may_forward(incomming_task.resource):	# No reachable fog node can take it
+					return self.admission.reject()
+				for route in self.routes:
+
+					# If every link of the route can handle the charge and the fog node accept the task,
+					if route.can_handle_charge(incomming_task.bandwidth_charge) and \
+					route.destination.ask_assign_task(incomming_task, mode = mode, from_vehicle = False):
+						TransferQueue.send(incomming_task, route)
 						return True
+
+			# Remember the failure for the next offers of the step
+			if mode.cost or mode.neighbours:
+				self.admission.record_failure(incomming_task, mode)
 		
 		# Nobody can assign the task
 		return False
 
 
-	def progress_tasks(self) -> None:
-		""" Progress the tasks of the fog node, sending the results to the vehicles when completed and removing the tasks from the list """
+	def progress_tasks(self, time_spent: int = 1, rate: float = 1) -> None:
+		""" Progress the tasks of the fog node, sending the results to the vehicles when completed and removing the tasks from the list
+		Args:
+			time_spent	(int):		Number of steps since the last progression (more than 1 when the algorithm skipped steps)
+			rate		(float):	Resolving time done per step (see ExecutionModel, 1 keeps the resolving times integers)
+		"""
 		new_list: list[Task] = []
+		released: bool = False
 		for task in self.assigned_tasks:
-			task.progress(1)
+			if task.in_transfer:	# The task did not reach the fog node yet
+				new_list.append(task)
+				continue
+			task.progress(min(time_spent, Task.current_step - task.ready_step + 1) * rate)	# Steps spent on the fog node only
 			if task.state == TaskStates.COMPLETED:
 				task.vehicle.receive_task_result(task)
 
 				self.remove_task_distance(task.distance_to_vehicle * task.cost)
 				self.used_resources -= task.resource
 				self.calculate_usage()
+				released = True
 			else:
 				new_list.append(task)
 		self.assigned_tasks = new_list
+		if released:
+			self.admission.on_release()
 	
 
 	@staticmethod
 	def reset_links_charges(fogs: set[FogNode], debug_msg: bool) -> bool:
-		""" Reset the charge of all links of all fog nodes
+		""" Reset the charge of all links of all fog nodes\n
+		The reset is lazy: a new links epoch is started, which invalidates every charge and cached links load at once,
+		so only the links charged during the step are visited (for debug messages)
 		Args:
-			fogs		(set[FogNode]):	Set of fog nodes
+			fogs		(set[FogNode]):	Set of fog nodes (kept for compatibility, every link shares the same epoch)
 			debug_msg	(bool):			Whether to print debug messages
 		Returns:
 			bool: if any link got a charge before reset
 		"""
-		any_reset: bool = False
-		for fog in fogs:
-			if fog.reset_links_charge(debug_msg):
-				any_reset = True
+		any_reset: bool = len(FogNodesLink.charged_links) > 0
+		if debug_msg:
+			for link in FogNodesLink.charged_links:
+				debug(link)
+		FogNodesLink.new_epoch()
 		if any_reset and debug_msg:
-			print()	# Add a new line after the debug messages for better readability
+			debug("")	# Add a line after the debug messages for better readability (through the logger, to keep the order of the lines)
 		return any_reset
 	
+	@staticmethod
+	def best_fit_scores(candidates: list[FogNode], tasks: list[Task], distances: list[float]) -> np.ndarray:
+		""" Score candidate fog nodes for multiple tasks at once (lower is better, infinite if the task does not fit)\n
+		The score is a weighted sum (see BEST_FIT_WEIGHTS) of:
+		- the mean residual capacity left after placing the task (best fit, to avoid stranding capacity)
+		- the distance to the vehicle multiplied by the cost of the task (normalized by the highest one)
+		- the current usage of the fog node
+		Args:
+			candidates	(list[FogNode]):	Candidate fog nodes
+			tasks		(list[Task]):		Tasks to place
+			distances	(list[float]):		Distance between the vehicle and each candidate
+		Returns:
+			np.ndarray: Score of each candidate for each task, shape (tasks, candidates)
+		"""
+		# State of the candidates: capacities, used resources, usage and distance (one row per candidate)
+		state: np.ndarray = np.array([
+			(fog.resources.cpu, fog.resources.ram, fog.resources.storage, fog.used_resources.cpu, fog.used_resources.ram, fog.used_resources.storage, fog.usage, distance)
+			for fog, distance in zip(candidates, distances)
+		], dtype = np.float64)
+		needs: np.ndarray = np.array([(task.resource.cpu, task.resource.ram, task.resource.storage, task.cost) for task in tasks], dtype = np.float64)
+
+		# Residual capacity (tasks, candidates, resources) and distance*cost (normalized by the farthest candidate and the highest cost)
+		residual: np.ndarray = (state[None, :, 0:3] - state[None, :, 3:6] - needs[:, None, 0:3]) / state[None, :, 0:3]
+		distance_cost: np.ndarray = np.sqrt(state[:, 7])[None, :] * needs[:, 3:4]
+		highest: float = distance_cost.max()
+		if highest > 0:
+			distance_cost /= highest
+
+		# Weighted sum, infinite if the task does not fit
+		fit_weight, distance_weight, usage_weight = BEST_FIT_WEIGHTS
+		scores: np.ndarray = (fit_weight / 3) * residual.sum(axis = 2) + distance_weight * distance_cost + usage_weight * state[None, :, 6]
+		scores[(residual < 0).any(axis = 2)] = np.inf
+		return scores
+
 	@staticmethod
 	def color_usage(fogs: set[FogNode]) -> None:
 		""" Change the color of the fog nodes depending on their resources """
@@ -314,6 +410,19 @@ class FogNode():
 			# Calculate the color depending on the usage
 			fog.set_color( [int(LOW_COLOR[i] + (HIGH_COLOR[i] - LOW_COLOR[i]) * usage) for i in range(3)] )
 
+	# Function that add fog nodes at the given positions and returns the result
+	@staticmethod
+	def placed_nodes(positions: list[tuple[float,float]], fog_shape: list[tuple], fog_color: tuple) -> set[FogNode]:
+		""" Create fog nodes at the given positions (e.g. computed by src.placement) and returns the result
+		Args:
+			positions	(list):		Positions of the fog nodes
+			fog_shape	(list):		Shape of the fog nodes
+			fog_color	(tuple):	Color of the fog nodes
+		Returns:
+			set[FogNode]: Set of fog nodes
+		"""
+		return {FogNode("fog" + str(i), position, fog_shape, fog_color) for i, position in enumerate(positions)}
+
 	# Function that add multiple fog nodes at random positions and returns the result
 	@staticmethod
 	def random_nodes(nb_fog_nodes: int, offsets: tuple, center: tuple, random_divider: int, fog_shape: list[tuple], fog_color: tuple) -> set[FogNode]:
@@ -346,21 +455,66 @@ class FogNode():
 
 
 class FogNodesLink():
-	def __init__(self, other: FogNode, latence: int, bandwidth: int) -> None:
+	epoch: int = 0								# Current links epoch, charges of older epochs are considered as zero
+	charged_links: list[FogNodesLink] = []		# Links charged during the current epoch
+
+	def __init__(self, other: FogNode, latence: int, bandwidth: int, owner: FogNode|None = None) -> None:
 		""" FogNodesLink constructor
 		Args:
 			other		(FogNode):	Other fog node
-			latence		(int):		Latence of the link (not used)
+			latence		(int):		Latence of the link (distance between the fog nodes, used by the transfer time)
 			bandwidth	(int):		Bandwidth of the link (in MB/s)
+			owner		(FogNode):	Fog node owning the link, its cached links load is updated when the charge changes (default: None)
 		"""
 		self.other: FogNode = other
 		self.latence: int = latence
 		self.bandwidth: int = bandwidth
-		self.charge: int = 0
+		self.owner: FogNode|None = owner
+		self.epoch_charge: int = 0
+		self.charge_epoch: int = FogNodesLink.epoch
+		self.held_charge: int = 0		# Charge held by the transfers in progress (kept across epochs)
 	
 	def __str__(self) -> str:
 		return f"Link to {self.other.id} with: Latence = {self.latence}, Bandwidth = {self.bandwidth}MB/s, Current charge = {self.charge}MB"
 	
+	@property
+	def charge(self) -> int:
+		""" Charge of the link during the current epoch (including the charge held by the transfers in progress) """
+		if self.charge_epoch != FogNodesLink.epoch:
+			return self.held_charge
+		return self.epoch_charge + self.held_charge
+	@charge.setter
+	def charge(self, value: int) -> None:
+		self.add_charge(value - self.charge)
+
+	def add_charge(self, charge: int) -> None:
+		""" Add up a charge to the link and update the cached links load of the owner
+		Args:
+			charge	(int):	Charge to add
+		"""
+		if self.charge_epoch != FogNodesLink.epoch:
+			self.epoch_charge = 0
+			self.charge_epoch = FogNodesLink.epoch
+			FogNodesLink.charged_links.append(self)
+		self.epoch_charge += charge
+		if self.owner is not None:
+			self.owner.add_links_load(charge / self.bandwidth)
+
+	def hold_charge(self, charge: int) -> None:
+		""" Hold (or release if negative) a charge on the link until the transfer using it is finished
+		Args:
+			charge	(int):	Charge to hold
+		"""
+		self.held_charge += charge
+		if self.owner is not None:
+			self.owner.held_links_load += charge / self.bandwidth
+
+	@staticmethod
+	def new_epoch() -> None:
+		""" Start a new links epoch, invalidating the charges of every link in O(1) """
+		FogNodesLink.epoch += 1
+		FogNodesLink.charged_links = []
+	
 	def can_handle_charge(self, incomming: int) -> bool:
 		""" Check if the link can handle the charge
 		Args:
@@ -383,4 +537,3 @@ class FogNodesLink():
 			float: Usage of the link
 		"""
 		return self.charge / self.bandwidth
-
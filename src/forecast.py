@@ -0,0 +1,135 @@
+
+# Imports
+from __future__ import annotations
+from src.task import Task
+from src.fog import FogNode
+from src.utils import AssignMode
+from config import *
+import numpy as np
+
+
+# Per fog node demand forecasting
+class DemandForecaster():
+	""" Online forecast of the CPU demand arriving at each fog node (Holt's linear smoothing: level and trend, updated every step)\n
+	The demand of a fog node is the CPU of the new tasks offered to it as the nearest fog node of their vehicle.
+	Fog nodes predicted to saturate in the next FORECAST_HORIZON steps move some of their cheapest tasks to reachable
+	fog nodes that are not predicted to saturate, so the capacity is free when the demand arrives
+	"""
+	enabled: bool = FORECAST_ENABLED
+	alpha: float = FORECAST_ALPHA
+	beta: float = FORECAST_BETA
+	horizon: int = FORECAST_HORIZON
+	saturation: float = FORECAST_SATURATION
+	budget: int = FORECAST_MIGRATION_BUDGET
+
+	# State of the estimators (one row per fog node, see index)
+	index: dict[FogNode, int] = {}
+	levels: np.ndarray = np.zeros(0)
+	trends: np.ndarray = np.zeros(0)
+	observed: dict[FogNode, float] = {}	# CPU demand observed since the last update
+	migrations: int = 0					# Number of tasks moved ahead of a predicted saturation
+
+	@staticmethod
+	def is_enabled() -> bool:
+		return DemandForecaster.enabled
+
+	@staticmethod
+	def observe(fog: FogNode, tasks: list[Task]) -> None:
+		""" Record the new tasks offered to a fog node by a vehicle (tasks already offered in a previous step are ignored)
+		Args:
+			fog		(FogNode):		Nearest fog node of the vehicle
+			tasks	(list[Task]):	Pending tasks of the vehicle
+		"""
+		demand: int = sum(task.resource.cpu for task in tasks if task.created_step == Task.current_step)
+		if demand:
+			DemandForecaster.observed[fog] = DemandForecaster.observed.get(fog, 0.0) + demand
+
+	@staticmethod
+	def update(fogs: set[FogNode]) -> None:
+		""" Fold the demand observed since the last update into the estimators (fog nodes added or removed are handled)
+		Args:
+			fogs	(set[FogNode]):	Set of fog nodes
+		"""
+		if len(fogs) != len(DemandForecaster.index) or any(fog not in DemandForecaster.index for fog in fogs):
+			old_index: dict[FogNode, int] = DemandForecaster.index
+			DemandForecaster.index = {fog: i for i, fog in enumerate(sorted(fogs, key = lambda fog: fog.id))}
+			kept: list[tuple[int,int]] = [(i, old_index[fog]) for fog, i in DemandForecaster.index.items() if fog in old_index]
+			levels, trends = np.zeros(len(fogs)), np.zeros(len(fogs))
+			if kept:
+				new_rows, old_rows = map(list, zip(*kept))
+				levels[new_rows] = DemandForecaster.levels[old_rows]
+				trends[new_rows] = DemandForecaster.trends[old_rows]
+			DemandForecaster.levels, DemandForecaster.trends = levels, trends
+
+		# Holt's linear smoothing of every fog node at once
+		observations: np.ndarray = np.zeros(len(fogs))
+		for fog, demand in DemandForecaster.observed.items():
+			if fog in DemandForecaster.index:
+				observations[DemandForecaster.index[fog]] = demand
+		DemandForecaster.observed = {}
+		alpha, beta = DemandForecaster.alpha, DemandForecaster.beta
+		previous_levels: np.ndarray = DemandForecaster.levels
+		DemandForecaster.levels = alpha * observations + (1 - alpha) * (previous_levels + DemandForecaster.trends)
+		DemandForecaster.trends = beta * (DemandForecaster.levels - previous_levels) + (1 - beta) * DemandForecaster.trends
+
+	@staticmethod
+	def forecast(horizon: int = FORECAST_HORIZON) -> np.ndarray:
+		""" Forecast the CPU demand arriving at each fog node during the next steps
+		Args:
+			horizon	(int):	Number of steps
+		Returns:
+			np.ndarray: Sum of the demand forecasted for each step of the horizon (one value per fog node, see index)
+		"""
+		total: np.ndarray = horizon * DemandForecaster.levels + DemandForecaster.trends * horizon * (horizon + 1) / 2
+		return np.maximum(total, 0.0)
+
+	@staticmethod
+	def predicted_usage(fog: FogNode, demand: float) -> float:
+		""" CPU usage of a fog node at the end of the horizon if the forecasted demand arrives (tasks finishing before are released) """
+		released: int = sum(task.resource.cpu for task in fog.assigned_tasks if not task.in_transfer and task.resolving_time <= DemandForecaster.horizon)
+		return (fog.used_resources.cpu - released + demand) / fog.resources.cpu
+
+	@staticmethod
+	def rebalance(fogs: set[FogNode], mode: AssignMode) -> int:
+		""" Move the cheapest tasks of the fog nodes predicted to saturate to reachable fog nodes with spare predicted capacity
+		(only in the modes where the fog nodes communicate, at most FORECAST_MIGRATION_BUDGET tasks per step)
+		Args:
+			fogs	(set[FogNode]):	Set of fog nodes
+			mode	(AssignMode):	Configuration of how the tasks are assigned
+		Returns:
+			int: Number of moved tasks
+		"""
+		if not (mode.neighbours or mode.cost):
+			return 0
+		demands: np.ndarray = DemandForecaster.forecast()
+		capacities: np.ndarray = np.array([fog.resources.cpu for fog in DemandForecaster.index], dtype = np.float64)
+		used: np.ndarray = np.array([fog.used_resources.cpu for fog in DemandForecaster.index], dtype = np.float64)
+
+		# Cheap upper bound first (no task released), then the exact prediction for the remaining candidates
+		candidates: list[FogNode] = [fog for fog, i in DemandForecaster.index.items() if (used[i] + demands[i]) / capacities[i] >= DemandForecaster.saturation]
+		predicted: dict[FogNode, float] = {fog: DemandForecaster.predicted_usage(fog, demands[DemandForecaster.index[fog]]) for fog in candidates}
+		saturating: list[FogNode] = sorted((fog for fog in candidates if predicted[fog] >= DemandForecaster.saturation), key = lambda fog: (-predicted[fog], fog.id))
+		moved: int = 0
+		for fog in saturating:
+			for task in sorted((task for task in fog.assigned_tasks if not task.in_transfer), key = lambda task: (task.cost, task.id)):
+				if moved >= DemandForecaster.budget or predicted[fog] < DemandForecaster.saturation:
+					break
+				for route in fog.routes:
+					destination: FogNode = route.destination
+					if destination not in DemandForecaster.index:
+						continue
+					if destination not in predicted:
+						predicted[destination] = DemandForecaster.predicted_usage(destination, demands[DemandForecaster.index[destination]])
+					if predicted[destination] + task.resource.cpu / destination.resources.cpu >= DemandForecaster.saturation:
+						continue
+					if destination.has_enough_resources(task) and route.can_handle_charge(task.bandwidth_charge):
+						fog.move_task(task, route)
+						predicted[fog] -= task.resource.cpu / fog.resources.cpu
+						predicted[destination] += task.resource.cpu / destination.resources.cpu
+						moved += 1
+						break
+			if moved >= DemandForecaster.budget:
+				break
+		DemandForecaster.migrations += moved
+		return moved
+
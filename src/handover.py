@@ -0,0 +1,111 @@
+
+# Imports
+from __future__ import annotations
+from src.task import Task
+from src.fog import FogNode
+from src.routing import Route
+from src.utils import AssignMode
+from config import *
+import math
+
+
+# Mobility-aware handover of the tasks
+class TaskHandover():
+	""" Periodic pass following the vehicles as they move:
+	- the distance between each task and its vehicle is refreshed (the distance*cost term of the QoS stays accurate)
+	- tasks whose fog node became far from their vehicle are moved, through the routing table, to the fog node of the routes closest
+	to the vehicle (in the modes where fog nodes communicate, at most HANDOVER_BUDGET tasks per pass, biggest distance*cost gain first)
+	"""
+	enabled: bool = HANDOVER_ENABLED
+	interval: int = HANDOVER_INTERVAL
+	ratio: float = HANDOVER_DISTANCE_RATIO
+	min_distance: float = HANDOVER_MIN_DISTANCE
+	budget: int = HANDOVER_BUDGET
+	last_step: int|None = None
+	handovers: int = 0		# Number of tasks moved closer to their vehicle
+
+	@staticmethod
+	def is_enabled() -> bool:
+		return TaskHandover.enabled
+
+	@staticmethod
+	def refresh_distances(fogs: set[FogNode]) -> list[tuple[float, FogNode, Task]]:
+		""" Refresh the distance of every assigned task to its vehicle (using the distances of the vehicles of the step)
+		Args:
+			fogs	(set[FogNode]):	Set of fog nodes
+		Returns:
+			list[tuple[float,FogNode,Task]]: Tasks far from their vehicle with their distance*cost gain if moved to the nearest fog node
+		"""
+		candidates: list[tuple[float, FogNode, Task]] = []
+		nearest_distances: dict = {}	# Distance of each vehicle to its nearest fog node
+		for fog in fogs:
+			delta: float = 0.0
+			for task in fog.assigned_tasks:
+				distance: float|None = task.vehicle.fog_distances.get(fog)
+				if distance is None:	# The vehicle left the simulation
+					continue
+				delta += math.sqrt(distance * task.cost) - math.sqrt(task.distance_to_vehicle * task.cost)
+				task.distance_to_vehicle = distance
+
+				# The nearest fog node of the vehicle is much closer
+				if task.in_transfer:
+					continue
+				nearest: float|None = nearest_distances.get(task.vehicle)
+				if nearest is None:
+					nearest = nearest_distances[task.vehicle] = min(task.vehicle.fog_distances.values())
+				if distance >= TaskHandover.ratio * nearest and distance - nearest >= TaskHandover.min_distance:
+					candidates.append((math.sqrt(distance * task.cost) - math.sqrt(nearest * task.cost), fog, task))
+			fog.task_distances += delta
+			FogNode.all_task_distances += delta
+		return candidates
+
+	@staticmethod
+	def best_route(fog: FogNode, task: Task) -> Route|None:
+		""" Get the route to the fog node closest to the vehicle of a task that can take it (None if no fog node is close enough)
+		Args:
+			fog		(FogNode):	Fog node of the task
+			task	(Task):		Task to move
+		Returns:
+			Route|None: Route to follow
+		"""
+		best: Route|None = None
+		best_distance: float = task.distance_to_vehicle / TaskHandover.ratio
+		for route in fog.routes:
+			distance: float|None = task.vehicle.fog_distances.get(route.destination)
+			if distance is None or distance > best_distance or task.distance_to_vehicle - distance < TaskHandover.min_distance:
+				continue
+			if task.resolving_time <= route.transfer_time(task.bandwidth_charge):	# Not worth the transfer
+				continue
+			if route.destination.has_enough_resources(task) and route.can_handle_charge(task.bandwidth_charge):
+				best, best_distance = route, distance
+		return best
+
+	@staticmethod
+	def run(fogs: set[FogNode], mode: AssignMode) -> int:
+		""" Run the handover pass if HANDOVER_INTERVAL steps elapsed since the last one
+		Args:
+			fogs	(set[FogNode]):	Set of fog nodes
+			mode	(AssignMode):	Configuration of how the tasks are assigned
+		Returns:
+			int: Number of moved tasks
+		"""
+		if TaskHandover.last_step is not None and Task.current_step - TaskHandover.last_step < TaskHandover.interval:
+			return 0
+		TaskHandover.last_step = Task.current_step
+		candidates: list[tuple[float, FogNode, Task]] = TaskHandover.refresh_distances(fogs)
+		if not (mode.neighbours or mode.cost):
+			return 0
+
+		# Move the tasks with the biggest gain first
+		candidates.sort(key = lambda candidate: (-candidate[0], candidate[2].id))
+		moved: int = 0
+		for _, fog, task in candidates:
+			if moved >= TaskHandover.budget:
+				break
+			route: Route|None = TaskHandover.best_route(fog, task)
+			if route is not None:
+				fog.move_task(task, route)
+				moved += 1
+		TaskHandover.handovers += moved
+		return moved
+
@@ -0,0 +1,77 @@
+
+# Imports
+from src.utils import super_json_dump
+from config import *
+import numpy as np
+
+# Quantiles reported over time for each latency histogram
+LATENCY_QUANTILES: tuple[int,int,int] = (50, 95, 99)
+
+# Fixed-bucket histogram of latencies
+class LatencyHistogram():
+	def __init__(self, nb_buckets: int = LATENCY_BUCKETS) -> None:
+		""" LatencyHistogram constructor (one bucket per simulation step, plus an overflow bucket)
+		Args:
+			nb_buckets	(int):	Number of one step buckets, longer latencies are counted in the overflow bucket
+		"""
+		self.counts: np.ndarray = np.zeros(nb_buckets + 1, dtype = np.int64)
+		self.total: int = 0
+
+	def add(self, latency: int) -> None:
+		""" Count a latency in its bucket
+		Args:
+			latency	(int):	Latency in simulation steps
+		"""
+		self.counts[min(max(latency, 0), len(self.counts) - 1)] += 1
+		self.total += 1
+
+	def quantiles(self, percents: tuple[int,...] = LATENCY_QUANTILES) -> list[float]:
+		""" Get the quantiles of the histogram (upper bound of the bucket reaching each percentage of the latencies)
+		Args:
+			percents	(tuple):	Percentages of the quantiles
+		Returns:
+			list[float]: Quantiles in simulation steps (0 if the histogram is empty)
+		"""
+		if self.total == 0:
+			return [0.0] * len(percents)
+		cumulative: np.ndarray = np.cumsum(self.counts)
+		return np.searchsorted(cumulative, np.array(percents) * self.total / 100).astype(float).tolist()
+
+	def to_dict(self) -> dict:
+		""" Description of the histogram for the saved outputs (trailing empty buckets are dropped) """
+		last: int = int(np.flatnonzero(self.counts)[-1]) + 1 if self.total else 0
+		return {"total": self.total, "overflow_from": len(self.counts) - 1, "counts": self.counts[:last].tolist()}
+
+
+# Latencies of the tasks of the simulation
+class LatencyTracker():
+	""" Histograms of the tasks latencies (in simulation steps):
+	- wait: from the creation of the task to its assignment to a fog node
+	- completion: from the creation of the task to the reception of its result by the vehicle
+	"""
+	wait: LatencyHistogram = LatencyHistogram()
+	completion: LatencyHistogram = LatencyHistogram()
+	migrations: int = 0		# Number of tasks moved from a fog node to another one by the cost mode
+
+	@staticmethod
+	def get_eval_parameters() -> dict[str, float]:
+		""" Returns the quantiles of the latencies and the number of migrations (see Evaluator.get_eval_parameters)
+		Returns:
+			dict[str,float]: Keys "wait_time_p50", ..., "completion_time_p99" and "migrations"
+		"""
+		evals: dict[str, float] = {}
+		for name, histogram in (("wait_time", LatencyTracker.wait), ("completion_time", LatencyTracker.completion)):
+			for percent, value in zip(LATENCY_QUANTILES, histogram.quantiles()):
+				evals[f"{name}_p{percent}"] = value
+		evals["migrations"] = LatencyTracker.migrations
+		return evals
+
+	@staticmethod
+	def save(path: str) -> None:
+		""" Save the histograms to a JSON file
+		Args:
+			path	(str):	Path of the JSON file
+		"""
+		with open(path, "w", encoding = "utf-8") as file:
+			super_json_dump({"wait": LatencyTracker.wait.to_dict(), "completion": LatencyTracker.completion.to_dict(), "migrations": LatencyTracker.migrations}, file, max_level = 2)
+
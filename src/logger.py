@@ -0,0 +1,133 @@
+
+# Imports
+from __future__ import annotations
+from queue import SimpleQueue
+from config import *
+import threading
+import atexit
+import json
+import time
+import sys
+import io
+import os
+
+# Levels of the log records, with the prefix and the color of their console lines
+LOG_LEVELS: dict[str, int] = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+LEVEL_NAMES: dict[int, str] = {value: name for name, value in LOG_LEVELS.items()}
+LEVEL_STYLES: dict[int, tuple[str,str]] = {
+	10: ("\033[94m", "DEBUG"),
+	20: ("\033[92m", "INFO "),
+	30: ("\033[93m", "WARNING"),
+	40: ("\033[91m", "ERROR"),
+}
+PLAIN_TYPES: tuple = (str, int, float, bool, type(None))
+
+
+# Logging of the simulations
+class Logger():
+	""" Levelled logging, kept out of the simulation loop:
+	- records below the level are dropped before anything is formatted (a comparison per call)
+	- messages are formatted lazily, "%" style with the arguments given apart (e.g. debug("Moved task %s", task.id))
+	- records are written by a background thread (coloured line on the console, and a JSON line per record if a file is open)
+	"""
+	level: int = LOG_LEVELS[LOG_LEVEL]
+	asynchronous: bool = LOG_ASYNC
+	queue: SimpleQueue = SimpleQueue()
+	thread: threading.Thread|None = None
+	pid: int = -1							# Process owning the background thread (forked processes start their own)
+	json_stream: io.TextIOWrapper|None = None
+
+	@staticmethod
+	def set_level(level: str) -> None:
+		""" Change the minimum level of the records ("DEBUG", "INFO", "WARNING" or "ERROR") """
+		if level not in LOG_LEVELS:
+			raise ValueError(f"Unknown log level '{level}', expected one of {list(LOG_LEVELS)}")
+		Logger.level = LOG_LEVELS[level]
+
+	@staticmethod
+	def is_enabled(level: int) -> bool:
+		""" Check if the records of a level are kept (to guard the computation of expensive arguments) """
+		return level >= Logger.level
+
+	@staticmethod
+	def log(level: int, message: object, args: tuple = ()) -> None:
+		""" Log a record (nothing is formatted here, arguments that are not plain values are converted to text to freeze them)
+		Args:
+			level	(int):		Level of the record (see LOG_LEVELS)
+			message	(object):	Message, or "%" style template if arguments are given
+			args	(tuple):	Arguments of the template
+		"""
+		if level < Logger.level:
+			return
+		if args:
+			args = tuple(arg if isinstance(arg, PLAIN_TYPES) else str(arg) for arg in args)
+		elif not isinstance(message, str):
+			message = str(message)
+		record: tuple = (time.time(), level, message, args)
+		if not Logger.asynchronous:
+			Logger.write(record)
+			return
+		if Logger.pid != os.getpid():
+			Logger.start()
+		Logger.queue.put(record)
+
+	@staticmethod
+	def start() -> None:
+		""" Start the background writer of the current process """
+		Logger.queue = SimpleQueue()
+		Logger.pid = os.getpid()
+		Logger.thread = threading.Thread(target = Logger.run, name = "logger", daemon = True)
+		Logger.thread.start()
+		atexit.register(Logger.flush)
+
+	@staticmethod
+	def run() -> None:
+		""" Background writer: write the records until the process ends (events are flush requests) """
+		while True:
+			record = Logger.queue.get()
+			if isinstance(record, threading.Event):
+				if Logger.json_stream is not None:
+					Logger.json_stream.flush()
+				record.set()
+			else:
+				try:
+					Logger.write(record)
+				except Exception as error:	# The writer must survive a record it cannot write (the later ones would be lost and the flushes would hang)
+					print(f"Could not write the log record {record!r}: {error!r}", file = sys.stderr, flush = True)
+
+	@staticmethod
+	def write(record: tuple) -> None:
+		""" Format and write a record to the console and to the JSON lines file if any """
+		timestamp, level, message, args = record
+		try:
+			text: str = message % args if args else message
+		except (TypeError, ValueError, KeyError) as error:
+			text = f"Could not format the log message {message!r} with {args!r}: {error}"
+			level = max(level, LOG_LEVELS["ERROR"])
+		color, prefix = LEVEL_STYLES[level]
+		print(f"{color}[{prefix} {time.strftime('%H:%M:%S', time.localtime(timestamp))}] {text}\033[0m", flush = level >= LOG_LEVELS["WARNING"])
+		if Logger.json_stream is not None:
+			Logger.json_stream.write(json.dumps({"time": timestamp, "level": LEVEL_NAMES[level], "process": os.getpid(), "message": text}) + "\n")
+
+	@staticmethod
+	def flush() -> None:
+		""" Wait until every record logged so far is written """
+		if Logger.asynchronous and Logger.pid == os.getpid() and Logger.thread is not None and Logger.thread.is_alive():
+			done = threading.Event()
+			Logger.queue.put(done)
+			done.wait()
+
+	@staticmethod
+	def open_json(path: str) -> None:
+		""" Also write the records as JSON lines to the given file (time, level, process and message of each record) """
+		Logger.close_json()
+		Logger.json_stream = open(path, "w", encoding = "utf-8")
+
+	@staticmethod
+	def close_json() -> None:
+		""" Write the pending records and close the JSON lines file if any """
+		Logger.flush()
+		if Logger.json_stream is not None:
+			Logger.json_stream.close()
+			Logger.json_stream = None
+
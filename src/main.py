@@ -2,15 +2,134 @@
 # Imports
 from src.algorithms import *
 from src.fog import FogNode
+from src.routing import RoutingTable
+from src.topology import Topology
+from src.placement import NetGeometry, density_positions
 from src.resources import Resource
+from src.task import Task
+from src.latency import LatencyTracker
+from src.vehicle import Vehicle
+from src.mobility import MobilitySource, SumoMobility, set_mobility
+from src.metrics import MetricsExporter
 from src.utils import *
 from src.print import *
 from src.evaluations import *
 from config import *
+from typing import Callable
 from matplotlib import pyplot as plt
-import traci
+import numpy as np
 import random
 import time
+import os
+
+# Labels of the evaluations histories associated to their key in Evaluator.get_eval_parameters()
+EVALUATION_LABELS: dict[str, str] = {
+	"Allocated Tasks": "allocated_tasks",
+	"Nodes Usage": "nodes_usage",
+	"Links Load": "links_load",
+	"Tasks Distance*Cost": "tasks_distance_cost",
+
+	"Completed Tasks": "completed_tasks",
+	"Pending Tasks": "pending_tasks",
+	"Failed Tasks": "failed_tasks",
+	"Total Tasks": "total_tasks",
+
+	"Deadline Misses": "deadline_misses",
+	"Rejected Tasks": "rejected_tasks",
+	"Mean Slack": "mean_slack",
+
+	"Wait Time p50": "wait_time_p50",
+	"Wait Time p95": "wait_time_p95",
+	"Wait Time p99": "wait_time_p99",
+	"Completion Time p50": "completion_time_p50",
+	"Completion Time p95": "completion_time_p95",
+	"Completion Time p99": "completion_time_p99",
+	"Task Migrations": "migrations",
+
+	"Fog Tasks": "fog_tasks",
+	"Cloud Tasks": "cloud_tasks",
+	"Cloud Cost": "cloud_cost",
+	"Cloud Offloads": "cloud_offloads",
+	"Forecast Migrations": "forecast_migrations",
+	"Task Handovers": "handovers",
+	"Execution Rate": "execution_rate",
+	"Fast Rejections": "fast_rejections",
+	"Budget Overruns": "budget_overruns",
+	"Deferred Tasks": "deferred_tasks",
+}
+
+def make_evaluations_dict(folder: str, simulation_name: str, qos_history: list[float], histories: dict[str, list[float]]) -> dict:
+	""" Prepare the dictionnary returned by a simulation (evaluations over time and their cumulative arrays)
+	Args:
+		folder			(str):		Folder kept in the return dict for identification
+		simulation_name	(str):		Name of the simulation
+		qos_history		(list):		QoS over time
+		histories		(dict):		Other evaluations over time, by label
+	Returns:
+		dict: Dictionnary of evaluations over time
+	"""
+	r_dict = {
+		"folder": folder,
+		"simulation_name": simulation_name,
+		"name": simulation_name.split("/")[-1],
+		"QoS Evaluations": qos_history,
+		**histories,
+	}
+	add_cumulative_evaluations(r_dict)
+	return r_dict
+
+def sumo_command(sumo_config: str, seed: int, auto_start: bool, auto_quit: bool, open_gui: bool) -> list[str]:
+	""" Build the command used to start SUMO
+	Args:
+		sumo_config	(str):	Sumo configuration file to use
+		seed		(int):	Seed to use for the simulation
+		auto_start	(bool):	Whether to start the simulation automatically (adding '--start')
+		auto_quit	(bool):	Whether to quit the simulation automatically (adding '--quit-on-end')
+		open_gui	(bool):	Whether to run "sumo-gui" or "sumo"
+	Returns:
+		list[str]: Command to start SUMO with
+	"""
+	executable: str = "sumo-gui" if open_gui else "sumo"
+	command: list[str] = [executable, "-c", sumo_config, "--seed", str(seed)]
+	if auto_start:
+		command.append("--start")
+	if auto_quit:
+		command.append("--quit-on-end")
+	return command
+
+def setup_fog_nodes(mobility: MobilitySource, visual_center: tuple[int,int], fog_resources: tuple[int,int,int], seed: int = 0) -> Topology:
+	""" Create the fog nodes (placed depending on FOG_PLACEMENT) with random resources, their neighbours and their routing table\n
+	The fog nodes are configured in the order of their IDs so that the same seed always gives the same topology
+	Args:
+		mobility		(MobilitySource):	Mobility source giving the network boundary (random placement)
+		visual_center	(tuple):			Center of the map visually (used to place randomly fog nodes around)
+		fog_resources	(tuple):			Resources to use for the fog nodes
+		seed			(int):				Seed of the density placement (default: 0)
+	Returns:
+		Topology: Fog nodes (attribute "fogs") and their neighbours graph
+	"""
+	# Add multiple fog nodes following the road and traffic density (the cached geometry gives the boundary)
+	if FOG_PLACEMENT == "density":
+		geometry: NetGeometry = NetGeometry.load(NET_FILE, PLACEMENT_CELL_SIZE)
+		fog_list: set[FogNode] = FogNode.placed_nodes(density_positions(NB_FOG_NODES, geometry, PLACEMENT_POSITIONS_FILE, seed), FOG_SHAPE, FOG_COLOR)
+
+	# Add multiple fog nodes at random positions
+	else:
+		(MIN_X, MIN_Y), (MAX_X, MAX_Y) = mobility.get_net_boundary()
+		OFFSET_X = int((MAX_X - MIN_X) / 2)
+		OFFSET_Y = int((MAX_Y - MIN_Y) / 2)
+		fog_list: set[FogNode] = FogNode.random_nodes(NB_FOG_NODES, (OFFSET_X, OFFSET_Y), visual_center, RANDOM_DIVIDER, FOG_SHAPE, FOG_COLOR)
+
+	# Setup random resources for fog nodes
+	fog_link_bandwidth_range: tuple[int,int,int] = tuple(x // 4 for x in fog_resources[0])	# Bandwidth = (cpu resource // 4) to scale with it.
+	topology: Topology = Topology(fog_list, fog_resources, fog_link_bandwidth_range)
+	for fog_node in sorted(fog_list, key = lambda fog: fog.id):
+		fog_node.set_resources(Resource.random(*fog_resources))
+		topology.connect(fog_node)
+		info(fog_node)
+	RoutingTable.build(fog_list, MAX_OFFLOAD_HOPS)
+	return topology
+
 
 def run_simulation(
 		simulation_name: str,
@@ -24,6 +143,9 @@ def run_simulation(
 		auto_quit: bool = True,
 		open_gui: bool = True,
 		fog_resources: tuple[int,int,int] = Resource.HIGH_RANDOM_RESOURCE_ARGS,
+		mobility: MobilitySource|None = None,
+		on_step: Callable[[int, dict[str,float], float], None]|None = None,
+		max_steps: int|None = None,
 	) -> dict:
 	""" Run a simulation with the given parameters\n
 	It will generates multiple plots such as the QoS over time, the fog nodes resources, etc.\n
@@ -39,73 +161,78 @@ def run_simulation(
 		auto_quit		(bool):			Whether to quit the simulation automatically (default: True)	(adding '--quit-on-end')
 		open_gui		(bool):			Whether to run traci command "sumo-gui" or "sumo" (default: True)
 		fog_resources	(tuple):		Resources to use for the fog nodes (default: Resource.HIGH_RANDOM_RESOURCE_ARGS)
+		mobility		(MobilitySource):	Source of the vehicles positions, SUMO is started with the given parameters if None (default: None)
+		on_step			(Callable):			Called after each step with (step, usage of each fog node by ID, QoS), used to compare engines (default: None)
+		max_steps		(int):			Stop after this number of steps even if vehicles remain (partial runs of the tuner), None to run until the end (default: None)
 	Returns:
 		dict: Dictionnary of evaluations over time
 	"""
 
-	# Start sumo
+	# Start sumo (if no other mobility source is given)
 	random.seed(seed)
-	executable: str = "sumo-gui" if open_gui else "sumo"
-	command: list[str] = [executable, "-c", sumo_config, "--seed", str(seed)]
-	if auto_start:
-		command.append("--start")
-	if auto_quit:
-		command.append("--quit-on-end")
+	Vehicle.rng_seed = seed
 	simplified_name: str = simulation_name.split("/")[-1]
-	traci.start(command, label = simplified_name)
+	if mobility is None:
+		mobility = SumoMobility(sumo_command(sumo_config, seed, auto_start, auto_quit, open_gui), label = simplified_name)
+	set_mobility(mobility)
 
-	# Calculated constants
-	(MIN_X, MIN_Y), (MAX_X, MAX_Y) = traci.simulation.getNetBoundary()
-	OFFSET_X = int((MAX_X - MIN_X) / 2)
-	OFFSET_Y = int((MAX_Y - MIN_Y) / 2)
+	# Write the log records of the simulation if asked
+	if LOG_JSON:
+		os.makedirs(simulation_name, exist_ok = True)
+		Logger.open_json(f"{simulation_name}/log.jsonl")
 
-	# Add multiple fog nodes at random positions
-	fog_list: set[FogNode] = FogNode.random_nodes(NB_FOG_NODES, (OFFSET_X, OFFSET_Y), visual_center, RANDOM_DIVIDER, FOG_SHAPE, FOG_COLOR)
+	# Stream the finished tasks records if asked
+	if STREAM_TASK_RECORDS and not Task.retain_finished:
+		os.makedirs(simulation_name, exist_ok = True)
+		Task.open_records_stream(f"{simulation_name}/task_records.jsonl")
 
-	# Setup random resources for fog nodes
-	fog_link_bandwidth_range: tuple[int,int,int] = tuple(x // 4 for x in fog_resources[0])	# Bandwidth = (cpu resource // 4) to scale with it.
-	for fog_node in fog_list:
-		fog_node.set_resources(Resource.random(*fog_resources))
-		fog_node.set_neighbours(nodes = fog_list, bandwidth_range = fog_link_bandwidth_range)
-		info(fog_node)
+	# Add multiple fog nodes at random positions with random resources
+	topology: Topology = setup_fog_nodes(mobility, visual_center, fog_resources, seed)
+	fog_list: set[FogNode] = topology.fogs
+	recorded_positions: list[tuple[float,float]] = []
 	
 	# Evaluations
 	qos_history: list[float] = []
-	allocated_tasks_history: list[float] = []
-	nodes_usage_history: list[float] = []
-	links_load_history: list[float] = []
-	tasks_distance_history: list[float] = []
-	completed_tasks_history: list[int] = []
-	pending_tasks_history: list[int] = []
-	failed_tasks_history: list[int] = []
-	total_tasks_history: list[int] = []
+	histories: dict[str, list[float]] = {label: [] for label in EVALUATION_LABELS}
+	exporter: MetricsExporter|None = None
+	if METRICS_EXPORT or METRICS_PORT is not None:
+		os.makedirs(simulation_name, exist_ok = True)
+		exporter = MetricsExporter(simulation_name, path = f"{simulation_name}/metrics.prom" if METRICS_EXPORT else None)
 
 	# While there are vehicles in the simulation
+	coarsening: StepCoarsening = StepCoarsening()
 	step: int = 0
-	while traci.simulation.getMinExpectedNumber() > 0:
+	while mobility.has_vehicles() and (max_steps is None or step < max_steps):
 
 		# Make a step in the simulation
-		traci.simulationStep()
+		mobility.step()
 
-		# Algorithm step
-		time_taken = solution_algorithm_step(fog_list, assign_mode)
-		if debug_perf:
-			debug(f"Time taken for step #{step}: {time_taken:.5f}s")
+		# Record the vehicles positions (used by the density placement of the fog nodes)
+		if RECORD_POSITIONS_INTERVAL > 0 and step % RECORD_POSITIONS_INTERVAL == 0:
+			recorded_positions.extend(mobility.get_positions().values())
 
-		# Evaluate the network
-		qos = Evaluator.calculate_qos(fog_list)
-		qos_history.append(qos)
+		# Fog nodes joining or leaving (the algorithm runs on the steps changing the topology)
+		Task.current_step = step
+		topology_changed: bool = topology.apply_events(step) if TOPOLOGY_EVENTS else False
 
-		# Get additional evaluations
-		evals = Evaluator.get_eval_parameters(fog_list)
-		allocated_tasks_history.append(evals["allocated_tasks"])
-		nodes_usage_history.append(evals["nodes_usage"])
-		links_load_history.append(evals["links_load"])
-		tasks_distance_history.append(evals["tasks_distance_cost"])
-		completed_tasks_history.append(evals["completed_tasks"])
-		pending_tasks_history.append(evals["pending_tasks"])
-		failed_tasks_history.append(evals["failed_tasks"])
-		total_tasks_history.append(evals["total_tasks"])
+		# Algorithm step (the evaluations of the skipped steps are carried forward)
+		if coarsening.should_run(step) or topology_changed:
+			time_taken = coarsening.run(fog_list, assign_mode, step)
+			if debug_perf:
+				debug("Time taken for step #%d: %.5fs", step, time_taken)
+
+			# Evaluate the network and get additional evaluations
+			qos = Evaluator.calculate_qos(fog_list)
+			evals = Evaluator.get_eval_parameters(fog_list)
+		else:
+			time_taken = 0.0
+		qos_history.append(qos)
+		for label, key in EVALUATION_LABELS.items():
+			histories[label].append(evals[key])
+		if exporter is not None:
+			exporter.publish(step, time_taken, len(Vehicle.vehicles), evals, qos)
+		if on_step is not None:
+			on_step(step, {fog.id: fog.get_usage() for fog in fog_list}, qos)
 
 		# Make a plot with all evaluations
 		if step % PLOT_INTERVAL == 0 and open_gui:
@@ -118,37 +245,24 @@ def run_simulation(
 			plt.pause(0.0001)
 			time_taken = time.perf_counter() - time_taken
 			if debug_perf:
-				debug(f"Plotting time: {time_taken:.5f}s")
+				debug("Plotting time: %.5fs", time_taken)
 
 		# Increment the step
 		step += 1
 
 	# Close the simulation
-	traci.close()
+	mobility.close()
+	Task.close_records_stream()
+	if exporter is not None:
+		exporter.close()
 	info("Simulation closed")
+	Logger.close_json()
+	os.makedirs(simulation_name, exist_ok = True)
+	LatencyTracker.save(f"{simulation_name}/latency_histograms.json")
+	if RECORD_POSITIONS_INTERVAL > 0:
+		os.makedirs(simulation_name, exist_ok = True)
+		np.save(f"{simulation_name}/positions.npy", np.array(recorded_positions, dtype = np.float64).reshape(-1, 2))
 
 	# Prepeare the return dictionnary
-	r_dict = {
-		"folder": folder,
-		"simulation_name": simulation_name,
-		"name": simplified_name,
-		"QoS Evaluations": qos_history,
-		"Allocated Tasks": allocated_tasks_history,
-		"Nodes Usage": nodes_usage_history,
-		"Links Load": links_load_history,
-		"Tasks Distance*Cost": tasks_distance_history,
-
-		"Completed Tasks": completed_tasks_history,
-		"Pending Tasks": pending_tasks_history,
-		"Failed Tasks": failed_tasks_history,
-		"Total Tasks": total_tasks_history,
-	}
-
-	# Add cumulative arrays
-	for key, value in list(r_dict.items()):
-		if key not in ["folder", "simulation_name", "name"]:
-			r_dict[f"Cumulative {key}"] = [sum(value[:i]) for i in range(len(value))]
-
-	# Return the dict
-	return r_dict
+	return make_evaluations_dict(folder, simulation_name, qos_history, histories)
 
@@ -0,0 +1,166 @@
+
+# Imports
+from __future__ import annotations
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from src.print import *
+from config import *
+import numpy as np
+import threading
+import time
+import os
+
+# Task states exported by the metrics (evaluation key, state label)
+EXPORTED_TASK_STATES: list[tuple[str,str]] = [
+	("pending_tasks", "pending"),
+	("allocated_tasks", "in_progress"),
+	("completed_tasks", "completed"),
+	("failed_tasks", "failed"),
+]
+
+
+def get_memory_usage() -> int:
+	""" Get the resident memory of the current process (in bytes, 0 if unknown on this platform)
+	Returns:
+		int: Resident memory in bytes
+	"""
+	try:
+		with open("/proc/self/statm", "r") as file:
+			return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError, AttributeError):
+		return 0
+
+
+# Live metrics of a running simulation
+class MetricsExporter():
+	def __init__(self, simulation_name: str, path: str|None = None, port: int|None = METRICS_PORT, interval: float = METRICS_INTERVAL) -> None:
+		""" MetricsExporter constructor, starts the background thread (and the HTTP endpoint if a port is given)\n
+		The simulation loop only stores its latest values with publish(), the rendering and the writing are done by the
+		background thread so the loop is never blocked by the exporter
+		Args:
+			simulation_name	(str):		Name of the simulation (label of the metrics)
+			path			(str):		Path of the file rewritten every interval in the Prometheus text format (default: None)
+			port			(int):		Port of the HTTP endpoint on localhost, the next ports are tried if already used (default: METRICS_PORT)
+			interval		(float):	Time between two rewrites of the file (in seconds)
+		"""
+		self.simulation_name: str = simulation_name.split("/")[-1]
+		self.path: str|None = path
+		self.interval: float = interval
+		self.latest: tuple = (0, 0, {}, 0.0)					# (step, vehicles, evaluations, qos), replaced at once by publish()
+		self.step_times: deque[float] = deque(maxlen = 1000)	# Durations of the last steps
+		self.step_ends: deque[float] = deque(maxlen = 1000)		# End times of the last steps
+		self.stopped: threading.Event = threading.Event()
+
+		# HTTP endpoint
+		self.server: ThreadingHTTPServer|None = None
+		if port is not None:
+			self.server = MetricsExporter.start_server(self, port)
+
+		# Background thread rewriting the file
+		self.thread: threading.Thread = threading.Thread(target = self.run, name = f"metrics-{self.simulation_name}", daemon = True)
+		self.thread.start()
+
+	@staticmethod
+	def start_server(exporter: MetricsExporter, port: int, nb_tries: int = 16) -> ThreadingHTTPServer|None:
+		""" Start the HTTP endpoint of an exporter on localhost (in a daemon thread)
+		Args:
+			exporter	(MetricsExporter):	Exporter to serve
+			port		(int):				First port to try
+			nb_tries	(int):				Number of ports to try (simulations running in parallel use the next ones)
+		Returns:
+			ThreadingHTTPServer: The server, None if no port was available
+		"""
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self) -> None:
+				body: bytes = exporter.render().encode("utf-8")
+				self.send_response(200)
+				self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+			def log_message(self, format: str, *args) -> None:
+				pass
+
+		for offset in range(nb_tries):
+			try:
+				server = ThreadingHTTPServer(("127.0.0.1", port + offset), Handler)
+			except OSError:
+				continue
+			threading.Thread(target = server.serve_forever, name = f"metrics-http-{port + offset}", daemon = True).start()
+			info(f"Metrics of '{exporter.simulation_name}' available at http://127.0.0.1:{port + offset}/metrics")
+			return server
+		warning(f"No port available for the metrics of '{exporter.simulation_name}' (tried {port} to {port + nb_tries - 1})")
+		return None
+
+	def publish(self, step: int, step_time: float, nb_vehicles: int, evals: dict[str, float], qos: float) -> None:
+		""" Store the values of the last step (called by the simulation loop, constant time)
+		Args:
+			step		(int):		Step of the simulation
+			step_time	(float):	Time taken by the step (in seconds)
+			nb_vehicles	(int):		Number of vehicles in the simulation
+			evals		(dict):		Evaluations of the step (see Evaluator.get_eval_parameters)
+			qos			(float):	Quality of Service of the step
+		"""
+		self.step_times.append(step_time)
+		self.step_ends.append(time.perf_counter())
+		self.latest = (step, nb_vehicles, evals, qos)
+
+	def render(self) -> str:
+		""" Render the metrics in the Prometheus text format
+		Returns:
+			str: Metrics text
+		"""
+		step, nb_vehicles, evals, qos = self.latest
+		step_times: np.ndarray = np.array(list(self.step_times), dtype = np.float64)
+		step_ends: list[float] = list(self.step_ends)
+		steps_per_second: float = 0.0
+		if len(step_ends) > 1 and step_ends[-1] > step_ends[0]:
+			steps_per_second = (len(step_ends) - 1) / (step_ends[-1] - step_ends[0])
+
+		# Metrics lines
+		label: str = f'simulation="{self.simulation_name}"'
+		lines: list[str] = [
+			"# HELP fog_step Current step of the simulation", "# TYPE fog_step counter",
+			f"fog_step{{{label}}} {step}",
+			"# HELP fog_steps_per_second Steps per second over the last steps", "# TYPE fog_steps_per_second gauge",
+			f"fog_steps_per_second{{{label}}} {steps_per_second:.6g}",
+			"# HELP fog_step_time_seconds Time taken by the algorithm step", "# TYPE fog_step_time_seconds summary",
+		]
+		for quantile in (0.5, 0.95, 0.99):
+			value: float = float(np.quantile(step_times, quantile)) if len(step_times) else 0.0
+			lines.append(f'fog_step_time_seconds{{{label},quantile="{quantile}"}} {value:.6g}')
+		lines += [
+			"# HELP fog_vehicles Number of vehicles in the simulation", "# TYPE fog_vehicles gauge",
+			f"fog_vehicles{{{label}}} {nb_vehicles}",
+			"# HELP fog_tasks Number of tasks per state", "# TYPE fog_tasks gauge",
+			*[f'fog_tasks{{{label},state="{state}"}} {evals.get(key, 0)}' for key, state in EXPORTED_TASK_STATES],
+			"# HELP fog_qos Quality of Service of the last step", "# TYPE fog_qos gauge",
+			f"fog_qos{{{label}}} {qos:.6g}",
+			"# HELP fog_memory_bytes Resident memory of the simulation process", "# TYPE fog_memory_bytes gauge",
+			f"fog_memory_bytes{{{label}}} {get_memory_usage()}",
+		]
+		return "\n".join(lines) + "\n"
+
+	def write(self) -> None:
+		""" Rewrite the metrics file (atomically, so readers never see a partial file) """
+		if self.path is None:
+			return
+		temporary_path: str = f"{self.path}.tmp"
+		with open(temporary_path, "w", encoding = "utf-8") as file:
+			file.write(self.render())
+		os.replace(temporary_path, self.path)
+
+	def run(self) -> None:
+		""" Background thread: rewrite the metrics file every interval until stopped """
+		while not self.stopped.wait(self.interval):
+			self.write()
+
+	def close(self) -> None:
+		""" Stop the background thread and the HTTP endpoint, and write the metrics one last time """
+		self.stopped.set()
+		self.thread.join()
+		self.write()
+		if self.server is not None:
+			self.server.shutdown()
+			self.server.server_close()
+
@@ -0,0 +1,192 @@
+
+# Imports
+from __future__ import annotations
+import traci
+import random
+import math
+
+
+# Source of the vehicles positions (base class doing nothing, usable for headless processes that only need the fog layer)
+class MobilitySource():
+	""" Interface between the fog layer and the traffic simulation (vehicles positions and drawing) """
+
+	def step(self) -> None:
+		""" Advance the traffic simulation by one step """
+		pass
+
+	def has_vehicles(self) -> bool:
+		""" Check if vehicles are still expected in the simulation
+		Returns:
+			bool: True if the simulation should continue
+		"""
+		return False
+
+	def get_vehicle_ids(self) -> list[str]:
+		""" Get the IDs of the vehicles currently in the simulation
+		Returns:
+			list[str]: List of vehicle IDs
+		"""
+		return []
+
+	def get_position(self, vehicle_id: str) -> tuple[float,float]:
+		""" Get the position of a vehicle
+		Args:
+			vehicle_id	(str):	ID of the vehicle
+		Returns:
+			tuple[float,float]: Position of the vehicle
+		"""
+		raise KeyError(vehicle_id)
+
+	def get_positions(self) -> dict[str, tuple[float,float]]:
+		""" Get the positions of every vehicle currently in the simulation
+		Returns:
+			dict[str, tuple[float,float]]: Dictionnary of vehicle ID to position
+		"""
+		return {vehicle_id: self.get_position(vehicle_id) for vehicle_id in self.get_vehicle_ids()}
+
+	def get_fog_distances(self, vehicle_id: str) -> dict[str, float]|None:
+		""" Get the distances between a vehicle and the fog nodes if the source computes them (see src.multitenant)
+		Args:
+			vehicle_id	(str):	ID of the vehicle
+		Returns:
+			dict[str, float]|None: Distance to each fog node by ID, None if the vehicle computes them
+		"""
+		return None
+
+	def get_net_boundary(self) -> tuple[tuple[float,float], tuple[float,float]]:
+		""" Get the boundary of the network
+		Returns:
+			tuple: ((min_x, min_y), (max_x, max_y))
+		"""
+		return (0.0, 0.0), (0.0, 0.0)
+
+	def set_vehicle_color(self, vehicle_id: str, color: tuple) -> None:
+		""" Set the color of a vehicle (no effect if there is no display) """
+		pass
+
+	def add_polygon(self, polygon_id: str, shape: list[tuple], color: tuple) -> None:
+		""" Draw a polygon (no effect if there is no display) """
+		pass
+
+	def set_polygon_color(self, polygon_id: str, color: tuple) -> None:
+		""" Set the color of a polygon (no effect if there is no display) """
+		pass
+
+	def remove_polygon(self, polygon_id: str) -> None:
+		""" Remove a polygon (no effect if there is no display) """
+		pass
+
+	def close(self) -> None:
+		""" Close the traffic simulation """
+		pass
+
+
+# SUMO through traci
+class SumoMobility(MobilitySource):
+	def __init__(self, command: list[str]|None = None, label: str = "default") -> None:
+		""" SumoMobility constructor, start SUMO if a command is given (else the current traci connection is used)
+		Args:
+			command	(list[str]):	Command to start SUMO with (default: None)
+			label	(str):			Label of the traci connection (default: "default")
+		"""
+		if command is not None:
+			traci.start(command, label = label)
+
+	def step(self) -> None:
+		traci.simulationStep()
+	def has_vehicles(self) -> bool:
+		return traci.simulation.getMinExpectedNumber() > 0
+	def get_vehicle_ids(self) -> list[str]:
+		return list(traci.vehicle.getIDList())
+	def get_position(self, vehicle_id: str) -> tuple[float,float]:
+		return traci.vehicle.getPosition(vehicle_id)
+	def get_net_boundary(self) -> tuple[tuple[float,float], tuple[float,float]]:
+		return traci.simulation.getNetBoundary()
+	def set_vehicle_color(self, vehicle_id: str, color: tuple) -> None:
+		traci.vehicle.setColor(vehicle_id, color)
+	def add_polygon(self, polygon_id: str, shape: list[tuple], color: tuple) -> None:
+		traci.polygon.add(polygonID = polygon_id, shape = shape, color = color, fill = True)
+	def set_polygon_color(self, polygon_id: str, color: tuple) -> None:
+		traci.polygon.setColor(polygon_id, color)
+	def remove_polygon(self, polygon_id: str) -> None:
+		traci.polygon.remove(polygon_id)
+	def close(self) -> None:
+		traci.close()
+
+
+# Seeded synthetic traffic (vehicles appearing at random positions and moving in random directions), used without SUMO
+class RandomWalkMobility(MobilitySource):
+	def __init__(self, seed: int = 0, nb_steps: int = 500, boundary: tuple = ((0.0, 0.0), (3871.15, 4519.29)), arrivals_range: tuple[int,int] = (0, 4), lifetime_range: tuple[int,int] = (30, 200), speed: float = 15.0) -> None:
+		""" RandomWalkMobility constructor
+		Args:
+			seed			(int):		Seed of the traffic (default: 0)
+			nb_steps		(int):		Number of steps where vehicles can appear (default: 500)
+			boundary		(tuple):	Boundary of the network, default is the Reims network boundary
+			arrivals_range	(tuple):	Min and Max number of new vehicles per step
+			lifetime_range	(tuple):	Min and Max number of steps a vehicle stays in the simulation
+			speed			(float):	Distance travelled by a vehicle per step
+		"""
+		self.random: random.Random = random.Random(seed)
+		self.nb_steps: int = nb_steps
+		self.boundary: tuple = boundary
+		self.arrivals_range: tuple[int,int] = arrivals_range
+		self.lifetime_range: tuple[int,int] = lifetime_range
+		self.speed: float = speed
+		self.current_step: int = 0
+		self.nb_generated: int = 0
+		self.vehicles: dict[str, list] = {}		# vehicle ID -> [x, y, heading, remaining steps]
+
+	def step(self) -> None:
+		(min_x, min_y), (max_x, max_y) = self.boundary
+
+		# Move the vehicles and remove the ones at the end of their life
+		for vehicle_id in list(self.vehicles):
+			state: list = self.vehicles[vehicle_id]
+			state[2] += self.random.uniform(-0.5, 0.5)
+			state[0] = min(max(state[0] + math.cos(state[2]) * self.speed, min_x), max_x)
+			state[1] = min(max(state[1] + math.sin(state[2]) * self.speed, min_y), max_y)
+			state[3] -= 1
+			if state[3] <= 0:
+				del self.vehicles[vehicle_id]
+
+		# Add new vehicles
+		if self.current_step < self.nb_steps:
+			for _ in range(self.random.randint(*self.arrivals_range)):
+				vehicle_id: str = f"veh{self.nb_generated}"
+				self.nb_generated += 1
+				self.vehicles[vehicle_id] = [
+					self.random.uniform(min_x, max_x),
+					self.random.uniform(min_y, max_y),
+					self.random.uniform(0, 2 * math.pi),
+					self.random.randint(*self.lifetime_range),
+				]
+		self.current_step += 1
+
+	def has_vehicles(self) -> bool:
+		return self.current_step < self.nb_steps or len(self.vehicles) > 0
+	def get_vehicle_ids(self) -> list[str]:
+		return list(self.vehicles)
+	def get_position(self, vehicle_id: str) -> tuple[float,float]:
+		state: list = self.vehicles[vehicle_id]
+		return (state[0], state[1])
+	def get_net_boundary(self) -> tuple[tuple[float,float], tuple[float,float]]:
+		return self.boundary
+
+
+# Mobility source used by the fog nodes and the vehicles of the current process
+current: MobilitySource = SumoMobility()
+
+def get_mobility() -> MobilitySource:
+	""" Get the mobility source used by the current process
+	Returns:
+		MobilitySource: Current mobility source
+	"""
+	return current
+
+def set_mobility(mobility: MobilitySource) -> None:
+	""" Set the mobility source used by the current process
+	Args:
+		mobility	(MobilitySource):	New mobility source
+	"""
+	global current
+	current = mobility
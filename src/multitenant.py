@@ -0,0 +1,292 @@
+
+# Imports
+from __future__ import annotations
+from src.fog import FogNode
+from src.mobility import MobilitySource, SumoMobility
+from src.transport import export_evaluations
+from src.main import run_simulation, sumo_command
+from src.utils import *
+from src.print import *
+from config import *
+from multiprocessing import Process, Queue
+from collections import deque
+import numpy as np
+import traceback
+import queue
+import math
+
+
+# Mobility source of a tenant: the frames computed once by the coordinator (see run_multi_tenant_simulation)
+class ReplayMobility(MobilitySource):
+	def __init__(self, index: int, inbox: Queue, outbox: Queue) -> None:
+		""" ReplayMobility constructor
+		Args:
+			index	(int):		Index of the tenant
+			inbox	(Queue):	Queue of the frames sent by the coordinator
+			outbox	(Queue):	Queue of the messages to the coordinator (shared by all tenants)
+		"""
+		self.index: int = index
+		self.inbox: Queue = inbox
+		self.outbox: Queue = outbox
+		self.boundary: tuple|None = None					# Received first, before the fog nodes are created
+		self.ready: bool = False							# Whether the fog nodes positions were sent to the coordinator
+		self.next_frame: tuple|None = None					# Frame of the next step, received in advance by has_vehicles()
+		self.received: bool = False							# Whether next_frame is the next frame (None at the end of the traffic)
+		self.vehicle_ids: list[str] = []
+		self.rows: dict[str, int] = {}						# Row of each vehicle in the arrays of the frame
+		self.positions: np.ndarray = np.zeros((0, 2))
+		self.distances: np.ndarray|None = None				# Distances between the vehicles and the fog nodes (one column per fog node)
+		self.fog_columns: list[str] = []					# Fog node ID of each column of the distances
+
+	def receive_boundary(self) -> None:
+		""" Wait for the boundary of the network (first message of the coordinator) """
+		if self.boundary is None:
+			_, self.boundary = self.inbox.get()
+
+	def receive_frame(self) -> None:
+		""" Send the positions of the fog nodes at the first call, then wait for the frame of the next step """
+		self.receive_boundary()
+		if not self.ready:
+			self.outbox.put(("positions", self.index, {fog.id: fog.position for fog in FogNode.generated_nodes}))
+			self.ready = True
+		if not self.received:
+			self.next_frame = self.inbox.get()
+			self.received = True
+
+	def step(self) -> None:
+		self.receive_frame()
+		self.vehicle_ids, self.positions, self.distances, self.fog_columns = self.next_frame
+		self.rows = {vehicle_id: row for row, vehicle_id in enumerate(self.vehicle_ids)}
+		self.received = False
+	def has_vehicles(self) -> bool:
+		self.receive_frame()
+		return self.next_frame is not None
+	def get_vehicle_ids(self) -> list[str]:
+		return list(self.vehicle_ids)
+	def get_position(self, vehicle_id: str) -> tuple[float,float]:
+		x, y = self.positions[self.rows[vehicle_id]].tolist()
+		return (x, y)
+	def get_fog_distances(self, vehicle_id: str) -> dict[str, float]|None:
+		if self.distances is None:
+			return None
+		return dict(zip(self.fog_columns, self.distances[self.rows[vehicle_id]].tolist()))
+	def get_net_boundary(self) -> tuple[tuple[float,float], tuple[float,float]]:
+		self.receive_boundary()
+		return self.boundary
+
+
+def tenant_worker(index: int, tenant: tuple[str, AssignMode, str, tuple], visual_center: tuple[int,int], seed: int, debug_perf: bool, inbox: Queue, outbox: Queue) -> None:
+	""" Main function of a tenant process: run the simulation of its fog layer and send back the handle of its evaluations
+	(or the traceback of its exception if it fails)
+	Args:
+		index			(int):		Index of the tenant
+		tenant			(tuple):	(simulation_name, assign_mode, folder, fog_resources) of the tenant
+		visual_center	(tuple):	Center of the map visually (used to place randomly fog nodes around)
+		seed			(int):		Seed of the simulation
+		debug_perf		(bool):		Whether to debug the performance of the simulation
+		inbox			(Queue):	Queue of the messages from the coordinator
+		outbox			(Queue):	Queue of the messages to the coordinator (shared by all tenants)
+	"""
+	simulation_name, assign_mode, folder, fog_resources = tenant
+	try:
+		r_dict: dict = run_simulation(
+			simulation_name = simulation_name,
+			assign_mode = assign_mode,
+			sumo_config = "",
+			visual_center = visual_center,
+			folder = folder,
+			seed = seed,
+			debug_perf = debug_perf,
+			open_gui = False,
+			fog_resources = fog_resources,
+			mobility = ReplayMobility(index, inbox, outbox),
+		)
+		outbox.put(("handle", index, export_evaluations(r_dict)))
+	except BaseException:
+		outbox.put(("error", index, traceback.format_exc()))
+	Logger.flush()	# The exit handlers are not called in the tenant processes
+
+
+# Coordinator side of the tenants processes
+class TenantPool():
+	def __init__(self, tenants: list[tuple[str, AssignMode, str, tuple[int,int,int]]], visual_center: tuple[int,int], seed: int, debug_perf: bool) -> None:
+		""" TenantPool constructor, start one process per tenant
+		Args:
+			tenants			(list[tuple]):	(simulation_name, assign_mode, folder, fog_resources) of each tenant
+			visual_center	(tuple):		Center of the map visually (used to place randomly fog nodes around)
+			seed			(int):			Seed of the simulations
+			debug_perf		(bool):			Whether to debug the performance of the simulations
+		"""
+		self.names: list[str] = [tenant[0] for tenant in tenants]
+		self.outbox: Queue = Queue()
+		self.inboxes: list[Queue] = [Queue(maxsize = MULTI_TENANT_BUFFER) for _ in tenants]
+		self.received: deque[tuple] = deque()	# Messages of the tenants read while checking them
+		self.processes: list[Process] = [
+			Process(target = tenant_worker, args = (i, tenant, visual_center, seed, debug_perf, self.inboxes[i], self.outbox), daemon = True)
+			for i, tenant in enumerate(tenants)
+		]
+		for process in self.processes:
+			process.start()
+
+	def fail(self, reason: str) -> None:
+		""" Stop every tenant and raise the failure
+		Args:
+			reason	(str):	Description of the failure
+		"""
+		self.terminate()
+		raise RuntimeError(f"Multi-tenant simulation failed: {reason}")
+
+	def check(self) -> None:
+		""" Read the pending messages of the tenants and fail if one of them sent an exception or died without answering """
+		while True:
+			try:
+				self.received.append(self.outbox.get_nowait())
+			except queue.Empty:
+				break
+		for kind, index, content in self.received:
+			if kind == "error":
+				self.fail(f"tenant '{self.names[index]}' raised an exception\n{content}")
+		for index, process in enumerate(self.processes):
+			if process.exitcode not in (None, 0):
+				self.fail(f"tenant '{self.names[index]}' exited with code {process.exitcode}")
+
+	def receive(self, kind: str) -> tuple[int, object]:
+		""" Wait for the next message of a kind ("positions" or "handle"), checking the tenants every MULTI_TENANT_TIMEOUT seconds
+		Args:
+			kind	(str):	Kind of the message
+		Returns:
+			tuple[int,object]: Index of the tenant and content of the message
+		"""
+		while True:
+			self.check()
+			for message in self.received:
+				if message[0] == kind:
+					self.received.remove(message)
+					return message[1], message[2]
+			try:
+				self.received.append(self.outbox.get(timeout = MULTI_TENANT_TIMEOUT))
+			except queue.Empty:
+				if not any(process.is_alive() for process in self.processes) and self.outbox.empty():
+					self.fail(f"every tenant exited while waiting for a '{kind}' message")
+
+	def send(self, index: int, message: object) -> None:
+		""" Send a message to a tenant, checking the tenants every MULTI_TENANT_TIMEOUT seconds while its queue is full
+		Args:
+			index	(int):		Index of the tenant
+			message	(object):	Message to send
+		"""
+		while True:
+			try:
+				self.inboxes[index].put(message, timeout = MULTI_TENANT_TIMEOUT)
+				return
+			except queue.Full:
+				self.check()
+				if not self.processes[index].is_alive():
+					self.fail(f"tenant '{self.names[index]}' exited while the traffic was running")
+
+	def join(self) -> None:
+		""" Wait for the end of every tenant """
+		for process in self.processes:
+			process.join()
+
+	def terminate(self) -> None:
+		""" Stop every tenant still running (the frames they will never read are dropped, so the exit does not wait for them) """
+		for process in self.processes:
+			if process.is_alive():
+				process.terminate()
+		for process in self.processes:
+			process.join()
+		for inbox in self.inboxes:
+			inbox.cancel_join_thread()
+
+
+def distances_table(vehicle_ids: list[str], positions: np.ndarray, fog_positions: dict[str, tuple[float,float]]) -> np.ndarray:
+	""" Compute the distances between the vehicles and the fog nodes (the same way as Vehicle.set_distance_to_fogs)
+	Args:
+		vehicle_ids		(list[str]):	IDs of the vehicles
+		positions		(np.ndarray):	Positions of the vehicles (one row per vehicle)
+		fog_positions	(dict):			Position of each fog node (by ID, in the order of the columns)
+	Returns:
+		np.ndarray: Distances (one row per vehicle, one column per fog node)
+	"""
+	table: np.ndarray = np.empty((len(vehicle_ids), len(fog_positions)), dtype = np.float64)
+	for row, position in enumerate(positions.tolist()):
+		table[row] = [math.dist(position, fog_position) for fog_position in fog_positions.values()]
+	return table
+
+
+def run_multi_tenant_simulation(
+		tenants: list[tuple[str, AssignMode, str, tuple[int,int,int]]],
+		sumo_config: str,
+		visual_center: tuple[int,int],
+		seed: int = 0,
+		debug_perf: bool = False,
+		auto_start: bool = True,
+		auto_quit: bool = True,
+		open_gui: bool = True,
+		mobility: MobilitySource|None = None,
+	) -> list[dict]:
+	""" Run the simulations of several fog layers (e.g. one per assign mode or resources preset) driven by the same traffic\n
+	The coordinator (this process) advances the mobility source and fetches the positions of the vehicles once per step,
+	every tenant is a process running its own fog layer (tasks, evaluations and outputs) with run_simulation.
+	Tenants with the same fog nodes positions (same seed and placement) also share the distances between the vehicles and the fog nodes.
+	Each tenant gives the same results as its simulation run alone with the same seed.\n
+	Args:
+		tenants			(list[tuple]):		(simulation_name, assign_mode, folder, fog_resources) of each tenant
+		sumo_config		(str):				Sumo configuration file to use
+		visual_center	(tuple):			Center of the map visually (used to place randomly fog nodes around)
+		seed			(int):				Seed to use for the simulations (default: 0)
+		debug_perf		(bool):				Whether to debug the performance of the simulations (default: False)
+		auto_start		(bool):				Whether to start the simulation automatically (default: True)	(adding '--start')
+		auto_quit		(bool):				Whether to quit the simulation automatically (default: True)	(adding '--quit-on-end')
+		open_gui		(bool):				Whether to run traci command "sumo-gui" or "sumo" (default: True)
+		mobility		(MobilitySource):	Source of the vehicles positions, SUMO is started with the given parameters if None (default: None)
+	Returns:
+		list[dict]: Handles of the evaluations of each tenant, in the tenants order (see src.transport.load_evaluations)
+	"""
+	# Start the tenants before the traffic simulation (they do not inherit its connection)
+	pool: TenantPool = TenantPool(tenants, visual_center, seed, debug_perf)
+	try:
+
+		# Start sumo (if no other mobility source is given)
+		if mobility is None:
+			mobility = SumoMobility(sumo_command(sumo_config, seed, auto_start, auto_quit, open_gui), label = f"multi_tenant_{seed}")
+		for index in range(len(tenants)):
+			pool.send(index, ("boundary", mobility.get_net_boundary()))
+
+		# Group the tenants by fog nodes positions (each group shares its distances)
+		groups: dict[tuple, list[int]] = {}
+		fog_positions: dict[tuple, dict[str, tuple[float,float]]] = {}
+		for _ in tenants:
+			index, positions = pool.receive("positions")
+			key: tuple = tuple(sorted(positions.items()))
+			groups.setdefault(key, []).append(index)
+			fog_positions[key] = dict(key)
+		info(f"Multi-tenant simulation with {len(tenants)} tenants sharing the traffic ({len(groups)} fog layouts)")
+
+		# Send the frame of each step to every tenant (the queues are bounded, so the coordinator waits for the slowest tenant)
+		while mobility.has_vehicles():
+			mobility.step()
+			vehicle_ids: list[str] = mobility.get_vehicle_ids()
+			vehicles_positions: np.ndarray = np.array([mobility.get_position(vehicle_id) for vehicle_id in vehicle_ids], dtype = np.float64).reshape(-1, 2)
+			for key, indexes in groups.items():
+				frame: tuple = (vehicle_ids, vehicles_positions, distances_table(vehicle_ids, vehicles_positions, fog_positions[key]), list(fog_positions[key]))
+				for index in indexes:
+					pool.send(index, frame)
+		for index in range(len(tenants)):
+			pool.send(index, None)
+		mobility.close()
+
+		# Collect the evaluations of the tenants
+		handles: list[dict] = [{} for _ in tenants]
+		for _ in tenants:
+			index, handle = pool.receive("handle")
+			handles[index] = handle
+		pool.join()
+
+	# Stop the tenants if the coordinator fails (a failing tenant already stopped the others)
+	except BaseException:
+		pool.terminate()
+		raise
+	info("Multi-tenant simulation closed")
+	return handles
@@ -0,0 +1,209 @@
+
+# Imports
+from __future__ import annotations
+from src.print import *
+from config import *
+import xml.etree.ElementTree as ET
+import numpy as np
+import tempfile
+import zipfile
+import gzip
+import math
+import os
+
+
+# Road and traffic density of a SUMO network, parsed once and cached next to the network file
+class NetGeometry():
+	def __init__(self, boundary: tuple[tuple[float,float], tuple[float,float]], road_density: np.ndarray, cell_size: float) -> None:
+		""" NetGeometry constructor
+		Args:
+			boundary		(tuple):		Boundary of the network ((min_x, min_y), (max_x, max_y))
+			road_density	(np.ndarray):	Length of lanes in each cell of the grid (shape: nb_x, nb_y)
+			cell_size		(float):		Size of a cell of the grid (in meters)
+		"""
+		self.boundary: tuple[tuple[float,float], tuple[float,float]] = boundary
+		self.road_density: np.ndarray = road_density
+		self.traffic_density: np.ndarray = np.zeros_like(road_density)
+		self.cell_size: float = cell_size
+
+	def get_net_boundary(self) -> tuple[tuple[float,float], tuple[float,float]]:
+		""" Get the boundary of the network (same as traci.simulation.getNetBoundary() without starting SUMO) """
+		return self.boundary
+
+	def cell_centers(self) -> np.ndarray:
+		""" Get the center of every cell of the grid
+		Returns:
+			np.ndarray: Array of shape (nb_x * nb_y, 2), in the same order as density.ravel()
+		"""
+		(min_x, min_y), _ = self.boundary
+		nb_x, nb_y = self.road_density.shape
+		xs: np.ndarray = min_x + (np.arange(nb_x) + 0.5) * self.cell_size
+		ys: np.ndarray = min_y + (np.arange(nb_y) + 0.5) * self.cell_size
+		grid_x, grid_y = np.meshgrid(xs, ys, indexing = "ij")
+		return np.column_stack((grid_x.ravel(), grid_y.ravel()))
+
+	def histogram(self, points: np.ndarray, weights: np.ndarray|None = None) -> np.ndarray:
+		""" Accumulate points in the grid of the network
+		Args:
+			points	(np.ndarray):	Array of shape (n, 2)
+			weights	(np.ndarray):	Weight of each point (default: 1)
+		Returns:
+			np.ndarray: Grid of shape (nb_x, nb_y)
+		"""
+		(min_x, min_y), (max_x, max_y) = self.boundary
+		nb_x, nb_y = self.road_density.shape
+		grid, _, _ = np.histogram2d(points[:, 0], points[:, 1], bins = (nb_x, nb_y), range = ((min_x, min_x + nb_x * self.cell_size), (min_y, min_y + nb_y * self.cell_size)), weights = weights)
+		return grid
+
+	def add_positions(self, positions: np.ndarray) -> None:
+		""" Add recorded vehicles positions to the traffic density
+		Args:
+			positions	(np.ndarray):	Array of shape (n, 2)
+		"""
+		if len(positions) > 0:
+			self.traffic_density += self.histogram(np.asarray(positions, dtype = np.float64))
+
+	def weights(self, traffic_weight: float = PLACEMENT_TRAFFIC_WEIGHT) -> np.ndarray:
+		""" Combine the road and traffic densities (each one normalized to a sum of 1)
+		Args:
+			traffic_weight	(float):	Weight of the traffic density compared to the road density
+		Returns:
+			np.ndarray: Weight of each cell, in the same order as cell_centers()
+		"""
+		weights: np.ndarray = self.road_density / max(self.road_density.sum(), 1e-9)
+		if self.traffic_density.sum() > 0:
+			weights = weights + traffic_weight * self.traffic_density / self.traffic_density.sum()
+		return weights.ravel()
+
+	@staticmethod
+	def parse(net_file: str, cell_size: float) -> NetGeometry:
+		""" Parse a SUMO network file (.net.xml or .net.xml.gz) in streaming, accumulating the length of the lanes in a grid
+		Args:
+			net_file	(str):		Path of the network file
+			cell_size	(float):	Size of a cell of the grid (in meters)
+		Returns:
+			NetGeometry: Geometry of the network
+		"""
+		opener = gzip.open if net_file.endswith(".gz") else open
+		boundary: tuple|None = None
+		midpoints: list[tuple[float,float]] = []
+		lengths: list[float] = []
+		with opener(net_file, "rb") as file:
+			for event, element in ET.iterparse(file, events = ("start", "end")):
+				if event == "start":
+					if element.tag == "location" and boundary is None:
+						min_x, min_y, max_x, max_y = (float(x) for x in element.get("convBoundary").split(","))
+						boundary = ((min_x, min_y), (max_x, max_y))
+					continue
+				if element.tag == "edge":
+					if element.get("function") != "internal":
+						for lane in element.iter("lane"):
+							points: list[tuple[float,...]] = [tuple(float(v) for v in p.split(",")[:2]) for p in lane.get("shape", "").split()]
+							for (x1, y1), (x2, y2) in zip(points, points[1:]):
+								midpoints.append(((x1 + x2) / 2, (y1 + y2) / 2))
+								lengths.append(math.dist((x1, y1), (x2, y2)))
+					element.clear()
+				elif element.tag in ("junction", "connection", "tlLogic", "roundabout"):
+					element.clear()
+		if boundary is None:
+			raise ValueError(f"No <location> element found in '{net_file}'")
+
+		# Accumulate the lanes in the grid
+		(min_x, min_y), (max_x, max_y) = boundary
+		nb_x: int = max(1, math.ceil((max_x - min_x) / cell_size))
+		nb_y: int = max(1, math.ceil((max_y - min_y) / cell_size))
+		geometry = NetGeometry(boundary, np.zeros((nb_x, nb_y)), cell_size)
+		if midpoints:
+			geometry.road_density = geometry.histogram(np.array(midpoints), np.array(lengths))
+		return geometry
+
+	@staticmethod
+	def load(net_file: str = NET_FILE, cell_size: float = PLACEMENT_CELL_SIZE) -> NetGeometry:
+		""" Load the geometry of a network from its cache (a .npz next to the network file), parsing the network if the cache is outdated\n
+		A cache that cannot be read is parsed again, and the cache is replaced atomically (simulations running in parallel may share it)
+		Args:
+			net_file	(str):		Path of the network file
+			cell_size	(float):	Size of a cell of the grid (in meters)
+		Returns:
+			NetGeometry: Geometry of the network
+		"""
+		cache_path: str = f"{net_file}.geometry.npz"
+		source: np.ndarray = np.array([os.path.getsize(net_file), os.path.getmtime(net_file), cell_size])
+		if os.path.exists(cache_path):
+			try:
+				with np.load(cache_path) as cache:
+					if np.array_equal(cache["source"], source):
+						boundary = tuple(tuple(float(v) for v in row) for row in cache["boundary"])
+						return NetGeometry(boundary, cache["road_density"], cell_size)
+			except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+				warning(f"Unreadable network geometry cache '{cache_path}' ({e}), parsing the network again")
+
+		# Parse and cache the network (written to a temporary file of the same folder, then moved into place)
+		info(f"Parsing the network geometry of '{net_file}'")
+		geometry: NetGeometry = NetGeometry.parse(net_file, cell_size)
+		file_descriptor, temporary_path = tempfile.mkstemp(prefix = os.path.basename(cache_path) + ".", suffix = ".tmp", dir = os.path.dirname(cache_path) or ".")
+		try:
+			with os.fdopen(file_descriptor, "wb") as file:
+				np.savez_compressed(file, source = source, boundary = np.array(geometry.boundary), road_density = geometry.road_density)
+			os.chmod(temporary_path, 0o644)	# mkstemp creates the file readable by its owner only
+			os.replace(temporary_path, cache_path)
+		except BaseException:
+			if os.path.exists(temporary_path):
+				os.remove(temporary_path)
+			raise
+		return geometry
+
+
+# Weighted k-means on the cells of the density grid
+def weighted_kmeans(points: np.ndarray, weights: np.ndarray, k: int, seed: int = 0, max_iterations: int = 100) -> np.ndarray:
+	""" Find k positions minimizing the weighted squared distance of the points to their nearest position (vectorized Lloyd iterations)
+	Args:
+		points			(np.ndarray):	Array of shape (n, 2)
+		weights			(np.ndarray):	Weight of each point
+		k				(int):			Number of positions wanted
+		seed			(int):			Seed of the k-means++ initialization
+		max_iterations	(int):			Maximum number of iterations
+	Returns:
+		np.ndarray: Array of shape (k, 2)
+	"""
+	mask: np.ndarray = weights > 0
+	points, weights = points[mask], weights[mask]
+	generator: np.random.Generator = np.random.default_rng(seed)
+
+	# Initialization: weighted k-means++
+	centers: np.ndarray = points[[generator.choice(len(points), p = weights / weights.sum())]]
+	for _ in range(1, k):
+		distances: np.ndarray = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis = 2).min(axis = 1)
+		probabilities: np.ndarray = weights * distances
+		if probabilities.sum() <= 0:
+			probabilities = weights
+		centers = np.vstack((centers, points[generator.choice(len(points), p = probabilities / probabilities.sum())]))
+
+	# Lloyd iterations
+	for _ in range(max_iterations):
+		labels: np.ndarray = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis = 2).argmin(axis = 1)
+		total: np.ndarray = np.bincount(labels, weights = weights, minlength = k)
+		new_centers: np.ndarray = centers.copy()
+		non_empty: np.ndarray = total > 0
+		for axis in range(2):
+			new_centers[non_empty, axis] = np.bincount(labels, weights = weights * points[:, axis], minlength = k)[non_empty] / total[non_empty]
+		if np.allclose(new_centers, centers):
+			break
+		centers = new_centers
+	return centers
+
+
+def density_positions(nb_fog_nodes: int, geometry: NetGeometry, positions_file: str|None = PLACEMENT_POSITIONS_FILE, seed: int = 0) -> list[tuple[float,float]]:
+	""" Get fog nodes positions following the road and traffic density of the network
+	Args:
+		nb_fog_nodes	(int):			Number of fog nodes
+		geometry		(NetGeometry):	Geometry of the network
+		positions_file	(str):			Recorded vehicles positions (.npy of shape (n, 2)) to add to the traffic density (ignored if missing)
+		seed			(int):			Seed of the k-means initialization
+	Returns:
+		list[tuple[float,float]]: Positions of the fog nodes
+	"""
+	if positions_file and os.path.exists(positions_file):
+		geometry.add_positions(np.load(positions_file))
+	centers: np.ndarray = weighted_kmeans(geometry.cell_centers(), geometry.weights(), nb_fog_nodes, seed = seed)
+	return [(float(x), float(y)) for x, y in centers]
@@ -1,5 +1,6 @@
 
-# Import time
+# Imports (the records are written by the background writer of src.logger)
+from src.logger import Logger, LOG_LEVELS
 import time
 
 # Colors constants
@@ -10,15 +11,16 @@ RED = "\033[91m"
 RESET = "\033[0m"
 def current_time() -> str:
 	return time.strftime("%H:%M:%S")
-def info(text: str = "") -> None:
-	print(f"{GREEN}[INFO  {current_time()}] {text}{RESET}")
-def debug(text: str = "") -> None:
-	print(f"{BLUE}[DEBUG {current_time()}] {text}{RESET}")
-def warning(text: str = "") -> None:
-	print(f"{YELLOW}[WARNING {current_time()}] {text}{RESET}")
-def error(text: str = "", exit: bool = True) -> None:
-	print(f"{RED}[ERROR {current_time()}] {text}{RESET}")
+def info(text: object = "", *args) -> None:
+	Logger.log(20, text, args)
+def debug(text: object = "", *args) -> None:
+	Logger.log(10, text, args)
+def warning(text: object = "", *args) -> None:
+	Logger.log(30, text, args)
+def error(text: object = "", *args, exit: bool = True) -> None:
+	Logger.log(40, text, args)
 	if exit:
+		Logger.flush()
 		try:
 			input("Press enter to ignore error and continue or 'CTRL+C' to stop the program... ")
 		except KeyboardInterrupt:
@@ -0,0 +1,82 @@
+
+# Imports
+from src.print import *
+import numpy as np
+import hashlib
+
+# Streams of the random variables of a task (each one is independent from the others)
+STREAM_NB_TASKS: int = 0
+STREAM_CPU: int = 1
+STREAM_RAM: int = 2
+STREAM_STORAGE: int = 3
+STREAM_RESOLVING_TIME: int = 4
+STREAM_COST: int = 5
+STREAM_DEADLINE: int = 6
+
+
+def splitmix64(x: np.ndarray) -> np.ndarray:
+	""" SplitMix64 mixing function applied element-wise (uint64 arithmetic wraps around)
+	Args:
+		x	(np.ndarray):	Array of uint64
+	Returns:
+		np.ndarray: Mixed array of uint64
+	"""
+	x = x + np.uint64(0x9E3779B97F4A7C15)
+	x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+	x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+	return x ^ (x >> np.uint64(31))
+
+
+def entity_key(entity_id: str) -> int:
+	""" Stable 64 bits key of an entity ID (unlike hash(), it does not change between processes)
+	Args:
+		entity_id	(str):	ID of the entity (vehicle, fog node, ...)
+	Returns:
+		int: Key of the entity
+	"""
+	return int.from_bytes(hashlib.blake2b(entity_id.encode("utf-8"), digest_size = 8).digest(), "little")
+
+
+def counter_uniform(seed: int, keys: np.ndarray, counters: np.ndarray, stream: int) -> np.ndarray:
+	""" Counter-based random numbers: the value only depends on (seed, key, counter, stream), not on the order of the calls
+	Args:
+		seed		(int):			Seed of the simulation
+		keys		(np.ndarray):	Keys of the entities (see entity_key)
+		counters	(np.ndarray):	Counters of the entities (e.g. index of the task)
+		stream		(int):			Stream of the random variable
+	Returns:
+		np.ndarray: Uniform floats in [0, 1)
+	"""
+	keys = np.atleast_1d(np.asarray(keys, dtype = np.uint64))
+	counters = np.atleast_1d(np.asarray(counters, dtype = np.uint64))
+	x: np.ndarray = splitmix64(keys ^ splitmix64(np.full(keys.shape, seed & 0xFFFFFFFFFFFFFFFF, dtype = np.uint64)))
+	x = splitmix64(x ^ counters)
+	x = splitmix64(x ^ np.uint64(stream))
+	return (x >> np.uint64(11)).astype(np.float64) * (2.0 ** -53)
+
+
+def random_steps(uniforms: np.ndarray, min: int, max: int, step: int = 1) -> np.ndarray:
+	""" Vectorized version of random_step(): map uniform floats to numbers between Min and Max with the given step\n
+	The arguments are checked once for the whole batch
+	Args:
+		uniforms	(np.ndarray):	Uniform floats in [0, 1)
+		min			(int):			Min value
+		max			(int):			Max value
+		step		(int):			Step value
+	Returns:
+		np.ndarray: Array of int64
+	"""
+	# Check basic values
+	if min > max:
+		raise ValueError("Min value cannot be greater than Max value")
+	if step <= 0:
+		raise ValueError("Step value must be positive and different from zero")
+	if min % step != 0 or max % step != 0:
+		warning(f"Min and Max values must be multiples of the step value, got ({min}, {max}, {step})")
+
+	# Divide borders by the step and check if the step is too big
+	min //= step
+	max //= step
+	if min == max:
+		raise ValueError("Step value is too big")
+	return (min + np.floor(uniforms * (max - min + 1)).astype(np.int64)) * step
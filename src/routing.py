@@ -0,0 +1,162 @@
+
+# Imports
+from __future__ import annotations
+from config import *
+import heapq
+import math
+
+
+# Route from a fog node to another one through one or multiple links
+class Route():
+	def __init__(self, destination: "FogNode", links: list["FogNodesLink"], latence: int) -> None:	# type: ignore
+		""" Route constructor
+		Args:
+			destination	(FogNode):				Fog node at the end of the route
+			links		(list[FogNodesLink]):	Links to follow in order to reach the destination
+			latence		(int):					Sum of the latence of the links
+		"""
+		self.destination: "FogNode" = destination	# type: ignore
+		self.links: list["FogNodesLink"] = links	# type: ignore
+		self.latence: int = latence
+
+	def __str__(self) -> str:
+		return f"Route to {self.destination.id} with: Hops = {len(self.links)}, Latence = {self.latence}"
+
+	def can_handle_charge(self, incomming: int) -> bool:
+		""" Check if every link of the route can handle the charge
+		Args:
+			incomming	(int):	Charge to handle
+		Returns:
+			bool: True if every link can handle the charge, False otherwise
+		"""
+		return all(link.can_handle_charge(incomming) for link in self.links)
+
+	def add_charge(self, charge: int) -> None:
+		""" Add the charge to every link of the route
+		Args:
+			charge	(int):	Charge to add
+		"""
+		for link in self.links:
+			link.add_charge(charge)
+
+	def transfer_time(self, charge: int) -> int:
+		""" Number of steps needed to transfer a charge through the route (store and forward on each link)
+		Args:
+			charge	(int):	Charge to transfer (in MB)
+		Returns:
+			int: Transfer time in steps (at least 1)
+		"""
+		seconds: float = self.latence * STEPS_PER_LATENCE + sum(charge / link.bandwidth for link in self.links)
+		return max(1, math.ceil(seconds))
+
+
+# Transfers of tasks between fog nodes in progress
+class TransferQueue():
+	""" Min-heap of the transfers in progress, by arrival step\n
+	While transferred, a task is already assigned to its destination fog node (resources reserved) but does not progress,
+	and its charge is held on every link of the route until it arrives
+	"""
+	transfers: list[tuple[int, int, "Task", Route]] = []	# type: ignore	# (arrival step, sequence number, task, route)
+	sequence: int = 0										# Sequence number of the transfers, used to break ties in the sending order
+
+	@staticmethod
+	def send(task: "Task", route: Route) -> None:	# type: ignore
+		""" Start the transfer of a task through a route (the task is instantly available if transfer delays are disabled)
+		Args:
+			task	(Task):		Task already assigned to the destination of the route
+			route	(Route):	Route followed by the task
+		"""
+		from src.task import Task
+		if not TRANSFER_DELAYS:
+			route.add_charge(task.bandwidth_charge)
+			return
+		for link in route.links:
+			link.hold_charge(task.bandwidth_charge)
+		task.in_transfer = True
+		task.transfer_sequence = TransferQueue.sequence
+		arrival_step: int = Task.current_step + route.transfer_time(task.bandwidth_charge)
+		heapq.heappush(TransferQueue.transfers, (arrival_step, TransferQueue.sequence, task, route))
+		TransferQueue.sequence += 1
+
+	@staticmethod
+	def deliver(step: int) -> int:
+		""" Deliver the transfers arriving at the given step (or before), releasing the charge held on their links\n
+		The charge of a cancelled transfer (task of a removed fog node) is released but the task is left untouched
+		Args:
+			step	(int):	Current step of the simulation
+		Returns:
+			int: Number of delivered tasks
+		"""
+		delivered: int = 0
+		while TransferQueue.transfers and TransferQueue.transfers[0][0] <= step:
+			arrival_step, sequence, task, route = heapq.heappop(TransferQueue.transfers)
+			for link in route.links:
+				link.hold_charge(-task.bandwidth_charge)
+			if task.transfer_sequence != sequence:
+				continue
+			task.in_transfer = False
+			task.ready_step = arrival_step
+			delivered += 1
+		return delivered
+
+
+# Routing table precomputed from the neighbours graph
+class RoutingTable():
+
+	@staticmethod
+	def direct_routes(fog: "FogNode") -> list[Route]:	# type: ignore
+		""" Get the one hop routes of a fog node (one per link, in the links order)
+		Args:
+			fog	(FogNode):	Source fog node
+		Returns:
+			list[Route]: List of routes
+		"""
+		return [Route(link.other, [link], link.latence) for link in fog.links]
+
+	@staticmethod
+	def shortest_routes(source: "FogNode", max_hops: int) -> list[Route]:	# type: ignore
+		""" Compute the shortest routes (by latence) from a fog node to every fog node reachable in at most max_hops links\n
+		Uses a hop bounded Bellman-Ford: iteration k only extends the routes found at iteration k-1, so the hop limit is exact
+		Args:
+			source		(FogNode):	Source fog node
+			max_hops	(int):		Maximum number of links in a route
+		Returns:
+			list[Route]: Routes sorted by latence (then by number of hops)
+		"""
+		best: dict["FogNode", tuple[int, list["FogNodesLink"]]] = {source: (0, [])}	# type: ignore
+		frontier: dict["FogNode", tuple[int, list["FogNodesLink"]]] = dict(best)		# type: ignore
+		for _ in range(max_hops):
+			new_frontier: dict = {}
+			for node, (latence, path) in frontier.items():
+				for link in node.links:
+					candidate: int = latence + link.latence
+					known = new_frontier.get(link.other) or best.get(link.other)
+					if known is None or candidate < known[0]:
+						new_frontier[link.other] = (candidate, path + [link])
+			best.update(new_frontier)
+			frontier = new_frontier
+			if not frontier:
+				break
+
+		# Convert to routes
+		routes: list[Route] = [Route(node, path, latence) for node, (latence, path) in best.items() if node is not source]
+		routes.sort(key = lambda route: (route.latence, len(route.links)))
+		return routes
+
+	@staticmethod
+	def build(fogs: set["FogNode"], max_hops: int = MAX_OFFLOAD_HOPS) -> None:	# type: ignore
+		""" Build the routing table of every fog node (stored in the "routes" attribute of each fog node, reversed in "routed_by")\n
+		The method should be called after the neighbours of all fog nodes are set
+		Args:
+			fogs		(set[FogNode]):	Set of fog nodes
+			max_hops	(int):			Maximum number of links in a route (1 means only direct neighbours)
+		"""
+		for fog in fogs:
+			for route in fog.routes:
+				route.destination.routed_by.discard(fog)
+			if max_hops <= 1:
+				fog.routes = RoutingTable.direct_routes(fog)
+			else:
+				fog.routes = RoutingTable.shortest_routes(fog, max_hops)
+			for route in fog.routes:
+				route.destination.routed_by.add(fog)
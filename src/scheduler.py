@@ -0,0 +1,138 @@
+
+# Imports
+from src.task import Task, TaskStates
+from src.utils import AssignMode
+from src.budget import StepBudget
+from config import *
+import heapq
+
+# Scheduling policies
+SCHEDULERS: tuple[str,str,str] = ("fifo", "edf", "edf_cost")
+
+# Scheduler of the tasks offered to a fog node
+class FogScheduler():
+	""" Per fog node priority queue of the tasks offered during a step\n
+	With the "fifo" policy the tasks are offered directly in their arrival order (no queue, no admission control).
+	Otherwise the offers are queued and drained by priority at the end of the vehicles routine:
+	- "edf": earliest deadline first
+	- "edf_cost": least slack per unit of cost first (expensive tasks with the same slack go first)\n
+	Before being offered, a task that cannot meet its deadline anymore is rejected (admission control)
+	"""
+	policy: str = SCHEDULER
+
+	# Deadline statistics of the simulation
+	deadline_misses: int = 0		# Tasks completed after their deadline, rejected by the admission control or failed before completion
+	rejected_tasks: int = 0			# Tasks rejected by the admission control
+	slack_sum: float = 0.0			# Sum of the slack of the completed tasks (negative when completed late)
+	completed_with_deadline: int = 0
+
+	def __init__(self, fog: "FogNode") -> None:	# type: ignore
+		""" FogScheduler constructor
+		Args:
+			fog	(FogNode):	Fog node receiving the offers
+		"""
+		self.fog: "FogNode" = fog	# type: ignore
+		self.queue: list[tuple] = []
+		self.arrivals: int = 0		# Arrival counter, used to break ties in the arrival order
+
+	@staticmethod
+	def is_enabled() -> bool:
+		""" Returns True if the offers are queued (any policy other than "fifo") """
+		if FogScheduler.policy not in SCHEDULERS:
+			raise ValueError(f"Unknown scheduler '{FogScheduler.policy}', expected one of {SCHEDULERS}")
+		return FogScheduler.policy != "fifo"
+
+	@staticmethod
+	def priority(task: Task) -> float:
+		""" Priority of a task in the queue (lowest first)
+		Args:
+			task	(Task):	Task to prioritize
+		Returns:
+			float: Priority of the task
+		"""
+		if task.time_constraint is None:
+			return float("inf")
+		if FogScheduler.policy == "edf_cost":
+			return task.get_slack() / max(task.cost, 1)
+		return task.time_constraint
+
+	def submit(self, task: Task) -> None:
+		""" Queue a task offered to the fog node
+		Args:
+			task	(Task):	Pending task of a vehicle
+		"""
+		heapq.heappush(self.queue, (FogScheduler.priority(task), self.arrivals, task))
+		self.arrivals += 1
+
+	def drain(self, mode: AssignMode) -> None:
+		""" Offer the queued tasks to the fog node by priority, rejecting the ones that cannot meet their deadline
+		(the remaining tasks are deferred to the next step when the step budget is spent, see StepBudget)
+		Args:
+			mode	(AssignMode):	Configuration of how the tasks are assigned
+		"""
+		while self.queue:
+			if StepBudget.exhausted():
+				StepBudget.defer(len(self.queue))
+				self.queue = []
+				break
+			_, _, task = heapq.heappop(self.queue)
+			StepBudget.count_offer()
+			if not FogScheduler.admissible(task):
+				FogScheduler.rejected_tasks += 1
+				FogScheduler.deadline_misses += 1
+				task.vehicle.reject_task(task)
+			elif task.vehicle.offer_task(task, self.fog, mode):
+				task.mark_assigned()
+		self.arrivals = 0
+
+	@staticmethod
+	def admissible(task: Task) -> bool:
+		""" Admission control: check if the task can still be completed before its deadline if it starts now
+		Args:
+			task	(Task):	Task to check
+		Returns:
+			bool: True if the task has no deadline or can meet it
+		"""
+		slack: int|None = task.get_slack()
+		return slack is None or slack >= 0
+
+	@staticmethod
+	def drain_all(fogs: list["FogNode"], mode: AssignMode) -> None:	# type: ignore
+		""" Drain the queues of the fog nodes (in the order of their IDs so that the results do not depend on the set iteration order)
+		Args:
+			fogs	(list[FogNode]):	Fog nodes to drain
+			mode	(AssignMode):		Configuration of how the tasks are assigned
+		"""
+		for fog in sorted(fogs, key = lambda fog: fog.id):
+			fog.scheduler.drain(mode)
+
+	@staticmethod
+	def record_failures(tasks: list[Task]) -> None:
+		""" Count the tasks with a deadline that failed before completion as deadline misses
+		(e.g. still pending when their vehicle left, or on a removed fog node)
+		Args:
+			tasks	(list[Task]):	Failed tasks
+		"""
+		FogScheduler.deadline_misses += sum(1 for task in tasks if task.time_constraint is not None)
+
+	@staticmethod
+	def record_completion(task: Task) -> None:
+		""" Record the slack of a completed task (called when the vehicle receives the result)
+		Args:
+			task	(Task):	Completed task (its remaining resolving time is 0, so its slack is the deadline minus the current step)
+		"""
+		if task.time_constraint is None:
+			return
+		slack: int = task.time_constraint - Task.current_step
+		FogScheduler.slack_sum += slack
+		FogScheduler.completed_with_deadline += 1
+		if slack < 0:
+			FogScheduler.deadline_misses += 1
+
+	@staticmethod
+	def get_mean_slack() -> float:
+		""" Mean slack of the tasks completed so far (0 if none) """
+		if FogScheduler.completed_with_deadline == 0:
+			return 0.0
+		return FogScheduler.slack_sum / FogScheduler.completed_with_deadline
+
@@ -0,0 +1,589 @@
+
+# Imports
+from __future__ import annotations
+from src.fog import FogNode, FogNodesLink
+from src.scheduler import FogScheduler
+from src.latency import LatencyTracker
+from src.cloud import CloudNode
+from src.forecast import DemandForecaster
+from src.handover import TaskHandover
+from src.execution import ExecutionModel
+from src.budget import StepBudget
+from src.task import Task, TaskStates
+from src.vehicle import Vehicle
+from src.resources import Resource
+from src.evaluations import Evaluator
+from src.mobility import MobilitySource, SumoMobility, set_mobility, get_mobility
+from src.metrics import MetricsExporter
+from src.main import EVALUATION_LABELS, make_evaluations_dict, sumo_command, setup_fog_nodes
+from src.utils import *
+from src.print import *
+from config import *
+from typing import Callable
+from multiprocessing import Process, Queue
+import numpy as np
+import random
+import math
+import time
+import os
+
+# Features of run_simulation that the shards do not run: (check if the feature is enabled, warning)
+UNSUPPORTED_FEATURES: list[tuple[Callable[[AssignMode], bool], str]] = [
+	(lambda mode: ExecutionModel.model != "unit", "Execution model '{ExecutionModel.model}' is not supported by the sharded mode, every task progresses by 1 per step"),
+	(lambda mode: StepBudget.is_enabled(), "The step budget is not supported by the sharded mode, every pending task is offered at each step"),
+	(lambda mode: TaskHandover.is_enabled(), "The task handover is not supported by the sharded mode, the tasks stay on their fog node"),
+	(lambda mode: DemandForecaster.is_enabled(), "The demand forecasting is not supported by the sharded mode, no task is moved ahead of a saturation"),
+	(lambda mode: CloudNode.is_enabled(), "The cloud tier is not supported by the sharded mode, the tasks rejected by the fog layer stay pending"),
+	(lambda mode: bool(TOPOLOGY_EVENTS), "The topology events are not supported by the sharded mode, the fog nodes stay the same"),
+	(lambda mode: ALGORITHM_INTERVAL > 1, "The step coarsening is not supported by the sharded mode, the fog algorithm runs every step"),
+	(lambda mode: mode.k_nearest, "The k-nearest placement is not supported by the sharded mode, the tasks are offered to their nearest fog node"),
+	(lambda mode: FogScheduler.is_enabled(), "Scheduler '{FogScheduler.policy}' is not supported by the sharded mode, the tasks are offered in their arrival order"),
+]
+
+# Evaluations the shards do not compute (left out of the sharded evaluations instead of plotting constants)
+UNSUPPORTED_EVALUATIONS: tuple[str, ...] = (
+	"migrations", "fog_tasks", "cloud_tasks", "cloud_cost", "cloud_offloads", "forecast_migrations",
+	"handovers", "execution_rate", "fast_rejections", "budget_overruns", "deferred_tasks",
+)
+SHARDED_EVALUATION_LABELS: dict[str, str] = {label: key for label, key in EVALUATION_LABELS.items() if key not in UNSUPPORTED_EVALUATIONS}
+
+def warn_unsupported_features(assign_mode: AssignMode) -> None:
+	""" Warn about every enabled feature that the sharded mode does not run (see UNSUPPORTED_FEATURES)
+	Args:
+		assign_mode	(AssignMode):	Assign mode of the simulation
+	"""
+	for is_enabled, message in UNSUPPORTED_FEATURES:
+		if is_enabled(assign_mode):
+			warning(message.format(ExecutionModel = ExecutionModel, FogScheduler = FogScheduler))
+
+
+# Spatial partitioning of the fog nodes
+def split_regions(fogs: list[FogNode], nb_shards: int) -> list[list[FogNode]]:
+	""" Split the fog nodes into spatial regions using a recursive coordinate bisection (along the widest axis)
+	Args:
+		fogs		(list[FogNode]):	Fog nodes to split
+		nb_shards	(int):				Number of regions wanted
+	Returns:
+		list[list[FogNode]]: Non empty regions, sorted by fog ID inside each region
+	"""
+	if nb_shards <= 1 or len(fogs) <= 1:
+		return [sorted(fogs, key = lambda fog: fog.id)] if fogs else []
+
+	# Split along the widest axis, proportionally to the number of shards on each side
+	xs: list[float] = [fog.position[0] for fog in fogs]
+	ys: list[float] = [fog.position[1] for fog in fogs]
+	axis: int = 0 if (max(xs) - min(xs)) >= (max(ys) - min(ys)) else 1
+	ordered: list[FogNode] = sorted(fogs, key = lambda fog: (fog.position[axis], fog.id))
+	left_shards: int = nb_shards // 2
+	cut: int = round(len(ordered) * left_shards / nb_shards)
+	return split_regions(ordered[:cut], left_shards) + split_regions(ordered[cut:], nb_shards - left_shards)
+
+
+def fog_spec(fog: FogNode) -> tuple:
+	""" Picklable description of a fog node (ID, position, resources, links) sent to the shard owning it
+	Args:
+		fog	(FogNode):	Fog node to describe
+	Returns:
+		tuple: (id, position, (cpu, ram, storage), [(other_id, latence, bandwidth), ...])
+	"""
+	resources: tuple = (fog.resources.cpu, fog.resources.ram, fog.resources.storage)
+	links: list[tuple] = [(link.other.id, link.latence, link.bandwidth) for link in fog.links]
+	return (fog.id, fog.position, resources, links)
+
+
+def task_payload(task: Task) -> tuple:
+	""" Picklable description of a task sent between the coordinator and the shards
+	Args:
+		task	(Task):	Task to describe
+	Returns:
+		tuple: (task_id, vehicle_id, vehicle_position, (cpu, ram, storage), resolving_time, cost, bandwidth_charge)
+	"""
+	resource: tuple = (task.resource.cpu, task.resource.ram, task.resource.storage)
+	return (task.id, task.vehicle.vehicle_id, task.vehicle.position, resource, task.resolving_time, task.cost, task.bandwidth_charge)
+
+
+# Fog node owned by another shard
+class RemoteFogNode():
+	def __init__(self, id: str, position: tuple[float,float]) -> None:
+		""" RemoteFogNode constructor (only used as the other end of a link)
+		Args:
+			id			(str):		ID of the fog node
+			position	(tuple):	Position of the fog node
+		"""
+		self.id: str = id
+		self.position: tuple[float,float] = position
+
+
+# Vehicle owned by the coordinator, seen from a shard
+class ShardVehicle():
+	def __init__(self, vehicle_id: str, position: tuple[float,float], shard: Shard) -> None:
+		""" ShardVehicle constructor
+		Args:
+			vehicle_id	(str):		ID of the vehicle
+			position	(tuple):	Position of the vehicle when the task was offered
+			shard		(Shard):	Shard collecting the completed tasks
+		"""
+		self.vehicle_id: str = vehicle_id
+		self.position: tuple[float,float] = position
+		self.shard: Shard = shard
+
+	def get_distance_to_fog(self, fog: FogNode) -> float:
+		return math.dist(self.position, fog.position)
+
+	def receive_task_result(self, task: Task) -> None:
+		""" Report the completed task to the coordinator at the next barrier """
+		self.shard.completed_tasks.append(task.id)
+
+
+# Worker side of the sharded simulation
+class Shard():
+	def __init__(self, index: int, specs: list[tuple], fog_positions: dict[str, tuple[float,float]], assign_mode: AssignMode) -> None:
+		""" Shard constructor, rebuild the fog nodes of the region and their links
+		Args:
+			index			(int):			Index of the shard
+			specs			(list[tuple]):	Description of the fog nodes owned by the shard (see fog_spec)
+			fog_positions	(dict):			Position of every fog node (by ID), used for the remote ends of the links
+			assign_mode		(AssignMode):	Configuration of how the tasks are assigned
+		"""
+		set_mobility(MobilitySource())		# Headless: nothing is drawn from a shard
+		self.index: int = index
+		self.assign_mode: AssignMode = assign_mode
+		self.fog_ids: list[str] = sorted(fog_positions)
+		self.usages: dict[str, float] = {fog_id: 0.0 for fog_id in self.fog_ids}
+		self.completed_tasks: list[str] = []
+		self.moving_tasks: dict[str, Task] = {}		# Tasks with a pending move request, by ID
+		self.reserved_charges: dict[tuple[str,str], int] = {}	# Link charges reserved by the requests, by (origin fog ID, task ID)
+
+		# Fog nodes of the region
+		self.fogs: dict[str, FogNode] = {}
+		for fog_id, position, resources, _ in specs:
+			self.fogs[fog_id] = FogNode(fog_id, position, FOG_SHAPE, FOG_COLOR, Resource(*resources))
+		for fog_id, _, _, links in specs:
+			fog: FogNode = self.fogs[fog_id]
+			for other_id, latence, bandwidth in links:
+				other = self.fogs.get(other_id) or RemoteFogNode(other_id, fog_positions[other_id])
+				fog.links.append(FogNodesLink(other, latence, bandwidth, owner = fog))
+
+	def make_task(self, payload: tuple) -> Task:
+		""" Create a task from its payload (see task_payload) """
+		task_id, vehicle_id, position, resource, resolving_time, cost, bandwidth_charge = payload
+		task = Task(task_id, vehicle = ShardVehicle(vehicle_id, position, self), resource = Resource(*resource), resolving_time = resolving_time, cost = cost)
+		task.bandwidth_charge = bandwidth_charge
+		return task
+
+	@staticmethod
+	def forget(task: Task) -> None:
+		""" Remove a task from the tasks of the shard (offer rejected or task moved to another fog node) """
+		if task in Task.all_tasks[task.state]:
+			Task.all_tasks[task.state].remove(task)
+
+	def accept(self, fog: FogNode, task: Task) -> bool:
+		""" Accept the task on the fog node if it has enough resources (and if the QoS is not worse in QoS mode)\n
+		The QoS only uses the live state of the fog node and the usage of the other fog nodes at the last barrier,
+		so that the decision does not depend on which fog nodes share the same shard
+		Args:
+			fog		(FogNode):	Fog node receiving the task
+			task	(Task):		Task to assign
+		Returns:
+			bool: True if the task was assigned
+		"""
+		if not fog.has_enough_resources(task):
+			return False
+		if not self.assign_mode.qos:
+			fog.assign_task(task)
+			return True
+
+		# Compare the QoS terms that change with the assignment
+		usages: list[float] = [fog.get_usage() if fog_id == fog.id else self.usages[fog_id] for fog_id in self.fog_ids]
+		loads: list[float] = [fog.get_links_load() if fog_id == fog.id else 0.0 for fog_id in self.fog_ids]
+		old_qos: float = Evaluator.combine_qos(0, np.var(usages), np.var(loads), 0.0)
+		old_state: TaskStates = fog.assign_task(task)
+		usages[self.fog_ids.index(fog.id)] = fog.get_usage()
+		new_qos: float = Evaluator.combine_qos(1, np.var(usages), np.var(loads), math.sqrt(task.distance_to_vehicle * task.cost))
+		if new_qos >= old_qos:
+			return True
+		fog.revert_assign(task, old_state, tentative = True)
+		fog.remove_task_distance(task.distance_to_vehicle * task.cost)
+		return False
+
+	def forward_request(self, fog: FogNode, task: Task, attempt: int) -> tuple|None:
+		""" Prepare a request to a neighbour when the fog node cannot accept the task itself\n
+		The neighbour is chosen in rotation with the number of attempts of the task, and the link charge is reserved until the commit
+		Args:
+			fog		(FogNode):	Fog node that rejected the task
+			task	(Task):		Rejected task
+			attempt	(int):		Number of times the task was already offered
+		Returns:
+			tuple|None: (kind, origin_id, link_index, target_id, payload) or None if nothing can be forwarded
+		"""
+		if not fog.links:
+			return None
+		link_index: int = attempt % len(fog.links)
+		link: FogNodesLink = fog.links[link_index]
+
+		# Cost mode: move the cheapest replaceable task to free resources for the next offer
+		if self.assign_mode.cost:
+			candidates: list[Task] = [x for x in fog.get_replaceable_tasks(task) if x.id not in self.moving_tasks]
+			if not candidates or not link.can_handle_charge(candidates[0].bandwidth_charge):
+				return None
+			moved: Task = candidates[0]
+			self.moving_tasks[moved.id] = moved
+			self.reserved_charges[(fog.id, moved.id)] = moved.bandwidth_charge
+			link.add_charge(moved.bandwidth_charge)
+			return ("move", fog.id, link_index, link.other.id, task_payload(moved))
+
+		# Neighbours mode: offer the task itself
+		if self.assign_mode.neighbours and link.can_handle_charge(task.bandwidth_charge):
+			self.reserved_charges[(fog.id, task.id)] = task.bandwidth_charge
+			link.add_charge(task.bandwidth_charge)
+			return ("offer", fog.id, link_index, link.other.id, task_payload(task))
+		return None
+
+	def assign(self, offers: list[tuple[str, tuple, int]], usages: dict[str, float]) -> tuple[list[str], list[tuple]]:
+		""" Phase 1: start a new links epoch and offer the pending tasks to their nearest fog node
+		Args:
+			offers	(list):	List of (fog_id, payload, attempt) sorted by fog then by vehicle
+			usages	(dict):	Usage of every fog node at the last barrier
+		Returns:
+			tuple: (IDs of the assigned tasks, requests for other fog nodes)
+		"""
+		FogNodesLink.new_epoch()
+		self.usages = usages
+		assigned: list[str] = []
+		requests: list[tuple] = []
+		for fog_id, payload, attempt in offers:
+			fog: FogNode = self.fogs[fog_id]
+			task: Task = self.make_task(payload)
+			if self.accept(fog, task):
+				assigned.append(task.id)
+				continue
+			Shard.forget(task)
+			request = self.forward_request(fog, task, attempt)
+			if request is not None:
+				requests.append(request)
+		return assigned, requests
+
+	def receive(self, requests: list[tuple]) -> list[tuple]:
+		""" Phase 2: handle the requests sent by other fog nodes (in a deterministic order)
+		Args:
+			requests	(list):	Requests targeting the fog nodes of the shard
+		Returns:
+			list[tuple]: (kind, origin_id, link_index, task_id, accepted) for each request
+		"""
+		results: list[tuple] = []
+		for kind, origin_id, link_index, target_id, payload in sorted(requests, key = lambda r: (r[3], r[4][0], r[1])):
+			task: Task = self.make_task(payload)
+			accepted: bool = self.accept(self.fogs[target_id], task)
+			if not accepted:
+				Shard.forget(task)
+			results.append((kind, origin_id, link_index, task.id, accepted))
+		return results
+
+	def commit(self, results: list[tuple]) -> tuple[list[str], list[tuple]]:
+		""" Phase 3: apply the answers to the requests of the shard, then progress the tasks
+		Args:
+			results	(list):	Answers to the requests sent by the fog nodes of the shard
+		Returns:
+			tuple: (IDs of the completed tasks, [(fog_id, usage, links_load, task_distances, used_resources), ...])
+		"""
+		for kind, origin_id, link_index, task_id, accepted in sorted(results, key = lambda r: (r[1], r[3])):
+			fog: FogNode = self.fogs[origin_id]
+			charge: int = self.reserved_charges.pop((origin_id, task_id))
+			if not accepted:
+				fog.links[link_index].add_charge(-charge)	# Release the reserved charge
+			if kind == "move":
+				moved: Task = self.moving_tasks.pop(task_id)
+				if accepted:
+					fog.revert_assign(moved, is_last = False)
+					fog.remove_task_distance(moved.distance_to_vehicle * moved.cost)
+					Shard.forget(moved)
+
+		# Progress the tasks and report the state of the fog nodes
+		self.completed_tasks = []
+		stats: list[tuple] = []
+		for fog_id in sorted(self.fogs):
+			fog: FogNode = self.fogs[fog_id]
+			fog.progress_tasks()
+			used: Resource = fog.get_used_resources()
+			stats.append((fog_id, fog.get_usage(), fog.get_links_load(), fog.task_distances, (used.cpu, used.ram, used.storage)))
+		return self.completed_tasks, stats
+
+
+def shard_worker(index: int, specs: list[tuple], fog_positions: dict[str, tuple[float,float]], assign_mode: AssignMode, inbox: Queue, outbox: Queue) -> None:
+	""" Main loop of a shard process: call the asked phase and send back the result (until "stop" is received)
+	Args:
+		index			(int):			Index of the shard
+		specs			(list[tuple]):	Description of the fog nodes owned by the shard
+		fog_positions	(dict):			Position of every fog node (by ID)
+		assign_mode		(AssignMode):	Configuration of how the tasks are assigned
+		inbox			(Queue):		Queue of the messages from the coordinator
+		outbox			(Queue):		Queue of the answers to the coordinator (shared by all shards)
+	"""
+	shard = Shard(index, specs, fog_positions, assign_mode)
+	while True:
+		phase, *args = inbox.get()
+		if phase == "stop":
+			break
+		outbox.put((index, getattr(shard, phase)(*args)))
+	Logger.flush()	# The exit handlers are not called in the shard processes
+
+
+# Coordinator side of the sharded simulation
+class ShardCoordinator():
+	def __init__(self, fogs: list[FogNode], nb_shards: int, assign_mode: AssignMode) -> None:
+		""" ShardCoordinator constructor, split the fog nodes into regions and start one process per region
+		Args:
+			fogs		(list[FogNode]):	Fog nodes of the simulation
+			nb_shards	(int):				Number of shards wanted (less are used if there are not enough fog nodes)
+			assign_mode	(AssignMode):		Configuration of how the tasks are assigned
+		"""
+		self.fogs: list[FogNode] = sorted(fogs, key = lambda fog: fog.id)
+		self.fog_ids: list[str] = [fog.id for fog in self.fogs]
+		self.fog_positions: np.ndarray = np.array([fog.position for fog in self.fogs])
+		self.regions: list[list[FogNode]] = split_regions(self.fogs, nb_shards)
+		self.shard_of: dict[str, int] = {fog.id: i for i, region in enumerate(self.regions) for fog in region}
+		self.usages: dict[str, float] = {fog_id: 0.0 for fog_id in self.fog_ids}
+		self.stats: list[tuple] = []
+
+		# Start the shards
+		positions: dict[str, tuple[float,float]] = {fog.id: fog.position for fog in self.fogs}
+		self.outbox: Queue = Queue()
+		self.inboxes: list[Queue] = [Queue() for _ in self.regions]
+		self.processes: list[Process] = [
+			Process(target = shard_worker, args = (i, [fog_spec(fog) for fog in region], positions, assign_mode, self.inboxes[i], self.outbox), daemon = True)
+			for i, region in enumerate(self.regions)
+		]
+		for process in self.processes:
+			process.start()
+
+	def barrier(self, phase: str, args_per_shard: list[tuple]) -> list:
+		""" Send a phase to every shard and wait for all the answers (per step barrier)
+		Args:
+			phase			(str):			Name of the Shard method to call
+			args_per_shard	(list[tuple]):	Arguments of the call for each shard
+		Returns:
+			list: Answers of the shards, in the shards order
+		"""
+		for inbox, args in zip(self.inboxes, args_per_shard):
+			inbox.put((phase, *args))
+		answers: list = [None] * len(self.inboxes)
+		for _ in self.inboxes:
+			index, answer = self.outbox.get()
+			answers[index] = answer
+		return answers
+
+	def nearest_fogs(self, positions: list[tuple[float,float]]) -> list[str]:
+		""" Get the ID of the nearest fog node of each position (vectorized) """
+		if not positions:
+			return []
+		distances: np.ndarray = np.linalg.norm(np.asarray(positions)[:, None, :] - self.fog_positions[None, :, :], axis = 2)
+		return [self.fog_ids[i] for i in distances.argmin(axis = 1)]
+
+	def step(self, vehicles: list[Vehicle], in_flight: dict[str, Task]) -> list[Task]:
+		""" Offer the pending tasks of the vehicles to the shards, exchange the requests between fog nodes and progress the tasks
+		Args:
+			vehicles	(list[Vehicle]):	Vehicles of the simulation sorted by ID
+			in_flight	(dict[str,Task]):	Tasks assigned to a fog node, by ID (updated)
+		Returns:
+			list[Task]: Tasks completed during the step
+		"""
+		# Route the pending tasks to the shard of the nearest fog node of their vehicle
+		pending: list[tuple[Vehicle, list[Task]]] = [(vehicle, [task for task in vehicle.tasks if task.state == TaskStates.PENDING]) for vehicle in vehicles]
+		pending = [(vehicle, tasks) for vehicle, tasks in pending if tasks]
+		for vehicle, _ in pending:
+			vehicle.position = vehicle.get_position()
+		nearest: list[str] = self.nearest_fogs([vehicle.position for vehicle, _ in pending])
+		offers: list[list[tuple]] = [[] for _ in self.regions]
+		for (vehicle, tasks), fog_id in zip(pending, nearest):
+			for task in tasks:
+				offers[self.shard_of[fog_id]].append((fog_id, task_payload(task), task.offer_attempts))
+				task.offer_attempts += 1
+		for shard_offers in offers:
+			shard_offers.sort(key = lambda offer: offer[0])	# Stable sort: by fog, then by vehicle
+
+		# Phase 1: offers to the nearest fog nodes
+		answers = self.barrier("assign", [(shard_offers, self.usages) for shard_offers in offers])
+		assigned: list[str] = [task_id for shard_assigned, _ in answers for task_id in shard_assigned]
+		requests: list[list[tuple]] = [[] for _ in self.regions]
+		for _, shard_requests in answers:
+			for request in shard_requests:
+				requests[self.shard_of[request[3]]].append(request)
+
+		# Phase 2: requests between fog nodes (through the message queues)
+		answers = self.barrier("receive", [(shard_requests,) for shard_requests in requests])
+		results: list[list[tuple]] = [[] for _ in self.regions]
+		for shard_results in answers:
+			for result in shard_results:
+				results[self.shard_of[result[1]]].append(result)
+				if result[0] == "offer" and result[4]:
+					assigned.append(result[3])
+
+		# Mark the assigned tasks
+		tasks_by_id: dict[str, Task] = {task.id: task for _, tasks in pending for task in tasks}
+		for task_id in assigned:
+			task: Task = tasks_by_id[task_id]
+			task.mark_assigned()
+			in_flight[task_id] = task
+		for vehicle, tasks in pending:
+			color: tuple = (0, 255, 0) if all(task.state != TaskStates.PENDING for task in tasks) else (0, 0, 255)
+			get_mobility().set_vehicle_color(vehicle.vehicle_id, color)
+
+		# Phase 3: commit the requests and progress the tasks
+		answers = self.barrier("commit", [(shard_results,) for shard_results in results])
+		completed: list[Task] = [in_flight.pop(task_id) for shard_completed, _ in answers for task_id in sorted(shard_completed)]
+		self.stats = sorted(stats for _, shard_stats in answers for stats in shard_stats)
+		self.usages = {fog_id: usage for fog_id, usage, _, _, _ in self.stats}
+		return completed
+
+	def get_eval_parameters(self) -> dict[str, float]:
+		""" Merge the evaluations of the shards (same keys as Evaluator.get_eval_parameters, except UNSUPPORTED_EVALUATIONS)
+		Returns:
+			dict[str,float]: Evaluation parameters of the whole network
+		"""
+		evals: dict[str, float] = {
+			"allocated_tasks": Task.count(TaskStates.IN_PROGRESS),
+			"nodes_usage": np.var([stats[1] for stats in self.stats]),
+			"links_load": np.var([stats[2] for stats in self.stats]),
+			"tasks_distance_cost": sum(stats[3] for stats in self.stats),
+
+			"completed_tasks": Task.count(TaskStates.COMPLETED),
+			"pending_tasks": Task.count(TaskStates.PENDING),
+			"failed_tasks": Task.count(TaskStates.FAILED),
+			"total_tasks": sum(Task.count(state) for state in TaskStates),
+
+			"deadline_misses": FogScheduler.deadline_misses,
+			"rejected_tasks": FogScheduler.rejected_tasks,
+			"mean_slack": FogScheduler.get_mean_slack(),
+
+			**{key: value for key, value in LatencyTracker.get_eval_parameters().items() if key not in UNSUPPORTED_EVALUATIONS},
+		}
+		evals["qos"] = Evaluator.combine_qos(evals["allocated_tasks"], evals["nodes_usage"], evals["links_load"], evals["tasks_distance_cost"])
+		return evals
+
+	def color_usage(self) -> None:
+		""" Color the fog nodes of the coordinator with the used resources reported by the shards """
+		for fog, (_, _, _, _, used) in zip(self.fogs, self.stats):
+			fog.used_resources = Resource(*used)
+		FogNode.color_usage(self.fogs)
+
+	def close(self) -> None:
+		""" Stop the shards """
+		for inbox in self.inboxes:
+			inbox.put(("stop",))
+		for process in self.processes:
+			process.join()
+
+
+def run_sharded_simulation(
+		simulation_name: str,
+		assign_mode: AssignMode,
+		nb_shards: int,
+		sumo_config: str,
+		visual_center: tuple[int,int],
+		folder: str,
+		seed: int = 0,
+		debug_perf: bool = False,
+		auto_start: bool = True,
+		auto_quit: bool = True,
+		open_gui: bool = True,
+		fog_resources: tuple[int,int,int] = Resource.HIGH_RANDOM_RESOURCE_ARGS,
+		mobility: MobilitySource|None = None,
+		on_step: Callable[[int, dict[str,float], float], None]|None = None,
+		max_steps: int|None = None,
+	) -> dict:
+	""" Run a simulation where the fog nodes are split into spatial regions, each one run by a worker process (shard)\n
+	The coordinator (this process) owns the traffic and the vehicles: each step, pending tasks are routed to the shard of the
+	nearest fog node of their vehicle. A fog node that cannot accept a task sends a request to one neighbour (rotating with the
+	attempts of the task) through the message queues, the answers are applied after a barrier. Every decision only depends on
+	the fog node receiving it and on the usages of the last barrier, so results are the same for any number of shards.
+	They differ from the results of run_simulation (which applies each decision at once and supports every feature of config.py),
+	so a sharded run is a different experiment than a run_simulation one with the same assign mode (see simulation_path in run_reims.py).\n
+	Args:
+		simulation_name	(str):				Name of the simulation (used for the output files)
+		assign_mode		(AssignMode):		Assign mode to use for the simulation steps
+		nb_shards		(int):				Number of worker processes
+		sumo_config		(str):				Sumo configuration file to use
+		visual_center	(tuple):			Center of the map visually (used to place randomly fog nodes around)
+		folder			(str):				Not used, but kept in the return dict for identification
+		seed			(int):				Seed to use for the simulation (default: 0)
+		debug_perf		(bool):				Whether to debug the performance of the simulation (default: False)
+		auto_start		(bool):				Whether to start the simulation automatically (default: True)	(adding '--start')
+		auto_quit		(bool):				Whether to quit the simulation automatically (default: True)	(adding '--quit-on-end')
+		open_gui		(bool):				Whether to run traci command "sumo-gui" or "sumo" (default: True)
+		fog_resources	(tuple):			Resources to use for the fog nodes (default: Resource.HIGH_RANDOM_RESOURCE_ARGS)
+		mobility		(MobilitySource):	Source of the vehicles positions, SUMO is started with the given parameters if None (default: None)
+		on_step			(Callable):			Called after each step with (step, usage of each fog node by ID, QoS), used to compare engines (default: None)
+		max_steps		(int):				Stop after this number of steps even if vehicles remain (partial runs of the tuner), None to run until the end (default: None)
+	Returns:
+		dict: Dictionnary of evaluations over time (same as run_simulation)
+	"""
+	# Start sumo (if no other mobility source is given)
+	random.seed(seed)
+	Vehicle.rng_seed = seed
+	simplified_name: str = simulation_name.split("/")[-1]
+	if mobility is None:
+		mobility = SumoMobility(sumo_command(sumo_config, seed, auto_start, auto_quit, open_gui), label = simplified_name)
+	set_mobility(mobility)
+
+	# Write the log records of the simulation if asked (the shards write to the console only)
+	if LOG_JSON:
+		os.makedirs(simulation_name, exist_ok = True)
+		Logger.open_json(f"{simulation_name}/log.jsonl")
+
+	# Fog nodes and shards
+	fog_list: set[FogNode] = setup_fog_nodes(mobility, visual_center, fog_resources, seed).fogs
+	coordinator = ShardCoordinator(list(fog_list), nb_shards, assign_mode)
+	warn_unsupported_features(assign_mode)
+	info(f"Sharded simulation '{simplified_name}' with {len(coordinator.regions)} shards: {[len(region) for region in coordinator.regions]} fog nodes")
+
+	# Evaluations
+	qos_history: list[float] = []
+	histories: dict[str, list[float]] = {label: [] for label in SHARDED_EVALUATION_LABELS}
+	exporter: MetricsExporter|None = None
+	if METRICS_EXPORT or METRICS_PORT is not None:
+		os.makedirs(simulation_name, exist_ok = True)
+		exporter = MetricsExporter(simulation_name, path = f"{simulation_name}/metrics.prom" if METRICS_EXPORT else None)
+
+	# While there are vehicles in the simulation
+	in_flight: dict[str, Task] = {}
+	step: int = 0
+	while mobility.has_vehicles() and (max_steps is None or step < max_steps):
+		mobility.step()
+		start_time: float = time.perf_counter()
+		Task.current_step = step
+
+		# Vehicles routine (in the order of their IDs so that the offers do not depend on the execution)
+		Vehicle.acknowledge_removed_vehicles()
+		Vehicle.acknowledge_new_vehicles()
+		vehicles: list[Vehicle] = sorted(Vehicle.vehicles, key = lambda vehicle: vehicle.vehicle_id)
+		Vehicle.generate_tasks_batch([vehicle for vehicle in vehicles if vehicle.not_finished_tasks == 0])
+
+		# Shards step and completed tasks
+		for task in coordinator.step(vehicles, in_flight):
+			task.vehicle.receive_task_result(task)
+		if open_gui:
+			coordinator.color_usage()
+		if debug_perf:
+			debug("Time taken for step #%d: %.5fs", step, time.perf_counter() - start_time)
+
+		# Evaluate the network
+		evals: dict[str, float] = coordinator.get_eval_parameters()
+		qos_history.append(evals["qos"])
+		for label, key in SHARDED_EVALUATION_LABELS.items():
+			histories[label].append(evals[key])
+		if exporter is not None:
+			exporter.publish(step, time.perf_counter() - start_time, len(vehicles), evals, evals["qos"])
+		if on_step is not None:
+			on_step(step, dict(coordinator.usages), evals["qos"])
+		step += 1
+
+	# Close the simulation
+	coordinator.close()
+	mobility.close()
+	if exporter is not None:
+		exporter.close()
+	info("Simulation closed")
+	Logger.close_json()
+	os.makedirs(simulation_name, exist_ok = True)
+	LatencyTracker.save(f"{simulation_name}/latency_histograms.json")
+	return make_evaluations_dict(folder, simulation_name, qos_history, histories)
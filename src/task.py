@@ -2,9 +2,11 @@
 # Imports
 from src.resources import Resource
 from src.utils import random_step
+from src.latency import LatencyTracker
 from config import *
 from enum import Enum
-import time
+import json
+import io
 
 class TaskStates(Enum):
 	PENDING = 0
@@ -23,6 +25,15 @@ class Task():
 		TaskStates.FAILED: []
 	}
 
+	# Retention policy: finished tasks are folded into counters (and optionally streamed) instead of being kept in memory
+	FINISHED_STATES: tuple[TaskStates,TaskStates] = (TaskStates.COMPLETED, TaskStates.FAILED)
+	retain_finished: bool = RETAIN_FINISHED_TASKS
+	finished_counts: dict[TaskStates, int] = {TaskStates.COMPLETED: 0, TaskStates.FAILED: 0}
+	records_stream: io.TextIOWrapper|None = None
+
+	# Current step of the simulation (set by the simulation loop, used by the deadlines)
+	current_step: int = 0
+
 	def __init__(self, task_id: str, vehicle: "Vehicle", resource: Resource, resolving_time: int = 0, cost: int = 1, time_constraint: int|None = None) -> None:	# type: ignore
 		""" Task constructor
 		Args:
@@ -31,26 +42,44 @@ class Task():
 			resource		(Resource):	Resource needed for the task
 			resolving_time	(int):		Time needed to complete the task (in seconds)
 			cost			(int):		Cost of the task (in euros)
-			time_constraint	(int):		Timestamp when the task must be completed
+			time_constraint	(int):		Last simulation step at which the task can be completed (None if no deadline)
 		"""
 		self.id: str = task_id
 		self.vehicle: "Vehicle" = vehicle	# type: ignore
 		self.resource: Resource = resource
 		self.resolving_time: int = resolving_time
+		self.initial_resolving_time: int = resolving_time	# Used to restart the task when its fog node is removed
 		self.cost: int = cost
-		self.time_constraint: int = time_constraint
+		self.time_constraint: int|None = time_constraint
+		self.created_step: int = Task.current_step
+		self.assigned_step: int|None = None			# Step of the first assignment to a fog node
+		self.completed_step: int|None = None		# Step of the reception of the result by the vehicle
+		self.last_migration_step: int|None = None	# Step of the last move to another fog node (cost mode)
+		self.migrations: int = 0
 		self.state: TaskStates = TaskStates.PENDING
 		Task.all_tasks[self.state].append(self)
 		self.distance_to_vehicle: float = 0.0
+		self.in_transfer: bool = False		# True while the task is transferred to another fog node (it does not progress)
+		self.ready_step: int = 0			# Step from which the task can progress on its fog node (arrival step of its last transfer)
+		self.transfer_sequence: int = -1	# Sequence number of the last transfer of the task (see TransferQueue)
+		self.offer_attempts: int = 0	# Number of times the task was offered to a fog node (used by the sharded mode to rotate neighbours)
 
 		# Bandwidth charge needed to transfer the task from a node to another one
 		self.bandwidth_charge: int = int(K_BANDWIDTH_CHARGE * self.resolving_time)
 	
 	def __str__(self) -> str:
-		limit_date: str = "None"
-		if self.time_constraint is not None:
-			limit_date = time.strftime("%H:%M:%S", time.localtime(self.time_constraint))
-		return f"{self.state.name} Task '{self.id}' with: Resource = {self.resource}, Resolving Time = {self.resolving_time}s, Cost = {self.cost}€, Time Constraint = [{limit_date}]"
+		limit_step: str = "None" if self.time_constraint is None else f"step {self.time_constraint}"
+		return f"{self.state.name} Task '{self.id}' with: Resource = {self.resource}, Resolving Time = {self.resolving_time}s, Cost = {self.cost}€, Time Constraint = [{limit_step}]"
+	
+	def get_slack(self) -> int|None:
+		""" Get the slack of the task: number of steps it can still wait before it cannot meet its deadline anymore\n
+		(a task assigned at step s with a resolving time r is completed at step s + r - 1)
+		Returns:
+			int|None: Slack of the task (negative if the deadline cannot be met), None if the task has no deadline
+		"""
+		if self.time_constraint is None:
+			return None
+		return self.time_constraint - (Task.current_step + self.resolving_time - 1)
 	
 	def change_state(self, new_state: TaskStates) -> None:
 		""" Change the state of the task (removes it from the current state and adds it to the new state)
@@ -59,6 +88,18 @@ class Task():
 		"""
 		if self.state == new_state:	# stop if no changes
 			return
+		if new_state == TaskStates.COMPLETED:	# The result reaches the vehicle at the same step, known before the record is written
+			self.completed_step = Task.current_step
+
+		# If the task is finished and not retained, fold it into the counters instead of keeping it
+		if new_state in Task.FINISHED_STATES and not Task.retain_finished:
+			if self in Task.all_tasks[self.state]:
+				Task.all_tasks[self.state].remove(self)
+			self.state = new_state
+			Task.finished_counts[new_state] += 1
+			if Task.records_stream is not None:
+				self.write_record(Task.records_stream)
+			return
 
 		# If the task is in the current state list, move it to the new state list
 		if self in Task.all_tasks[self.state]:
@@ -72,6 +113,95 @@ class Task():
 		# Change the state to the new one
 		self.state = new_state
 	
+	@staticmethod
+	def change_states(tasks: list["Task"], new_state: TaskStates) -> None:
+		""" Change the state of multiple tasks at once (each state list is rebuilt once instead of once per task)
+		Args:
+			tasks		(list[Task]):	Tasks to change
+			new_state	(TaskStates):	New state for the tasks
+		"""
+		moving: list[Task] = [task for task in tasks if task.state != new_state]
+		if not moving:
+			return
+		moving_ids: set[int] = {id(task) for task in moving}
+		for state in {task.state for task in moving}:
+			Task.all_tasks[state] = [task for task in Task.all_tasks[state] if id(task) not in moving_ids]
+
+		# Finished tasks are folded into the counters if not retained
+		folded: bool = new_state in Task.FINISHED_STATES and not Task.retain_finished
+		for task in moving:
+			task.state = new_state
+			if new_state == TaskStates.COMPLETED:
+				task.completed_step = Task.current_step
+			if folded:
+				Task.finished_counts[new_state] += 1
+				if Task.records_stream is not None:
+					task.write_record(Task.records_stream)
+		if not folded:
+			Task.all_tasks[new_state].extend(moving)
+
+	def mark_assigned(self) -> None:
+		""" Change the state of a task accepted by a fog node to IN_PROGRESS and record its waiting time (first assignment only) """
+		self.change_state(TaskStates.IN_PROGRESS)
+		if self.assigned_step is None:
+			self.assigned_step = Task.current_step
+			LatencyTracker.wait.add(self.assigned_step - self.created_step)
+
+	def mark_migrated(self) -> None:
+		""" Record the move of the task to another fog node """
+		self.migrations += 1
+		self.last_migration_step = Task.current_step
+		LatencyTracker.migrations += 1
+
+	def mark_completed(self) -> None:
+		""" Record the completion time of the task (when its result is received by the vehicle) """
+		self.completed_step = Task.current_step
+		LatencyTracker.completion.add(self.completed_step - self.created_step)
+
+	def write_record(self, stream: io.TextIOWrapper) -> None:
+		""" Write a JSON line describing the task to the given stream
+		Args:
+			stream	(io.TextIOWrapper):	Stream to write the record to
+		"""
+		stream.write(json.dumps({
+			"id": self.id,
+			"state": self.state.name,
+			"cost": self.cost,
+			"resource": [self.resource.cpu, self.resource.ram, self.resource.storage],
+			"distance_to_vehicle": self.distance_to_vehicle,
+			"created_step": self.created_step,
+			"deadline": self.time_constraint,
+			"assigned_step": self.assigned_step,
+			"completed_step": self.completed_step,
+			"migrations": self.migrations,
+		}) + "\n")
+
+	@staticmethod
+	def count(state: TaskStates) -> int:
+		""" Count the tasks in the given state, including the finished tasks folded by the retention policy
+		Args:
+			state	(TaskStates):	State to count
+		Returns:
+			int: Number of tasks in the state
+		"""
+		return len(Task.all_tasks[state]) + Task.finished_counts.get(state, 0)
+
+	@staticmethod
+	def open_records_stream(path: str) -> None:
+		""" Stream a record of every finished task to a JSON lines file (only used when finished tasks are not retained)
+		Args:
+			path	(str):	Path of the JSON lines file
+		"""
+		Task.close_records_stream()
+		Task.records_stream = open(path, "w", encoding = "utf-8")
+
+	@staticmethod
+	def close_records_stream() -> None:
+		""" Close the stream of finished task records if any """
+		if Task.records_stream is not None:
+			Task.records_stream.close()
+			Task.records_stream = None
+
 	def calculate_distance_to_vehicle(self, vehicle: "Vehicle", fog: "FogNode") -> None:	# type: ignore
 		""" Calculate the distance to the vehicle
 		Args:
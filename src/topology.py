@@ -0,0 +1,265 @@
+
+# Imports
+from __future__ import annotations
+from src.resources import Resource
+from src.task import Task, TaskStates
+from src.fog import FogNode, FogNodesLink
+from src.vehicle import Vehicle
+from src.scheduler import FogScheduler
+from src.routing import RoutingTable
+from src.mobility import get_mobility
+from src.utils import random_step
+from src.print import *
+from config import *
+import math
+
+
+# Uniform grid of the fog nodes positions
+class FogGrid():
+	def __init__(self, cell_size: float = TOPOLOGY_CELL_SIZE) -> None:
+		""" FogGrid constructor (spatial index used to find the nearest fog nodes without comparing every pair)
+		Args:
+			cell_size	(float):	Size of the cells (in meters)
+		"""
+		self.cell_size: float = cell_size
+		self.cells: dict[tuple[int,int], list[FogNode]] = {}
+		self.size: int = 0
+
+	def cell_of(self, position: tuple[float,float]) -> tuple[int,int]:
+		return (int(math.floor(position[0] / self.cell_size)), int(math.floor(position[1] / self.cell_size)))
+
+	def add(self, fog: FogNode) -> None:
+		self.cells.setdefault(self.cell_of(fog.position), []).append(fog)
+		self.size += 1
+
+	def remove(self, fog: FogNode) -> None:
+		cell: tuple[int,int] = self.cell_of(fog.position)
+		self.cells[cell] = [other for other in self.cells[cell] if other is not fog]
+		if not self.cells[cell]:
+			del self.cells[cell]
+		self.size -= 1
+
+	def ring(self, center: tuple[int,int], radius: int) -> list[FogNode]:
+		""" Get the fog nodes of the cells at the given Chebyshev distance (in cells) of the center cell """
+		cx, cy = center
+		if radius == 0:
+			return self.cells.get(center, [])
+		fogs: list[FogNode] = []
+		for x in range(cx - radius, cx + radius + 1):
+			for y in (cy - radius, cy + radius):
+				fogs += self.cells.get((x, y), [])
+		for y in range(cy - radius + 1, cy + radius):
+			for x in (cx - radius, cx + radius):
+				fogs += self.cells.get((x, y), [])
+		return fogs
+
+	def max_ring(self, center: tuple[int,int]) -> int:
+		""" Ring radius covering every non empty cell from the center cell """
+		return max((max(abs(x - center[0]), abs(y - center[1])) for x, y in self.cells), default = 0)
+
+	def nearest(self, position: tuple[float,float], k: int, exclude: FogNode|None = None) -> list[tuple[float,FogNode]]:
+		""" Get the k nearest fog nodes of a position by searching rings of cells around it
+		Args:
+			position	(tuple):	Position to search around
+			k			(int):		Number of fog nodes
+			exclude		(FogNode):	Fog node to ignore (usually the one at the position)
+		Returns:
+			list[tuple[float,FogNode]]: (distance, fog node) sorted by distance
+		"""
+		center: tuple[int,int] = self.cell_of(position)
+		last_ring: int = self.max_ring(center)
+		found: list[tuple[float,FogNode]] = []
+		for radius in range(last_ring + 1):
+			found += [(math.dist(position, fog.position), fog) for fog in self.ring(center, radius) if fog is not exclude]
+
+			# Cells outside the ring are at least "radius * cell_size" away
+			if len(found) >= k:
+				found.sort(key = lambda pair: pair[0])
+				if found[k - 1][0] <= radius * self.cell_size:
+					break
+		found.sort(key = lambda pair: pair[0])
+		return found[:k]
+
+	def within(self, position: tuple[float,float], distance: float) -> list[FogNode]:
+		""" Get the fog nodes at most at the given distance of a position """
+		center: tuple[int,int] = self.cell_of(position)
+		last_ring: int = min(self.max_ring(center), int(distance // self.cell_size) + 1)
+		return [fog for radius in range(last_ring + 1) for fog in self.ring(center, radius) if math.dist(position, fog.position) <= distance]
+
+
+# Fog nodes and their neighbours graph, updated incrementally when fog nodes join or leave
+class Topology():
+	def __init__(self, fogs: set[FogNode], fog_resources: tuple, bandwidth_range: tuple[int,int,int], max_neighbours: int = MAX_NEIGHBOURS, max_hops: int = MAX_OFFLOAD_HOPS) -> None:
+		""" Topology constructor (the neighbours of the fog nodes are set with connect())
+		Args:
+			fogs			(set[FogNode]):	Fog nodes of the simulation (this set is updated in place)
+			fog_resources	(tuple):		Arguments of the random resources of the added fog nodes
+			bandwidth_range	(tuple):		Range of the bandwidth of the links (min, max, step)
+			max_neighbours	(int):			Number of neighbours of each fog node
+			max_hops		(int):			Maximum number of links of the routes
+		"""
+		self.fogs: set[FogNode] = fogs
+		self.fog_resources: tuple = fog_resources
+		self.bandwidth_range: tuple[int,int,int] = bandwidth_range
+		self.max_neighbours: int = max_neighbours
+		self.max_hops: int = max_hops
+		self.created: int = len(fogs)		# Number of fog nodes created so far (used for the IDs)
+		self.reach: float = 0.0				# Upper bound of the distance between a fog node and its farthest neighbour
+		self.grid: FogGrid = FogGrid()
+		for fog in fogs:
+			self.grid.add(fog)
+
+	def link(self, fog: FogNode, other: FogNode) -> FogNodesLink:
+		""" Create a link from a fog node to another one (latence is the distance, random bandwidth) """
+		link = FogNodesLink(other, int(math.dist(fog.position, other.position)), random_step(*self.bandwidth_range), owner = fog)
+		other.linked_by.add(fog)
+		return link
+
+	def unlink(self, fog: FogNode, link: FogNodesLink) -> None:
+		""" Forget a link of a fog node (the charges held by transfers in progress are released when they arrive) """
+		link.other.linked_by.discard(fog)
+
+	def connect(self, fog: FogNode) -> None:
+		""" Set the links of a fog node to its nearest fog nodes, keeping the existing links to the ones still among them
+		Args:
+			fog	(FogNode):	Fog node to rewire
+		"""
+		existing: dict[FogNode, FogNodesLink] = {link.other: link for link in fog.links}
+		links: list[FogNodesLink] = []
+		for _, other in self.grid.nearest(fog.position, self.max_neighbours, exclude = fog):
+			links.append(existing.pop(other) if other in existing else self.link(fog, other))
+		if links:
+			self.reach = max(self.reach, links[-1].latence + 1)
+		for link in existing.values():
+			self.unlink(fog, link)
+		fog.links = links
+
+	def affected_routes(self, seeds: set[FogNode]) -> set[FogNode]:
+		""" Get the fog nodes whose routes can go through the given fog nodes (reverse neighbours graph, up to max_hops - 1 links) """
+		affected: set[FogNode] = set(seeds)
+		frontier: set[FogNode] = set(seeds)
+		for _ in range(self.max_hops - 1):
+			frontier = {other for fog in frontier for other in fog.linked_by} - affected
+			affected |= frontier
+		return affected & self.fogs
+
+	def add_node(self, position: tuple[float,float], resources: Resource|None = None) -> FogNode:
+		""" Add a fog node during the simulation: only the fog nodes that get it as one of their nearest neighbours are rewired
+		Args:
+			position	(tuple):	Position of the new fog node
+			resources	(Resource):	Resources of the new fog node (random if None)
+		Returns:
+			FogNode: The new fog node
+		"""
+		fog = FogNode(f"fog{self.created}", position, FOG_SHAPE, FOG_COLOR, resources if resources is not None else Resource.random(*self.fog_resources))
+		self.created += 1
+		self.fogs.add(fog)
+		self.grid.add(fog)
+		self.connect(fog)
+
+		# A fog node is rewired if the new one is closer than its farthest neighbour (or if it has not enough neighbours)
+		rewired: set[FogNode] = {fog}
+		candidates: list[FogNode] = list(self.fogs) if len(self.fogs) <= self.max_neighbours + 1 else self.grid.within(position, self.reach)
+		for other in candidates:
+			if other is fog:
+				continue
+			if len(other.links) < self.max_neighbours or math.dist(other.position, position) < other.links[-1].latence + 1:
+				self.connect(other)
+				rewired.add(other)
+		RoutingTable.build(self.affected_routes(rewired), self.max_hops)
+		info(f"Added {fog} ({len(rewired) - 1} fog nodes rewired)")
+		return fog
+
+	def remove_node(self, fog: FogNode, policy: str = FAILED_NODE_TASKS) -> None:
+		""" Remove a fog node during the simulation (outage): only the fog nodes linked to it are rewired,
+		and its tasks are re-offered or failed in one bulk operation
+		Args:
+			fog		(FogNode):	Fog node to remove
+			policy	(str):		"reoffer" (tasks go back to pending, restarted) or "fail"
+		"""
+		self.fogs.discard(fog)
+		FogNode.generated_nodes.discard(fog)
+		self.grid.remove(fog)
+		get_mobility().remove_polygon(fog.id)
+
+		# Rewire the fog nodes linked to it, the routes going through them (before and after the rewiring) are rebuilt
+		linked_by: set[FogNode] = set(fog.linked_by)
+		affected: set[FogNode] = self.affected_routes(linked_by)
+		for link in fog.links:
+			self.unlink(fog, link)
+		fog.links = []
+		for route in fog.routes:
+			route.destination.routed_by.discard(fog)
+		fog.routes = []
+		for other in linked_by:
+			self.connect(other)
+		RoutingTable.build(affected | self.affected_routes(linked_by), self.max_hops)
+
+		# Forget the fog node in the distances of the vehicles
+		for vehicle in Vehicle.vehicles:
+			vehicle.fog_distances.pop(fog, None)
+
+		# Tasks of the fog node
+		tasks: list[Task] = fog.assigned_tasks
+		FogNode.all_task_distances -= fog.task_distances
+		fog.task_distances = 0.0
+		fog.assigned_tasks = []
+		fog.used_resources = Resource.empty()
+		fog.calculate_usage()
+		Topology.release_tasks(tasks, policy)
+		info(f"Removed fog node '{fog.id}' ({len(linked_by)} fog nodes rewired, {len(tasks)} tasks {'re-offered' if policy == 'reoffer' else 'failed'})")
+
+	@staticmethod
+	def release_tasks(tasks: list[Task], policy: str) -> None:
+		""" Re-offer or fail the tasks of a removed fog node at once (tasks of departed vehicles are always failed)
+		Args:
+			tasks	(list[Task]):	Tasks of the removed fog node
+			policy	(str):			"reoffer" or "fail"
+		"""
+		for task in tasks:
+			task.in_transfer = False
+			task.transfer_sequence = -1		# Cancel the transfer in progress if any
+		reoffered: list[Task] = [task for task in tasks if policy == "reoffer" and task.vehicle in Vehicle.vehicles]
+		failed: list[Task] = [task for task in tasks if not (policy == "reoffer" and task.vehicle in Vehicle.vehicles)]
+
+		# Re-offered tasks are restarted from the beginning
+		for task in reoffered:
+			task.resolving_time = task.initial_resolving_time
+		Task.change_states(reoffered, TaskStates.PENDING)
+
+		# Failed tasks are not waited by their vehicle anymore (and miss their deadline if any)
+		Task.change_states(failed, TaskStates.FAILED)
+		FogScheduler.record_failures(failed)
+		failed_per_vehicle: dict[Vehicle, set[Task]] = {}
+		for task in failed:
+			failed_per_vehicle.setdefault(task.vehicle, set()).add(task)
+		for vehicle, vehicle_tasks in failed_per_vehicle.items():
+			vehicle.not_finished_tasks -= len(vehicle_tasks)
+			if not Task.retain_finished:
+				vehicle.tasks = [task for task in vehicle.tasks if task not in vehicle_tasks]
+
+	def apply_events(self, step: int, events: list[tuple] = TOPOLOGY_EVENTS) -> bool:
+		""" Apply the topology events of the given step
+		Args:
+			step	(int):		Current step of the simulation
+			events	(list):		Events (step, "add", (x, y)) or (step, "remove", fog_id)
+		Returns:
+			bool: True if the topology changed
+		"""
+		changed: bool = False
+		for event_step, action, argument in events:
+			if event_step != step:
+				continue
+			changed = True
+			if action == "add":
+				self.add_node(tuple(argument))
+			elif action == "remove":
+				fog: FogNode|None = next((fog for fog in self.fogs if fog.id == argument), None)
+				if fog is None:
+					warning(f"Cannot remove fog node '{argument}' at step {step}: unknown fog node")
+				else:
+					self.remove_node(fog)
+			else:
+				raise ValueError(f"Unknown topology event '{action}', expected 'add' or 'remove'")
+		return changed
+
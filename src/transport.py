@@ -0,0 +1,64 @@
+
+# Imports
+from src.utils import METADATA_KEYS, add_cumulative_evaluations
+import numpy as np
+import tempfile
+import os
+
+
+# Transport of the evaluations of a simulation from a worker process to the parent through a memory-mapped file
+def export_evaluations(r_dict: dict) -> dict:
+	""" Write the evaluations series of a simulation into a memory-mapped array and return a small handle\n
+	The cumulative arrays are not written as they are computed again by load_evaluations()
+	Args:
+		r_dict	(dict):	Return value of a simulation
+	Returns:
+		dict: Handle with the metadata, the path of the array and the labels of its rows
+	"""
+	labels: list[str] = [key for key in r_dict if key not in METADATA_KEYS and not key.startswith("Cumulative ")]
+	length: int = len(r_dict[labels[0]]) if labels else 0
+
+	# Write the series (one row per label)
+	file_descriptor, path = tempfile.mkstemp(prefix = "evaluations_", suffix = ".npy")
+	os.close(file_descriptor)
+	array: np.memmap = np.lib.format.open_memmap(path, mode = "w+", dtype = np.float64, shape = (len(labels), length))
+	for i, label in enumerate(labels):
+		array[i] = r_dict[label]
+	array.flush()
+	del array
+
+	# Return the handle
+	handle: dict = {key: r_dict[key] for key in METADATA_KEYS}
+	handle["path"] = path
+	handle["labels"] = labels
+	handle["integer_labels"] = [label for label in labels if all(isinstance(x, int) for x in r_dict[label])]
+	return handle
+
+
+def load_evaluations(handle: dict, release: bool = True) -> dict:
+	""" Read the evaluations of a simulation from its handle (see export_evaluations)
+	Args:
+		handle	(dict):	Handle returned by export_evaluations
+		release	(bool):	Whether to delete the memory-mapped file after reading it (default: True)
+	Returns:
+		dict: Return value of the simulation, with its cumulative arrays
+	"""
+	r_dict: dict = {key: handle[key] for key in METADATA_KEYS}
+	array: np.ndarray = np.load(handle["path"], mmap_mode = "r")
+	for i, label in enumerate(handle["labels"]):
+		row: np.ndarray = array[i]
+		r_dict[label] = row.astype(np.int64).tolist() if label in handle["integer_labels"] else row.tolist()
+	del array
+	if release:
+		release_evaluations(handle)
+	add_cumulative_evaluations(r_dict)
+	return r_dict
+
+
+def release_evaluations(handle: dict) -> None:
+	""" Delete the memory-mapped file of a handle
+	Args:
+		handle	(dict):	Handle returned by export_evaluations
+	"""
+	if os.path.exists(handle["path"]):
+		os.remove(handle["path"])
@@ -7,6 +7,7 @@ from config import *
 import time
 import math
 import random
+from itertools import accumulate
 import json
 import io
 import os
@@ -14,10 +15,11 @@ import os
 
 # Assign modes
 class AssignMode():
-	def __init__(self, neighbours: bool = False, qos: bool = False, cost: bool = False):
+	def __init__(self, neighbours: bool = False, qos: bool = False, cost: bool = False, k_nearest: bool = False):
 		self.neighbours = neighbours
 		self.qos = qos
 		self.cost = cost
+		self.k_nearest = k_nearest	# Offer the tasks to the best fitting fog node among the k nearest ones first
 
 		self.name: str = ""
 		if self.neighbours:
@@ -26,6 +28,8 @@ class AssignMode():
 			self.name += "Q"
 		if self.cost:
 			self.name += "C"
+		if self.k_nearest:
+			self.name += "K"
 		
 		if self.name == "":
 			self.name = "None"
@@ -122,33 +126,53 @@ def super_json_dump(data: dict|list, file: io.TextIOWrapper = None, max_level: i
 	return content
 
 
-# Utility function that processes the return value of a simulation
-def process_simulation_evaluations(evaluations_per_mode: list[dict]) -> None:
-	""" Process the return value of a simulation and generate the outputs (images and data)\n
+# Keys of a simulation return dictionnary that are not evaluations
+METADATA_KEYS: list[str] = ["folder", "simulation_name", "name"]
+
+# Add the cumulative arrays to the return value of a simulation
+def add_cumulative_evaluations(r_dict: dict) -> None:
+	""" Add a "Cumulative {label}" array for each evaluation of the dictionnary (value at step i is the sum of the values before i)
 	Args:
-		evaluations_per_mode (list[dict]): The evaluations of each assign mode
+		r_dict	(dict):	Return value of a simulation, modified in place
 	"""
-	# Extract all evaluations labels
-	evaluations_labels: list[str] = [key for key in evaluations_per_mode[0].keys() if key not in ["folder", "simulation_name", "name"]]
+	for key, value in list(r_dict.items()):
+		if key not in METADATA_KEYS and not key.startswith("Cumulative "):
+			r_dict[f"Cumulative {key}"] = [0] + list(accumulate(value[:-1])) if value else []
+
 
-	# For each assign mode, generate its content
+# Utility function that generates the outputs of a single simulation
+def process_single_evaluation(data: dict) -> None:
+	""" Generate the outputs (images and data) of a single simulation in its own folder\n
+	Args:
+		data (dict): The evaluations of the simulation
+	"""
+	evaluations_labels: list[str] = [key for key in data.keys() if key not in METADATA_KEYS]
+	simulation_name: str = data["simulation_name"]
+	name: str = data["name"]
+	os.makedirs(simulation_name, exist_ok = True)
+	for label in evaluations_labels:
+		minimized_label: str = "".join(c for c in label.replace(" ", "_").lower() if c.isalnum() or c in ['_'])
+		plt.clf()
+		plt.plot(data[label])
+		plt.title(f"{label} over time - {name}")
+		plt.xlabel("Simulation Step")
+		plt.ylabel(label)
+		plt.savefig(f"{simulation_name}/{minimized_label}.png", dpi = DPI_MULTIPLIER * plt.rcParams["figure.dpi"])
+	
+	# Save data
+	with open(f"{simulation_name}/data.json", "w", encoding = "utf-8") as file:
+		super_json_dump(data, file, max_level = 1)
+
+
+# Utility function that generates the outputs comparing the assign modes
+def process_evaluations_comparison(evaluations_per_mode: list[dict]) -> None:
+	""" Generate the outputs comparing each assign mode (images and data) in the parent folder of the simulations\n
+	Args:
+		evaluations_per_mode (list[dict]): The evaluations of each assign mode
+	"""
+	# Extract all evaluations labels (the sharded runs do not have every one of them)
+	evaluations_labels: list[str] = list(dict.fromkeys(key for mode in evaluations_per_mode for key in mode if key not in METADATA_KEYS))
 	root_folder: str = '/'.join(evaluations_per_mode[0]["simulation_name"].split('/')[:-1])
-	for data in evaluations_per_mode:
-		simulation_name: str = data["simulation_name"]
-		name: str = data["name"]
-		os.makedirs(simulation_name, exist_ok = True)
-		for label in evaluations_labels:
-			minimized_label: str = "".join(c for c in label.replace(" ", "_").lower() if c.isalnum() or c in ['_'])
-			plt.clf()
-			plt.plot(data[label])
-			plt.title(f"{label} over time - {name}")
-			plt.xlabel("Simulation Step")
-			plt.ylabel(label)
-			plt.savefig(f"{simulation_name}/{minimized_label}.png", dpi = DPI_MULTIPLIER * plt.rcParams["figure.dpi"])
-		
-		# Save data
-		with open(f"{simulation_name}/data.json", "w", encoding = "utf-8") as file:
-			super_json_dump(data, file, max_level = 1)
 
 	# Save data
 	with open(f"{root_folder}/all_data.json", "w", encoding = "utf-8") as file:
@@ -156,15 +180,58 @@ def process_simulation_evaluations(evaluations_per_mode: list[dict]) -> None:
 
 	# For each label, generate graphs comparing each assign mode
 	for label in evaluations_labels:
-		data: list[list[float]] = [assign_mode[label] for assign_mode in evaluations_per_mode]
 		minimized_label: str = "".join(c for c in label.replace(" ", "_").lower() if c.isalnum() or c in ['_'])
 
 		plt.clf()
-		for i, mode in enumerate(evaluations_per_mode):
-			plt.plot(data[i], label = mode["name"])
+		for mode in evaluations_per_mode:
+			if label in mode:
+				plt.plot(mode[label], label = mode["name"])
 		plt.title(f"{label} over time")
 		plt.legend()
 		plt.xlabel("Simulation Step")
 		plt.ylabel(label)
 		plt.savefig(f"{root_folder}/{minimized_label}_comparison.png", dpi = DPI_MULTIPLIER * plt.rcParams["figure.dpi"])
 
+
+# Utility function that generates the outputs comparing the assign modes over multiple seeds
+def process_aggregated_comparison(summaries_per_mode: list[dict]) -> None:
+	""" Generate the outputs comparing each assign mode over multiple runs (mean and 95% confidence band of each evaluation)\n
+	Args:
+		summaries_per_mode (list[dict]): The statistics of each assign mode (see EvaluationsAggregator.summary)
+	"""
+	# Extract all evaluations labels (the sharded runs do not have every one of them)
+	evaluations_labels: list[str] = list(dict.fromkeys(key for summary in summaries_per_mode for key in summary if key not in METADATA_KEYS and key != "runs"))
+	root_folder: str = '/'.join(summaries_per_mode[0]["simulation_name"].split('/')[:-1])
+	os.makedirs(root_folder, exist_ok = True)
+
+	# Save data
+	with open(f"{root_folder}/all_data.json", "w", encoding = "utf-8") as file:
+		super_json_dump(summaries_per_mode, file, max_level = 3)
+
+	# For each label, generate graphs comparing the mean of each assign mode with its confidence band
+	for label in evaluations_labels:
+		minimized_label: str = "".join(c for c in label.replace(" ", "_").lower() if c.isalnum() or c in ['_'])
+
+		plt.clf()
+		for summary in summaries_per_mode:
+			if label not in summary:
+				continue
+			steps: range = range(len(summary[label]["mean"]))
+			plt.plot(steps, summary[label]["mean"], label = f"{summary['name']} ({summary['runs']} runs)")
+			plt.fill_between(steps, summary[label]["ci_low"], summary[label]["ci_high"], alpha = 0.25)
+		plt.title(f"{label} over time (mean and 95% confidence band)")
+		plt.legend()
+		plt.xlabel("Simulation Step")
+		plt.ylabel(label)
+		plt.savefig(f"{root_folder}/{minimized_label}_comparison.png", dpi = DPI_MULTIPLIER * plt.rcParams["figure.dpi"])
+
+
+# Utility function that processes the return value of a simulation
+def process_simulation_evaluations(evaluations_per_mode: list[dict]) -> None:
+	""" Process the return value of a simulation and generate the outputs (images and data)\n
+	Args:
+		evaluations_per_mode (list[dict]): The evaluations of each assign mode
+	"""
+	for data in evaluations_per_mode:
+		process_single_evaluation(data)
+	process_evaluations_comparison(evaluations_per_mode)
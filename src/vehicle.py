@@ -3,16 +3,21 @@
 from src.resources import Resource
 from src.task import Task, TaskStates
 from src.fog import FogNode
-from src.utils import AssignMode, random_step
+from src.scheduler import FogScheduler
+from src.cloud import CloudNode
+from src.forecast import DemandForecaster
+from src.mobility import get_mobility
+from src.rng import *
+from src.utils import AssignMode
 from src.print import *
 from config import *
-import traci
-import random
+import numpy as np
 import math
 
 # Vehicle class
 class Vehicle():
 	vehicles: set["Vehicle"] = set()
+	rng_seed: int = 0		# Seed of the tasks random streams (set by the simulation)
 	def __init__(self, vehicle_id: str, tasks: list[Task] = None) -> None:
 		""" Vehicle constructor
 		Args:
@@ -23,6 +28,9 @@ class Vehicle():
 		self.tasks: list[Task] = tasks if tasks is not None else []
 		self.not_finished_tasks: int = len([task for task in self.tasks if task.state not in [TaskStates.COMPLETED, TaskStates.FAILED]])
 		self.fog_distances: dict[FogNode,float] = {}
+		self.position: tuple[float,float] = (0.0, 0.0)	# Last known position (updated by the sharded mode)
+		self.rng_key: int = entity_key(vehicle_id)		# Key of the vehicle in the tasks random streams
+		self.generated_tasks: int = 0					# Number of tasks generated so far (counter of the random streams)
 		Vehicle.vehicles.add(self)
 	
 	def __str__(self) -> str:
@@ -33,23 +41,68 @@ class Vehicle():
 		Returns:
 			tuple: Position of the vehicle
 		"""
-		return traci.vehicle.getPosition(self.vehicle_id)
+		return get_mobility().get_position(self.vehicle_id)
 	
 	def generate_tasks(self, nb_tasks: tuple[int,int] = (1,3), random_resource_args: tuple = Resource.LOW_RANDOM_RESOURCE_ARGS, random_resolution_times: tuple = (1, 5, 1), random_costs: tuple[int,int,int] = COST_RANGE) -> None:
-		""" Generate tasks for the vehicle
+		""" Generate tasks for the vehicle (see Vehicle.generate_tasks_batch)
 		Args:
 			nb_tasks				(tuple):	Min and Max number of tasks to generate
 			random_resource_args	(tuple):	Arguments for the random resource generation
 			random_resolving_time	(tuple):	Min, Max and step for the random resolving time generation
 			random_costs			(tuple):	Min, Max and step for the random cost generation
 		"""
-		for i in range(random.randint(*nb_tasks)):
-			task_id = f"{self.vehicle_id}_task_{i}"							# Generate task ID based on vehicle ID
-			random_resource = Resource.random(*random_resource_args)		# Generate random resource with low values
-			random_resolving_time = random_step(*random_resolution_times)	# Generate random resolving time
-			random_cost = random_step(*random_costs)						# Generate random cost
-			self.tasks.append(Task(task_id, vehicle = self, resource = random_resource, resolving_time = random_resolving_time, cost = random_cost))
-			self.not_finished_tasks += 1
+		Vehicle.generate_tasks_batch([self], nb_tasks, random_resource_args, random_resolution_times, random_costs)
+
+	@staticmethod
+	def generate_tasks_batch(vehicles: list["Vehicle"], nb_tasks: tuple[int,int] = (1,3), random_resource_args: tuple = Resource.LOW_RANDOM_RESOURCE_ARGS, random_resolution_times: tuple = (1, 5, 1), random_costs: tuple[int,int,int] = COST_RANGE) -> None:
+		""" Generate tasks for multiple vehicles at once\n
+		Every random value comes from a counter-based stream keyed by (seed, vehicle, task index), so the generated tasks
+		do not depend on the order of the vehicles nor on the process generating them
+		Args:
+			vehicles				(list):		Vehicles to generate tasks for
+			nb_tasks				(tuple):	Min and Max number of tasks to generate
+			random_resource_args	(tuple):	Arguments for the random resource generation
+			random_resolving_time	(tuple):	Min, Max and step for the random resolving time generation
+			random_costs			(tuple):	Min, Max and step for the random cost generation
+		"""
+		if not vehicles:
+			return
+		seed: int = Vehicle.rng_seed
+		keys: np.ndarray = np.array([vehicle.rng_key for vehicle in vehicles], dtype = np.uint64)
+		first_indexes: np.ndarray = np.array([vehicle.generated_tasks for vehicle in vehicles], dtype = np.uint64)
+
+		# Number of tasks of each vehicle, then one row per task
+		if nb_tasks[0] == nb_tasks[1]:
+			counts: np.ndarray = np.full(len(vehicles), nb_tasks[0], dtype = np.int64)
+		else:
+			counts: np.ndarray = random_steps(counter_uniform(seed, keys, first_indexes, STREAM_NB_TASKS), *nb_tasks)
+		offsets: np.ndarray = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)	# Index of each task inside its vehicle batch
+		task_keys: np.ndarray = np.repeat(keys, counts)
+		task_indexes: np.ndarray = np.repeat(first_indexes, counts) + offsets.astype(np.uint64)
+
+		# Random values of the tasks
+		cpus: np.ndarray = random_steps(counter_uniform(seed, task_keys, task_indexes, STREAM_CPU), *random_resource_args[0])
+		rams: np.ndarray = random_steps(counter_uniform(seed, task_keys, task_indexes, STREAM_RAM), *random_resource_args[1])
+		storages: np.ndarray = random_steps(counter_uniform(seed, task_keys, task_indexes, STREAM_STORAGE), *random_resource_args[2])
+		resolving_times: np.ndarray = random_steps(counter_uniform(seed, task_keys, task_indexes, STREAM_RESOLVING_TIME), *random_resolution_times)
+		costs: np.ndarray = random_steps(counter_uniform(seed, task_keys, task_indexes, STREAM_COST), *random_costs)
+
+		# Deadlines: last step at which the task can be completed if it starts now, plus a random slack
+		deadlines: list[int|None] = [None] * len(task_keys)
+		if DEADLINE_SLACK_RANGE is not None:
+			slacks: np.ndarray = random_steps(counter_uniform(seed, task_keys, task_indexes, STREAM_DEADLINE), *DEADLINE_SLACK_RANGE)
+			deadlines = (Task.current_step + resolving_times - 1 + slacks).tolist()
+
+		# Create the tasks
+		row: int = 0
+		for vehicle, count in zip(vehicles, counts.tolist()):
+			for _ in range(count):
+				task_id = f"{vehicle.vehicle_id}_task_{vehicle.generated_tasks}"	# Generate task ID based on vehicle ID
+				resource = Resource(int(cpus[row]), int(rams[row]), int(storages[row]))
+				vehicle.tasks.append(Task(task_id, vehicle = vehicle, resource = resource, resolving_time = int(resolving_times[row]), cost = int(costs[row]), time_constraint = deadlines[row]))
+				vehicle.not_finished_tasks += 1
+				vehicle.generated_tasks += 1
+				row += 1
 	
 	def get_nearest_fogs(self) -> list[FogNode]:
 		""" Get the nearest fog nodes to the vehicle (by distance)
@@ -68,33 +121,122 @@ class Vehicle():
 		self.not_finished_tasks -= 1
 		if task.state != TaskStates.COMPLETED:
 			task.change_state(TaskStates.COMPLETED)
+		task.mark_completed()
+		FogScheduler.record_completion(task)
+
+		# Release the task if finished tasks are not retained
+		if not Task.retain_finished:
+			self.tasks = [x for x in self.tasks if x is not task]
 	
-	def assign_tasks(self, mode: AssignMode = AssignMode.ALL) -> None:
-		""" Assign pensing tasks to the nearest fog node
+	def reject_task(self, task: Task) -> None:
+		""" Fail a pending task rejected by the admission control of a fog node (it cannot meet its deadline anymore)
+		Args:
+			task	(Task):	Task that has been rejected
+		"""
+		self.not_finished_tasks -= 1
+		task.change_state(TaskStates.FAILED)
+
+		# Release the task if finished tasks are not retained
+		if not Task.retain_finished:
+			self.tasks = [x for x in self.tasks if x is not task]
+	
+	def assign_tasks(self, mode: AssignMode = AssignMode.ALL, offers: list[tuple]|None = None) -> None:
+		""" Assign pensing tasks to the nearest fog node\n
+		If a scheduler is enabled, the tasks are queued in the scheduler of the nearest fog node instead (see FogScheduler)
 		Args:
 			fogs			(set[FogNode]):	Set of fog nodes
 			mode			(AssignMode):	Configuration of how the tasks are assigned
+			offers			(list[tuple]):	If given, the offers are collected in it instead (offered by priority, see StepBudget)
 		"""
 		# Get the nearest fog and the pending tasks
 		nearest_fog: FogNode = self.get_nearest_fogs()[0]
 		pending_tasks: list[Task] = [task for task in self.tasks if task.state == TaskStates.PENDING]
-		nb_tasks: int = len(pending_tasks)
-
-		# Try to assign every tasks to the nearest fog node
-		for task in pending_tasks:
-			if nearest_fog.ask_assign_task(task, mode = mode):
-				task.change_state(TaskStates.IN_PROGRESS)
-				nb_tasks -= 1
-		
-		# Color green if no task is PENDING, blue instead
-		color: tuple = (0, 255, 0) if nb_tasks == 0 else (0, 0, 255)
-		traci.vehicle.setColor(self.vehicle_id, color)
+		if DemandForecaster.is_enabled():
+			DemandForecaster.observe(nearest_fog, pending_tasks)
+
+		# Queue the tasks, they are offered when the scheduler is drained
+		if FogScheduler.is_enabled():
+			for task in pending_tasks:
+				nearest_fog.scheduler.submit(task)
+			return
+
+		# Collect the offers, they are offered by priority within the step budget
+		candidates: list[list[FogNode]|None] = self.get_best_fit_fogs(pending_tasks) if mode.k_nearest else [None] * len(pending_tasks)
+		if offers is not None:
+			offers.extend((self, nearest_fog, task, task_candidates) for task, task_candidates in zip(pending_tasks, candidates))
+			return
+
+		# Try to assign every tasks
+		for task, task_candidates in zip(pending_tasks, candidates):
+			if self.offer_task(task, nearest_fog, mode, task_candidates):
+				task.mark_assigned()
+		self.update_color()
+
+	def offer_task(self, task: Task, nearest_fog: FogNode, mode: AssignMode, candidates: list[FogNode]|None = None) -> bool:
+		""" Offer a pending task to the fog nodes: the best fitting of the k nearest ones first if the mode asks for it,
+		then the nearest fog node (which can forward it to other fog nodes depending on the mode, without offering it to itself again), then the cloud if enabled
+		Args:
+			task		(Task):				Task to offer
+			nearest_fog	(FogNode):			Nearest fog node of the vehicle
+			mode		(AssignMode):		Configuration of how the tasks are assigned
+			candidates	(list[FogNode]):	Candidates of the k-nearest placement, best first (computed if None)
+		Returns:
+			bool: True if the task was assigned, False otherwise
+		"""
+		offered: bool = False	# True if the nearest fog node already refused the task itself
+		if mode.k_nearest:
+			if candidates is None:
+				candidates = self.get_best_fit_fogs([task])[0]
+			for fog in candidates:
+				if fog.ask_assign_task(task, mode = mode, from_vehicle = False):
+					return True
+				offered = offered or fog is nearest_fog
+		if nearest_fog.ask_assign_task(task, mode = mode, check_self = not offered):
+			return True
+		return CloudNode.ask_assign_task(task)
+
+	def get_best_fit_fogs(self, tasks: list[Task], k: int = K_NEAREST_FOGS) -> list[list[FogNode]]:
+		""" Get, for each task, the k nearest fog nodes that can fit it sorted by score (see FogNode.best_fit_scores)\n
+		Every task is scored on the state of the fog nodes before the placement of the first one
+		(the fog node still checks its resources when the task is offered)
+		Args:
+			tasks	(list[Task]):	Tasks to place
+			k		(int):			Number of candidate fog nodes
+		Returns:
+			list[list[FogNode]]: Candidate fog nodes that can fit each task, best first
+		"""
+		if not tasks:
+			return []
+		candidates: list[FogNode] = self.get_nearest_fogs()[:k]
+		scores: np.ndarray = FogNode.best_fit_scores(candidates, tasks, [self.fog_distances[fog] for fog in candidates])
+		orders: np.ndarray = np.argsort(scores, axis = 1, kind = "stable")
+		feasible: np.ndarray = np.isfinite(scores)
+		return [[candidates[i] for i in order if task_feasible[i]] for order, task_feasible in zip(orders.tolist(), feasible.tolist())]
+
+	def update_color(self) -> None:
+		""" Color green if no task is PENDING, blue instead """
+		is_pending: bool = any(task.state == TaskStates.PENDING for task in self.tasks)
+		color: tuple = (0, 0, 255) if is_pending else (0, 255, 0)
+		get_mobility().set_vehicle_color(self.vehicle_id, color)
 	
 	def set_distance_to_fogs(self, fogs: set[FogNode]) -> None:
 		""" Get the distance between the vehicle and all fog nodes and put it in the variable "fog_distances"\n
+		The distances already computed by the mobility source are used if any (fog nodes unknown to it are computed here)
 		Args:
 			fogs	(set[FogNode]):	Fog nodes to calculate the distance to
 		"""
+		shared: dict[str, float]|None = get_mobility().get_fog_distances(self.vehicle_id)
+		if shared is not None:
+			missing: list[FogNode] = []
+			for fog in fogs:
+				distance: float|None = shared.get(fog.id)
+				if distance is None:
+					missing.append(fog)
+				else:
+					self.fog_distances[fog] = distance
+			fogs = missing
+			if not fogs:
+				return
 		vehicle_position: tuple[float,float] = self.get_position()
 		for fog in fogs:
 			self.fog_distances[fog] = math.dist(vehicle_position, fog.position)
@@ -109,15 +251,22 @@ class Vehicle():
 		return self.fog_distances.get(fog, 0.0)
 
 	def destroy(self) -> None:
-		""" Destroy the vehicle by failing all remaining tasks """
-		for task in self.tasks:
-			if task.state == TaskStates.PENDING:
-				task.change_state(TaskStates.FAILED)
+		""" Destroy the vehicle by failing all remaining tasks\n
+		If finished tasks are not retained, the references to the tasks and fog nodes are released
+		(tasks still in progress keep the vehicle alive until they are completed)
+		"""
+		failed: list[Task] = [task for task in self.tasks if task.state == TaskStates.PENDING]
+		for task in failed:
+			task.change_state(TaskStates.FAILED)
+		FogScheduler.record_failures(failed)
+		if not Task.retain_finished:
+			self.tasks = []
+			self.fog_distances = {}
 	
 	@staticmethod
 	def acknowledge_removed_vehicles() -> None:
 		""" Acknowledge removed vehicles in the simulation """
-		id_list: set[str] = set(traci.vehicle.getIDList())
+		id_list: set[str] = set(get_mobility().get_vehicle_ids())
 		new_set: set[str] = set()
 		for vehicle in Vehicle.vehicles:
 			if vehicle.vehicle_id in id_list:
@@ -130,7 +279,7 @@ class Vehicle():
 	@staticmethod
 	def acknowledge_new_vehicles() -> None:
 		""" Acknowledge new vehicles in the simulation """
-		id_list: set = set(traci.vehicle.getIDList())
+		id_list: set = set(get_mobility().get_vehicle_ids())
 		vehicle_ids: set = set(vehicle.vehicle_id for vehicle in Vehicle.vehicles)
 		not_known_vehicles: set = id_list - vehicle_ids
 		for vehicle_id in not_known_vehicles:
@@ -0,0 +1,199 @@
+
+# Imports
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import itertools
+import argparse
+import tempfile
+import random
+import json
+import math
+import sys
+import os
+
+# Constants
+ROOT: str = os.path.dirname(os.path.abspath(__file__))
+NB_STEPS: int = 300				# Steps of the synthetic traffic (then the remaining vehicles leave)
+VISUAL_CENTER: tuple[int,int] = (1200, 1600)
+SUMO_CONFIG: str = "Reims/osm.sumocfg"
+PRESETS: dict[str, str] = {		# Resources presets of the fog nodes (attributes of Resource)
+	"medium": "MEDIUM_RANDOM_RESOURCE_ARGS",
+	"high": "HIGH_RANDOM_RESOURCE_ARGS",
+	"extreme": "EXTREME_RANDOM_RESOURCE_ARGS",
+}
+
+# Search space: values tried for each constant of config.py (the current value is always part of the candidates)
+SEARCH_SPACE: dict[str, list] = {
+	"K_TASKS": [1.0, 3.0, 5.0],
+	"K_NODES": [0.5, 1.0, 2.0],
+	"K_LINKS": [0.5, 1.0, 2.0],
+	"K_COST": [0.05, 0.1, 0.2],
+	"K_BANDWIDTH_CHARGE": [2.5, 5.0, 10.0],
+	"MAX_NEIGHBOURS": [3, 5, 7],
+}
+
+
+# Worker: run one candidate in its own process (the constants are copied by the star imports, so they must be set before any import)
+def run_worker(overrides: dict, preset: str, mode_name: str, seed: int, traffic: str, nb_steps: int, max_steps: int|None, output: str) -> None:
+	""" Run a simulation with the given constants and write its final task counts to a JSON file
+	Args:
+		overrides	(dict):		Constants of config.py to change (by name)
+		preset		(str):		Resources preset of the fog nodes (see PRESETS)
+		mode_name	(str):		Assign mode letters (e.g. "NQC")
+		seed		(int):		Seed of the simulation and of the traffic
+		traffic		(str):		"random" (synthetic traffic, no SUMO) or "sumo" (SUMO_CONFIG without GUI)
+		nb_steps	(int):		Steps of the synthetic traffic
+		max_steps	(int):		Steps of the partial run, None to run until the end
+		output		(str):		Path of the JSON result
+	"""
+	sys.path.insert(0, ROOT)
+	os.chdir(ROOT)
+	import config
+	for name, value in overrides.items():
+		setattr(config, name, value)
+	from src.main import run_simulation
+	from src.mobility import RandomWalkMobility
+	from src.resources import Resource
+	from src.utils import AssignMode
+
+	# Run the simulation
+	r_dict: dict = run_simulation(
+		simulation_name = os.path.join(os.path.dirname(output), "simulation"), assign_mode = AssignMode(*[letter in mode_name for letter in "NQCK"]),
+		sumo_config = SUMO_CONFIG, visual_center = VISUAL_CENTER, folder = "tuning", seed = seed, open_gui = False,
+		fog_resources = getattr(Resource, PRESETS[preset]), mobility = RandomWalkMobility(seed, nb_steps = nb_steps) if traffic == "random" else None,
+		max_steps = max_steps,
+	)
+	result: dict = {"completed": r_dict["Completed Tasks"][-1], "failed": r_dict["Failed Tasks"][-1], "steps": len(r_dict["QoS Evaluations"])}
+	with open(output, "w", encoding = "utf-8") as file:
+		json.dump(result, file)
+
+
+# Run a candidate in a subprocess
+def run_candidate(overrides: dict, preset: str, mode_name: str, seed: int, traffic: str, nb_steps: int, max_steps: int|None, workdir: str) -> dict:
+	""" Run a candidate in a subprocess and load its result
+	Args:
+		overrides	(dict):	Constants of config.py to change (by name)
+		preset		(str):	Resources preset of the fog nodes
+		mode_name	(str):	Assign mode letters
+		seed		(int):	Seed of the simulation
+		traffic		(str):	"random" or "sumo"
+		nb_steps	(int):	Steps of the synthetic traffic
+		max_steps	(int):	Steps of the partial run, None to run until the end
+		workdir		(str):	Temporary folder of the outputs of the runs
+	Returns:
+		dict: Result of the run (see run_worker)
+	"""
+	run_dir: str = tempfile.mkdtemp(prefix = "run_", dir = workdir)
+	output: str = os.path.join(run_dir, "result.json")
+	command: list[str] = [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(overrides), preset, mode_name, str(seed), traffic, str(nb_steps), str(max_steps), output]
+	subprocess.run(command, check = True, stdout = subprocess.DEVNULL)
+	with open(output, "r", encoding = "utf-8") as file:
+		return json.load(file)
+
+
+def sample_candidates(space: dict[str, list], baseline: dict, nb_candidates: int, seed: int) -> list[dict]:
+	""" Sample configurations of the search space (every configuration if there are not more than asked)
+	Args:
+		space			(dict):	Values tried for each constant
+		baseline		(dict):	Current value of each constant (always the first candidate)
+		nb_candidates	(int):	Number of candidates wanted
+		seed			(int):	Seed of the sampling
+	Returns:
+		list[dict]: Candidates, the baseline first
+	"""
+	names: list[str] = list(space)
+	combinations: list[dict] = [dict(zip(names, values)) for values in itertools.product(*space.values())]
+	combinations = [candidate for candidate in combinations if candidate != baseline]
+	if len(combinations) > nb_candidates - 1:
+		combinations = random.Random(seed).sample(combinations, nb_candidates - 1)
+	return [baseline] + combinations
+
+
+def successive_halving(candidates: list[dict], preset: str, args: argparse.Namespace, workdir: str) -> list[tuple[dict, dict]]:
+	""" Evaluate the candidates on partial runs growing by a factor eta, keeping the best 1/eta of them after each rung
+	(the last rung runs until the end of the traffic)
+	Args:
+		candidates	(list[dict]):			Configurations to evaluate
+		preset		(str):					Resources preset of the fog nodes
+		args		(argparse.Namespace):	Arguments of the tuner
+		workdir		(str):					Temporary folder of the outputs of the runs
+	Returns:
+		list[tuple[dict,dict]]: Configurations of the last rung with their mean result (and score), best first
+	"""
+	max_steps: int|None = args.min_steps
+	with ThreadPoolExecutor(max_workers = args.workers) as executor:
+		while True:
+			if max_steps is not None and max_steps >= args.steps:
+				max_steps = None
+
+			# Run every candidate on every seed in parallel
+			futures: list[list] = [
+				[executor.submit(run_candidate, {**args.fixed, **candidate}, preset, args.mode, seed, args.traffic, args.steps, max_steps, workdir) for seed in args.seeds]
+				for candidate in candidates
+			]
+			ranked: list[tuple[dict, dict]] = []
+			for candidate, candidate_futures in zip(candidates, futures):
+				results: list[dict] = [future.result() for future in candidate_futures]
+				mean: dict = {key: sum(result[key] for result in results) / len(results) for key in ("completed", "failed", "steps")}
+				mean["score"] = mean["completed"] - args.failure_weight * mean["failed"]
+				ranked.append((candidate, mean))
+			ranked.sort(key = lambda item: (-item[1]["score"], item[1]["failed"]))
+			info(f"[{preset}] {len(candidates)} candidates on {'full runs' if max_steps is None else f'{max_steps} steps'}, best score {ranked[0][1]['score']:.1f}")
+
+			# Keep the best ones for the next rung
+			if max_steps is None:
+				return ranked
+			candidates = [candidate for candidate, _ in ranked[:max(args.top, math.ceil(len(ranked) / args.eta))]]
+			max_steps *= args.eta
+
+
+# Main method
+if __name__ == "__main__":
+	if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+		overrides, preset, mode_name, seed, traffic, nb_steps, max_steps, output = sys.argv[2:]
+		run_worker(json.loads(overrides), preset, mode_name, int(seed), traffic, int(nb_steps), None if max_steps == "None" else int(max_steps), output)
+		sys.exit(0)
+
+	# Arguments
+	parser = argparse.ArgumentParser(description = "Search the QoS weights and topology constants of config.py maximizing the completed tasks and minimizing the failures, for each resources preset")
+	parser.add_argument("--presets", nargs = "+", default = ["medium", "high"], choices = list(PRESETS), help = "Resources presets (default: medium high)")
+	parser.add_argument("--mode", default = "NQC", help = "Assign mode letters (default: NQC, the QoS weights only change the decisions of the QoS mode)")
+	parser.add_argument("--seeds", nargs = "+", type = int, default = [0], help = "Seeds, the results of a candidate are averaged over them (default: 0)")
+	parser.add_argument("--traffic", default = "random", choices = ["random", "sumo"], help = "Synthetic traffic or SUMO_CONFIG (default: random)")
+	parser.add_argument("--steps", type = int, default = NB_STEPS, help = f"Steps of the synthetic traffic (default: {NB_STEPS})")
+	parser.add_argument("--candidates", type = int, default = 27, help = "Number of configurations sampled from the search space (default: 27)")
+	parser.add_argument("--min-steps", type = int, default = 50, help = "Steps of the partial runs of the first rung (default: 50)")
+	parser.add_argument("--eta", type = int, default = 3, help = "Factor of the successive halving: steps multiplied and candidates divided by it at each rung (default: 3)")
+	parser.add_argument("--top", type = int, default = 3, help = "Number of configurations reported per preset (default: 3)")
+	parser.add_argument("--failure-weight", type = float, default = 1.0, help = "Score = completed tasks - weight * failed tasks (default: 1.0)")
+	parser.add_argument("--workers", type = int, default = os.cpu_count() or 1, help = "Number of parallel runs (default: number of CPUs)")
+	parser.add_argument("--output", default = "outputs/tuning.json", help = "JSON report of the best configurations (default: outputs/tuning.json)")
+	parser.add_argument("--sample-seed", type = int, default = 0, help = "Seed of the sampling of the candidates (default: 0)")
+	args = parser.parse_args()
+	args.fixed = {"LOG_LEVEL": "WARNING"}	# Constants set in every run
+	sys.path.insert(0, ROOT)
+	from src.print import *
+	import config
+
+	# Tune each preset
+	baseline: dict = {name: getattr(config, name) for name in SEARCH_SPACE}
+	candidates: list[dict] = sample_candidates(SEARCH_SPACE, baseline, args.candidates, args.sample_seed)
+	report: dict[str, list[dict]] = {}
+	with tempfile.TemporaryDirectory(prefix = "tune_config_") as workdir:
+		for preset in args.presets:
+			ranked: list[tuple[dict, dict]] = successive_halving(candidates, preset, args, workdir)
+			report[preset] = [{"config": candidate, **result, "baseline": candidate == baseline} for candidate, result in ranked[:args.top]]
+
+	# Print the best configurations and write the report
+	names: list[str] = list(SEARCH_SPACE)
+	for preset, best in report.items():
+		info(f"Best configurations of the '{preset}' preset:")
+		info(f"{'Rank':>4} | {'Score':>9} | {'Completed':>9} | {'Failed':>7} | " + " | ".join(names))
+		for rank, entry in enumerate(best, start = 1):
+			values: str = " | ".join(f"{entry['config'][name]:>{len(name)}}" for name in names)
+			info(f"{rank:>4} | {entry['score']:>9.1f} | {entry['completed']:>9.1f} | {entry['failed']:>7.1f} | {values}{' (current)' if entry['baseline'] else ''}")
+	os.makedirs(os.path.dirname(args.output) or ".", exist_ok = True)
+	with open(args.output, "w", encoding = "utf-8") as file:
+		json.dump({"mode": args.mode, "seeds": args.seeds, "traffic": args.traffic, "search_space": SEARCH_SPACE, "presets": report}, file, indent = 4)
+	info(f"Report written to '{args.output}'")
+